@@ -0,0 +1,110 @@
+"""Заглушка Maven для замеров накладных расходов Majesty Compiler.
+
+Печатает вывод, похожий на настоящую многомодульную сборку (маркеры
+модулей и целей плагинов, предупреждения компилятора, итоги тестов,
+Reactor Summary), создает JAR заданного размера в target и завершается с
+заданным кодом. Поведение настраивается переменными окружения:
+
+    FAKE_MVN_LINES      строк вывода на модуль (по умолчанию 1000)
+    FAKE_MVN_MODULES    число модулей (по умолчанию 1)
+    FAKE_MVN_EXIT       код завершения (по умолчанию 0)
+    FAKE_MVN_JAR_KB     размер JAR в КБ (по умолчанию 1024)
+    FAKE_MVN_JAR_RANDOM 1 - случайное содержимое JAR, иначе одинаковое от сборки к сборке
+    FAKE_MVN_DELAY_MS   пауза после каждой цели плагина, мс (по умолчанию 0)
+    FAKE_MVN_VERSION    версия в выводе --version (по умолчанию 3.9.6)
+
+Запуск напрямую: python fake_mvn.py clean package. Для движка сборки
+run_benchmarks.py создает рядом обертку mvn/mvn.cmd.
+"""
+import os
+import sys
+import time
+
+MOJOS = [
+    ("resources:3.3.1:resources", "default-resources"),
+    ("compiler:3.11.0:compile", "default-compile"),
+    ("resources:3.3.1:testResources", "default-testResources"),
+    ("compiler:3.11.0:testCompile", "default-testCompile"),
+    ("surefire:3.2.2:test", "default-test"),
+    ("jar:3.3.0:jar", "default-jar"),
+]
+
+
+def env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def write_jar(path, size_kb, random_content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    block = b"PK\x03\x04" + b"\0" * 1020
+    with open(path, 'wb') as f:
+        for _ in range(size_kb):
+            f.write(os.urandom(1024) if random_content else block)
+
+
+def main(args):
+    if "--version" in args or "-v" in args:
+        print(f"Apache Maven {os.environ.get('FAKE_MVN_VERSION', '3.9.6')} (fake)")
+        print(f"Maven home: {os.path.dirname(os.path.abspath(__file__))}")
+        print("Java version: 17.0.9, vendor: Fake, runtime: /opt/fake-jdk")
+        return 0
+
+    lines = env_int("FAKE_MVN_LINES", 1000)
+    modules = max(1, env_int("FAKE_MVN_MODULES", 1))
+    exit_code = env_int("FAKE_MVN_EXIT", 0)
+    delay = env_int("FAKE_MVN_DELAY_MS", 0) / 1000
+    quiet = "-q" in args
+    out = sys.stdout
+    started = time.monotonic()
+    per_mojo = max(1, lines // len(MOJOS))
+
+    out.write("[INFO] Scanning for projects...\n")
+    summary = []
+    for index in range(1, modules + 1):
+        name = f"module-{index}" if modules > 1 else "app"
+        module_started = time.monotonic()
+        if not quiet:
+            out.write(f"[INFO] ----------------------< com.example:{name} >----------------------\n")
+            out.write(f"[INFO] Building {name} 1.0-SNAPSHOT{' ' * 30}[{index}/{modules}]\n")
+            out.write("[INFO] --------------------------------[ jar ]---------------------------------\n")
+        for goal, execution in MOJOS:
+            if not quiet:
+                out.write(f"[INFO] \n[INFO] --- {goal} ({execution}) @ {name} ---\n")
+            for n in range(per_mojo):
+                if n % 97 == 0:
+                    out.write(f"[WARNING] /work/{name}/src/main/java/com/example/Service{n}.java:[{n % 300 + 1},9] "
+                              f"[deprecation] legacyCall() in Helper has been deprecated\n")
+                elif not quiet:
+                    out.write(f"[INFO] Compiling {n} source files with javac [debug release 17] to target/classes\n")
+            if goal.startswith("surefire") and not quiet:
+                out.write("[INFO] Tests run: 42, Failures: 0, Errors: 0, Skipped: 0, Time elapsed: 1.23 s\n")
+            if delay:
+                out.flush()
+                time.sleep(delay)
+        if not quiet:
+            out.write(f"[INFO] Building jar: /work/{name}/target/{name}-1.0-SNAPSHOT.jar\n")
+        summary.append((name, time.monotonic() - module_started))
+
+    write_jar(os.path.join(os.getcwd(), "target", "app-1.0-SNAPSHOT.jar"), env_int("FAKE_MVN_JAR_KB", 1024),
+              os.environ.get("FAKE_MVN_JAR_RANDOM") == "1")
+
+    result = "SUCCESS" if exit_code == 0 else "FAILURE"
+    if modules > 1:
+        out.write("[INFO] ------------------------------------------------------------------------\n")
+        out.write("[INFO] Reactor Summary for parent 1.0-SNAPSHOT:\n[INFO] \n")
+        for name, seconds in summary:
+            out.write(f"[INFO] {name} {'.' * (50 - len(name))} {result} [{seconds:7.3f} s]\n")
+    out.write("[INFO] ------------------------------------------------------------------------\n")
+    if exit_code:
+        out.write("[ERROR] /work/app/src/main/java/com/example/App.java:[12,5] cannot find symbol\n")
+    out.write(f"[INFO] BUILD {result}\n")
+    out.write(f"[INFO] Total time:  {time.monotonic() - started:.3f} s\n")
+    out.flush()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
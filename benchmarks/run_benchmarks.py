@@ -0,0 +1,371 @@
+"""Замеры накладных расходов Majesty Compiler без настоящего Maven.
+
+Сборки выполняются заглушкой fake_mvn.py, поэтому результаты показывают
+собственные расходы приложения: запуск и чтение вывода процесса, запись
+логов, публикацию артефакта и работу окна. Результаты сохраняются в JSON,
+и их можно сравнить с прошлым запуском:
+
+    python benchmarks/run_benchmarks.py --output bench-1.4.json
+    python benchmarks/run_benchmarks.py --quick --compare bench-1.4.json
+
+Замеры:
+    end_to_end      полное время BuildEngine.build и доля, не занятая Maven
+    log_pipeline    строк в секунду через LogPipeline (с профилировщиком и без)
+    copy_rss        пиковая память процесса при публикации большого JAR
+    version_lookup  выбор имени версии при тысячах существующих версий
+    gui_latency     задержка цикла событий Tk при потоке вывода (нужен дисплей)
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# Кэши и базы приложения не должны смешиваться с рабочими
+os.environ["MAJESTY_HOME"] = tempfile.mkdtemp(prefix="majesty-bench-home-")
+
+from majesty_engine import BuildEngine, BuildOptions  # noqa: E402
+from majesty_logpipe import LogPipeline  # noqa: E402
+from majesty_profiler import BuildProfiler  # noqa: E402
+from majesty_registry import VersionRegistry, versioned_filename  # noqa: E402
+
+FAKE_MVN = os.path.join(BENCH_DIR, "fake_mvn.py")
+MINIMAL_POM = """<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <modelVersion>4.0.0</modelVersion>
+  <groupId>com.example</groupId>
+  <artifactId>app</artifactId>
+  <version>1.0-SNAPSHOT</version>
+</project>
+"""
+
+FULL_SIZES = {"runs": 5, "lines": 20000, "pipeline_lines": 500000, "copy_mb": 512, "versions": 5000, "gui_lines": 200000}
+QUICK_SIZES = {"runs": 2, "lines": 2000, "pipeline_lines": 50000, "copy_mb": 32, "versions": 1000, "gui_lines": 20000}
+
+
+def make_stub_maven(directory):
+    """Обертка mvn/mvn.cmd, запускающая fake_mvn.py текущим интерпретатором Python"""
+    os.makedirs(directory, exist_ok=True)
+    if platform.system() == "Windows":
+        path = os.path.join(directory, "mvn.cmd")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'@"{sys.executable}" "{FAKE_MVN}" %*\r\n')
+    else:
+        path = os.path.join(directory, "mvn")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_MVN}" "$@"\n')
+        os.chmod(path, 0o755)
+    return path
+
+
+def make_project(root):
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "pom.xml"), 'w', encoding='utf-8') as f:
+        f.write(MINIMAL_POM)
+    return root
+
+
+def peak_rss_bytes():
+    """Пиковый объем памяти текущего процесса"""
+    if platform.system() == "Windows":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux сообщает килобайты, macOS - байты
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def summarize(samples):
+    return {"min": round(min(samples), 4), "median": round(statistics.median(samples), 4),
+            "max": round(max(samples), 4), "runs": len(samples)}
+
+
+def bench_end_to_end(work_dir, sizes):
+    maven = make_stub_maven(os.path.join(work_dir, "bin"))
+    project = make_project(os.path.join(work_dir, "e2e-project"))
+    engine = BuildEngine()
+    env = {"FAKE_MVN_LINES": str(sizes["lines"]), "FAKE_MVN_MODULES": "4", "FAKE_MVN_JAR_KB": "2048",
+           "FAKE_MVN_JAR_RANDOM": "1"}
+    os.environ.update(env)
+    wall, overhead, lines_per_sec = [], [], []
+    for _ in range(sizes["runs"]):
+        options = BuildOptions.for_project(project, maven)
+        options.use_cache = False
+        result = engine.build(options)
+        if not result.success:
+            raise RuntimeError(f"Сборка заглушкой не удалась: {result.status} {result.error or ''}")
+        wall.append(result.duration)
+        overhead.append(result.duration - result.maven_time)
+        lines_per_sec.append(result.lines_per_sec)
+    return {"wall_time_s": summarize(wall), "overhead_s": summarize(overhead),
+            "lines_per_sec": summarize(lines_per_sec), "lines_per_build": result.line_count, "stub": env}
+
+
+def synthetic_lines(count):
+    template = [
+        "[INFO] --- compiler:3.11.0:compile (default-compile) @ module-{m} ---\n",
+        "[INFO] Compiling 120 source files with javac [debug release 17] to target/classes\n",
+        "[WARNING] /work/src/main/java/Service{n}.java:[12,9] [deprecation] legacyCall() has been deprecated\n",
+        "[INFO] Tests run: 42, Failures: 0, Errors: 0, Skipped: 0, Time elapsed: 1.23 s\n",
+    ]
+    return [template[n % 4].format(m=n // 5000, n=n) if n % 4 != 1 else template[1] for n in range(count)]
+
+
+def bench_log_pipeline(work_dir, sizes):
+    lines = synthetic_lines(sizes["pipeline_lines"])
+    results = {}
+    for name, background, with_profiler in (("sync", False, False), ("background_writer", True, False),
+                                            ("sync_with_profiler", False, True)):
+        pipeline = LogPipeline(os.path.join(work_dir, f"full_{name}.txt"), os.path.join(work_dir, f"filtered_{name}.txt"),
+                               background=background)
+        if with_profiler:
+            pipeline.add_listener(BuildProfiler().on_line)
+        started = time.perf_counter()
+        for line in lines:
+            pipeline.feed(line)
+        stats = pipeline.close()
+        elapsed = time.perf_counter() - started
+        results[name] = {"lines": stats.lines, "seconds": round(elapsed, 4), "lines_per_sec": round(stats.lines / elapsed)}
+    return results
+
+
+def copy_child(src, dest_dir):
+    """Выполняется в отдельном процессе, чтобы пик памяти относился только к копированию"""
+    from majesty_registry import VersionRegistry as Registry
+    baseline = peak_rss_bytes()
+    started = time.perf_counter()
+    Registry.open(dest_dir).publish("bench.jar", src, dedup="off")
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"baseline_peak_rss": baseline, "peak_rss": peak_rss_bytes(), "seconds": elapsed}))
+
+
+def bench_copy_rss(work_dir, sizes):
+    src = os.path.join(work_dir, "big.jar")
+    chunk = os.urandom(1024 * 1024)
+    with open(src, 'wb') as f:
+        for _ in range(sizes["copy_mb"]):
+            f.write(chunk)
+    dest_dir = os.path.join(work_dir, "copy-out")
+    os.makedirs(dest_dir, exist_ok=True)
+    child = subprocess.run([sys.executable, __file__, "--copy-child", src, dest_dir],
+                           stdout=subprocess.PIPE, check=True, env=os.environ.copy())
+    data = json.loads(child.stdout.decode('utf-8').strip().splitlines()[-1])
+    return {
+        "file_mb": sizes["copy_mb"],
+        "seconds": round(data["seconds"], 4),
+        "mb_per_sec": round(sizes["copy_mb"] / data["seconds"], 1) if data["seconds"] else None,
+        "peak_rss_mb": round(data["peak_rss"] / 1024 / 1024, 1),
+        "peak_rss_growth_mb": round((data["peak_rss"] - data["baseline_peak_rss"]) / 1024 / 1024, 1),
+    }
+
+
+def legacy_next_version(base_path, base_name):
+    """Прежний способ: перебор имен с проверкой os.path.exists"""
+    if not os.path.exists(os.path.join(base_path, base_name)):
+        return base_name
+    stem, extension = os.path.splitext(base_name)
+    version = 1
+    while os.path.exists(os.path.join(base_path, f"{stem}-v{version}{extension}")):
+        version += 1
+    return f"{stem}-v{version}{extension}"
+
+
+def bench_version_lookup(work_dir, sizes):
+    output_dir = os.path.join(work_dir, "versions")
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = "app-majestycompiler.jar"
+    for version in range(sizes["versions"]):
+        open(os.path.join(output_dir, versioned_filename(base_name, version)), 'wb').close()
+
+    started = time.perf_counter()
+    legacy = legacy_next_version(output_dir, base_name)
+    legacy_time = time.perf_counter() - started
+
+    # Холодный старт: манифеста нет, реестр восстанавливается одним проходом scandir
+    started = time.perf_counter()
+    registry = VersionRegistry(output_dir)
+    cold_name = registry.peek_next(base_name)
+    cold_time = time.perf_counter() - started
+    registry.reserve(base_name)
+
+    # Новый процесс: манифест уже есть
+    started = time.perf_counter()
+    manifest_name = VersionRegistry(output_dir).peek_next(base_name)
+    manifest_time = time.perf_counter() - started
+
+    warm = []
+    for _ in range(100):
+        started = time.perf_counter()
+        registry.peek_next(base_name)
+        warm.append(time.perf_counter() - started)
+    return {
+        "existing_versions": sizes["versions"],
+        "legacy_exists_loop_ms": round(legacy_time * 1000, 3),
+        "registry_cold_scan_ms": round(cold_time * 1000, 3),
+        "registry_manifest_load_ms": round(manifest_time * 1000, 3),
+        "registry_warm_lookup_us": round(statistics.median(warm) * 1e6, 2),
+        "next_name": {"legacy": legacy, "registry_cold": cold_name, "after_reserve": manifest_name},
+    }
+
+
+def bench_gui_latency(work_dir, sizes):
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {"skipped": f"окно недоступно: {str(e)}"}
+
+    import majesty_compiler
+    app = majesty_compiler.MajestyCompilerApp(root)
+    app.is_building = True
+    app.console_job = root.after(majesty_compiler.CONSOLE_REFRESH_MS, app.drain_console)
+    line = "[INFO] Compiling 120 source files with javac [debug release 17] to target/classes\n"
+
+    def produce():
+        for n in range(sizes["gui_lines"]):
+            app.on_build_line(line, n % 50 == 0)
+            if n % 1000 == 0:
+                time.sleep(0.001)
+
+    lateness = []
+    interval_ms = 10
+    state = {"expected": None}
+
+    def tick():
+        now = time.perf_counter()
+        if state["expected"] is not None:
+            lateness.append(max(0.0, now - state["expected"]))
+        if producer.is_alive() or len(lateness) < 20:
+            state["expected"] = time.perf_counter() + interval_ms / 1000
+            root.after(interval_ms, tick)
+        else:
+            app.is_building = False
+            root.after(0, root.destroy)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    started = time.perf_counter()
+    root.after(0, tick)
+    root.mainloop()
+    ordered = sorted(lateness)
+    return {
+        "lines": sizes["gui_lines"],
+        "seconds": round(time.perf_counter() - started, 3),
+        "latency_ms": {"median": round(statistics.median(ordered) * 1000, 2),
+                       "p95": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 2),
+                       "max": round(ordered[-1] * 1000, 2)},
+    }
+
+
+BENCHMARKS = {
+    "end_to_end": bench_end_to_end,
+    "log_pipeline": bench_log_pipeline,
+    "copy_rss": bench_copy_rss,
+    "version_lookup": bench_version_lookup,
+    "gui_latency": bench_gui_latency,
+}
+
+
+def flatten(data, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1} для сравнения числовых показателей"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def print_comparison(current, previous_path):
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = flatten(json.load(f).get("results", {}))
+    print(f"Сравнение с {previous_path}:")
+    for name, value in flatten(current["results"]).items():
+        old = previous.get(name)
+        if old:
+            print(f"  {name:<55} {old:>12} -> {value:<12} ({(value - old) / old:+.1%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры накладных расходов Majesty Compiler")
+    parser.add_argument("--quick", action="store_true", help="уменьшенные объемы для быстрой проверки")
+    parser.add_argument("--only", help="список замеров через запятую: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--output", help="файл для результатов JSON (по умолчанию - вывод в консоль)")
+    parser.add_argument("--compare", help="JSON прошлого запуска для сравнения")
+    for name, value in FULL_SIZES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"по умолчанию {value}")
+    parser.add_argument("--copy-child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.copy_child:
+        copy_child(*args.copy_child)
+        return 0
+
+    sizes = dict(QUICK_SIZES if args.quick else FULL_SIZES)
+    for name in sizes:
+        value = getattr(args, name)
+        if value is not None:
+            sizes[name] = value
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "sizes": sizes,
+        "results": {},
+    }
+    work_dir = tempfile.mkdtemp(prefix="majesty-bench-")
+    try:
+        for name in selected:
+            print(f"Замер {name}...", file=sys.stderr)
+            started = time.perf_counter()
+            try:
+                report["results"][name] = BENCHMARKS[name](work_dir, sizes)
+            except Exception as e:
+                report["results"][name] = {"error": str(e)}
+            print(f"  готово за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(os.environ["MAJESTY_HOME"], ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"Результаты сохранены в {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    if args.compare:
+        print_comparison(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Поиск артефактов сборки во всех модулях реактора и их публикация.
+
+Артефакты ищутся в папках target модулей по расширениям выбранных типов
+упаковки (jar, war, ear). Вспомогательные файлы - исходники, javadoc,
+тестовые JAR и original-*.jar, оставленные maven-shade-plugin, -
+пропускаются. Список можно сузить шаблонами включения и исключения
+(fnmatch по имени файла или по "модуль/имя").
+
+Папки target не очищаются при инкрементальной сборке и сборке без clean,
+поэтому в них остаются JAR прошлых версий. Файлы <artifactId>-<другая
+версия> не публикуются; файлы с измененным finalName после запуска Maven
+публикуются, только если они записаны этой сборкой.
+
+Если найден один артефакт, он публикуется под именем, заданным в окне
+(как раньше); если несколько - каждый под своим именем
+<artifactId>[-классификатор]-majestycompiler.<расширение> со своей
+нумерацией версий. Файлы копируются параллельно.
+"""
+import fnmatch
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+from majesty_reactor import load_reactor
+
+logger = logging.getLogger('MajestyCompiler')
+
+DEFAULT_ARTIFACT_TYPES = ["jar", "war", "ear"]
+# Сколько артефактов копировать одновременно (копирование упирается в диск и сеть, а не в процессор)
+DEFAULT_PUBLISH_WORKERS = 8
+PUBLISHED_SUFFIX = "-majestycompiler"
+
+# Вспомогательные артефакты, которые не публикуются
+AUXILIARY_CLASSIFIERS = ("-sources", "-javadoc", "-tests", "-test-sources", "-test-javadoc")
+AUXILIARY_PREFIXES = ("original-",)
+
+
+@dataclass
+class Artifact:
+    """Найденный артефакт модуля"""
+    module: str  # имя модуля в реакторе, "." для корневого
+    path: str
+    # artifactId с классификатором (app, app-shaded) или имя файла без расширения, если finalName изменен
+    name: str
+    extension: str
+    # Имя, под которым публикуются версии (заполняется assign_published_names)
+    base_name: str = ""
+
+    def cache_meta(self):
+        """Сведения для кэша сборок: по ним артефакт восстанавливается без исходного файла"""
+        return {"name": os.path.basename(self.path), "module": self.module, "artifact": self.name,
+                "extension": self.extension}
+
+    @classmethod
+    def from_cache(cls, path, meta):
+        filename = meta.get("name", "")
+        stem, extension = os.path.splitext(filename)
+        return cls(meta.get("module", "."), path, meta.get("artifact", stem), meta.get("extension", extension))
+
+
+@dataclass
+class PublishedArtifact:
+    """Результат публикации одного артефакта"""
+    artifact: Artifact
+    path: Optional[str] = None
+    sha256: str = ""
+    size: int = 0
+    deduplicated: bool = False
+    linked: bool = False
+    error: Optional[str] = None
+
+
+def artifact_name(filename, artifact_id, version):
+    """app-1.0.jar -> app, app-1.0-shaded.jar -> app-shaded, иначе имя файла без расширения"""
+    stem = os.path.splitext(filename)[0]
+    prefix = f"{artifact_id}-{version}" if version else artifact_id
+    if not artifact_id or stem == prefix:
+        return artifact_id or stem
+    if stem.startswith(prefix + "-"):
+        return f"{artifact_id}{stem[len(prefix):]}"
+    return stem
+
+
+def is_auxiliary(filename):
+    stem = os.path.splitext(filename)[0]
+    return stem.endswith(AUXILIARY_CLASSIFIERS) or filename.startswith(AUXILIARY_PREFIXES)
+
+
+def is_stale(filename, mtime, artifact_id, version, since=None):
+    """Файл остался в target от прошлых сборок и не относится к текущей версии модуля"""
+    stem = os.path.splitext(filename)[0]
+    prefix = f"{artifact_id}-{version}"
+    if artifact_id and version and (stem == prefix or stem.startswith(prefix + "-")):
+        return False
+    # <artifactId>-<другая версия> - артефакт версии до смены в pom.xml
+    if artifact_id and version and re.match(rf"{re.escape(artifact_id)}-\d", stem):
+        return True
+    # Имя задано finalName: текущий артефакт записан после начала сборки
+    return since is not None and mtime < since
+
+
+def matches_any(patterns, module, filename):
+    return any(fnmatch.fnmatch(filename, p) or fnmatch.fnmatch(f"{module}/{filename}", p) for p in patterns)
+
+
+def discover_artifacts(project_dir, reactor=None, types=None, include=None, exclude=None,
+                       since=None, rebuilt=None) -> List[Artifact]:
+    """Артефакты из папок target всех модулей реактора в порядке модулей.
+
+    since - время начала сборки (time.time()); None, если Maven не запускался.
+    rebuilt - имена модулей, собранных этой сборкой (-pl/-amd); None - все модули.
+    """
+    reactor = reactor or load_reactor(project_dir)
+    extensions = {f".{t.lstrip('.').lower()}" for t in (types or DEFAULT_ARTIFACT_TYPES)}
+    modules = [(m.name, m.path, m.artifact_id, m.version) for m in reactor if m.packaging != "pom"]
+    if not reactor:
+        # pom.xml не разобран - смотрим только target корневого проекта
+        modules = [(".", os.path.abspath(project_dir), "", "")]
+
+    artifacts = []
+    for module, module_path, artifact_id, version in modules:
+        target_dir = os.path.join(module_path, "target")
+        try:
+            with os.scandir(target_dir) as entries:
+                files = sorted((entry.name, entry.stat().st_mtime) for entry in entries if entry.is_file())
+        except OSError:
+            continue
+        for filename, mtime in files:
+            extension = os.path.splitext(filename)[1].lower()
+            if extension not in extensions or is_auxiliary(filename):
+                continue
+            module_since = since if rebuilt is None or module in rebuilt else None
+            if is_stale(filename, mtime, artifact_id, version, module_since):
+                logger.info(f"Пропущен артефакт прошлой сборки: {os.path.join(target_dir, filename)}")
+                continue
+            if include and not matches_any(include, module, filename):
+                continue
+            if exclude and matches_any(exclude, module, filename):
+                continue
+            artifacts.append(Artifact(module, os.path.join(target_dir, filename),
+                                      artifact_name(filename, artifact_id, version), extension))
+    logger.info(f"Найдено артефактов: {len(artifacts)}"
+                + (f" ({', '.join(os.path.basename(a.path) for a in artifacts[:10])})" if artifacts else ""))
+    return artifacts
+
+
+def assign_published_names(artifacts, filename):
+    """Имена версий: один артефакт - заданное имя файла, несколько - по artifactId каждого"""
+    if len(artifacts) == 1:
+        stem = os.path.splitext(filename)[0]
+        artifacts[0].base_name = stem + artifacts[0].extension
+        return artifacts
+    taken = set()
+    for artifact in artifacts:
+        base_name = f"{artifact.name}{PUBLISHED_SUFFIX}{artifact.extension}"
+        if base_name in taken:
+            # Одинаковый artifactId в разных модулях - различаем по пути модуля
+            base_name = f"{artifact.module.replace('/', '-')}-{base_name}"
+        taken.add(base_name)
+        artifact.base_name = base_name
+    return artifacts
+
+
+def primary_artifact(published: List[PublishedArtifact]) -> Optional[PublishedArtifact]:
+    """Основной артефакт для статуса и истории сборок: корневого модуля, иначе последнего в реакторе
+    (обычно это приложение, собираемое из остальных модулей)"""
+    ok = [p for p in published if p.error is None]
+    if not ok:
+        return None
+    for item in ok:
+        if item.artifact.module == ".":
+            return item
+    return ok[-1]
+
+
+def publish_artifacts(registry, artifacts, dedup, build_log="", max_workers=None) -> List[PublishedArtifact]:
+    """Публикует артефакты параллельно; ошибка одного не прерывает остальные"""
+
+    def publish_one(artifact):
+        try:
+            published = registry.publish(artifact.base_name, artifact.path, dedup, build_log)
+        except Exception as e:
+            logger.error(f"Ошибка при копировании {artifact.path}: {str(e)}")
+            return PublishedArtifact(artifact, error=str(e))
+        return PublishedArtifact(artifact, published.path, published.sha256, published.size,
+                                 published.deduplicated, published.linked)
+
+    if len(artifacts) <= 1:
+        return [publish_one(a) for a in artifacts]
+    workers = max(1, min(max_workers or DEFAULT_PUBLISH_WORKERS, len(artifacts)))
+    logger.info(f"Публикация {len(artifacts)} артефактов, потоков: {workers}")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="majesty-publish") as pool:
+        return list(pool.map(publish_one, artifacts))
@@ -0,0 +1,205 @@
+"""Локальный кэш собранных артефактов.
+
+Ключ кэша - SHA-256 от всех pom.xml и исходников проекта, версии Maven/JDK
+и аргументов Maven (цели и параметры профиля сборки: артефакты сборки с
+-DskipTests или без javadoc не выдаются за полную сборку). Если с момента
+последней успешной сборки ничего не изменилось, артефакты всех модулей
+восстанавливаются из кэша без запуска Maven.
+
+Индекс кэша общий для окна, консоли и сервера сборок: каждое изменение
+перечитывает его с диска и сохраняет под межпроцессной блокировкой.
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from majesty_filelock import FileLock
+
+logger = logging.getLogger('MajestyCompiler')
+
+# Папки, которые не влияют на результат сборки и не участвуют в ключе
+SKIP_DIRS = {"target", "MajestyCompiler", ".git", ".svn", ".hg", ".idea", ".vscode", ".settings", "node_modules"}
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+INDEX_FILE = "index.json"
+HASH_CHUNK = 1024 * 1024
+
+
+def app_data_dir():
+    """Папка для служебных данных приложения (кэш, индексы, настройки)"""
+    override = os.environ.get("MAJESTY_HOME")
+    if override:
+        path = override
+    elif os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        path = os.path.join(os.environ["LOCALAPPDATA"], "MajestyCompiler")
+    else:
+        path = os.path.join(os.path.expanduser("~"), ".majestycompiler")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def iter_source_files(project_dir):
+    """Перебирает файлы проекта, влияющие на сборку, в детерминированном порядке"""
+    for dirpath, dirnames, filenames in os.walk(project_dir):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for name in sorted(filenames):
+            yield os.path.join(dirpath, name)
+
+
+def hash_file(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest
+
+
+def compute_cache_key(project_dir, toolchain="", goals=()):
+    """Вычисляет ключ кэша для текущего состояния проекта"""
+    digest = hashlib.sha256()
+    digest.update(f"toolchain:{toolchain}\n".encode('utf-8'))
+    digest.update(f"goals:{' '.join(goals)}\n".encode('utf-8'))
+    for path in iter_source_files(project_dir):
+        rel_path = os.path.relpath(path, project_dir).replace(os.sep, "/")
+        digest.update(f"file:{rel_path}\n".encode('utf-8'))
+        hash_file(path, digest)
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """Хранилище артефактов с вытеснением давно не использовавшихся записей (LRU)"""
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or os.path.join(app_data_dir(), "cache")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        self._index = self._load_index()
+
+    @contextlib.contextmanager
+    def _index_lock(self):
+        """Блокировка чтения-изменения-записи индекса; внутри нее self._index перечитан с диска"""
+        with self._lock, FileLock(f"{self._index_path}.lock"):
+            # Другие процессы могли добавить записи или обновить статистику
+            self._index = self._load_index()
+            yield
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Индекс кэша поврежден и будет пересоздан: {str(e)}")
+            index = {}
+        index.setdefault("entries", {})
+        index.setdefault("stats", {"hits": 0, "misses": 0, "stores": 0, "evictions": 0})
+        return index
+
+    def _save_index(self):
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._index_path)
+
+    def _entry_path(self, key, index=0):
+        return os.path.join(self.cache_dir, f"{key}.bin" if index == 0 else f"{key}.{index}.bin")
+
+    @staticmethod
+    def _entry_files(entry):
+        # Записи старого формата содержат один артефакт и только его имя
+        return entry.get("files") or [{"name": entry.get("name", "")}]
+
+    def _remove_files(self, key, entry):
+        for index in range(len(self._entry_files(entry))):
+            try:
+                os.remove(self._entry_path(key, index))
+            except FileNotFoundError:
+                pass
+
+    def lookup(self, key):
+        """Возвращает список (путь к артефакту, сведения о нем) или None при промахе.
+
+        Сведения - словарь, переданный в store; в нем всегда есть исходное имя файла "name".
+        """
+        with self._index_lock():
+            entry = self._index["entries"].get(key)
+            if entry:
+                files = [(self._entry_path(key, i), meta) for i, meta in enumerate(self._entry_files(entry))]
+                if all(os.path.exists(path) for path, _ in files):
+                    entry["last_access"] = time.time()
+                    self._index["stats"]["hits"] += 1
+                    self._save_index()
+                    logger.info(f"Попадание в кэш сборок: {key[:12]}, артефактов: {len(files)}")
+                    return files
+                # Файлы удалены вручную - запись больше недействительна
+                self._remove_files(key, entry)
+                del self._index["entries"][key]
+            self._index["stats"]["misses"] += 1
+            self._save_index()
+            logger.info(f"Промах кэша сборок: {key[:12]}")
+            return None
+
+    def store(self, key, artifacts):
+        """Сохраняет артефакты сборки [(путь, сведения)] и вытесняет старые записи при превышении лимита"""
+        size = sum(os.path.getsize(path) for path, _ in artifacts)
+        if not artifacts or size > self.max_bytes:
+            logger.info(f"Артефакты сборки больше лимита кэша и не сохраняются ({size} байт)")
+            return
+        files = []
+        for index, (artifact_path, meta) in enumerate(artifacts):
+            path = self._entry_path(key, index)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(artifact_path, tmp_path)
+            os.replace(tmp_path, path)
+            files.append(dict(meta, name=meta.get("name") or os.path.basename(artifact_path)))
+        with self._index_lock():
+            now = time.time()
+            self._index["entries"][key] = {
+                "name": files[0]["name"],
+                "files": files,
+                "size": size,
+                "created": now,
+                "last_access": now,
+            }
+            self._index["stats"]["stores"] += 1
+            self._evict()
+            self._save_index()
+        logger.info(f"Артефакты сохранены в кэш сборок: {key[:12]} ({len(files)} шт., {size} байт)")
+
+    def _evict(self):
+        entries = self._index["entries"]
+        total = sum(e["size"] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries[key]["size"]
+            self._remove_files(key, entries.pop(key))
+            self._index["stats"]["evictions"] += 1
+            logger.info(f"Запись вытеснена из кэша сборок: {key[:12]}")
+
+    def clear(self):
+        with self._index_lock():
+            for key, entry in self._index["entries"].items():
+                self._remove_files(key, entry)
+            self._index["entries"] = {}
+            self._save_index()
+
+    def stats(self):
+        """Статистика кэша: попадания, промахи, число записей и занятый объем"""
+        with self._index_lock():
+            stats = dict(self._index["stats"])
+            stats["entries"] = len(self._index["entries"])
+            stats["size"] = sum(e["size"] for e in self._index["entries"].values())
+            stats["max_size"] = self.max_bytes
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            return stats
+
@@ -0,0 +1,776 @@
+"""Консольный запуск Majesty Compiler без графического интерфейса.
+
+Пример пакетной сборки нескольких проектов в четыре потока:
+
+    python majesty_cli.py build ../service-a ../service-b --jobs 4
+    python majesty_cli.py build --manifest nightly.txt --log-root D:\\logs
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+
+from majesty_cache import DEFAULT_MAX_BYTES, BuildCache
+from majesty_daemon import daemon_status, find_mvnd, stop_daemons
+from majesty_engine import (BuildEngine, BuildOptions, default_project_paths, find_maven_executable,
+                            is_valid_maven_project, run_batch, startupinfo)
+from majesty_logindex import KINDS, LogIndex
+from majesty_logging import setup_logging
+from majesty_logpipe import LogFilter
+from majesty_prefetch import PREFETCH_MODES, is_resolved, local_repository
+from majesty_metrics import DEFAULT_BASELINE_WINDOW, DEFAULT_REGRESSION_THRESHOLD, MetricsStore
+from majesty_profiles import PROFILE_BEST, best_profile, load_profiles, pom_digest, profile_arguments
+from majesty_publish import DEDUP_MODES, DEDUP_SKIP
+from majesty_reactor import load_reactor
+from majesty_registry import VersionRegistry, format_version_time
+from majesty_server import (DEFAULT_CONCURRENCY, FINISHED_STATES, RUNNING, SUCCEEDED, JobClient, JobServerError,
+                            default_address, ensure_token, result_from_dict, run_server, split_address, token_path)
+from majesty_settings import ProjectSettings
+from majesty_tests import DEFAULT_WINDOW, TestStore, plan_shards
+from majesty_toolchain import ToolchainCache
+from majesty_watch import DEFAULT_DEBOUNCE, WatchBuilder
+
+logger = logging.getLogger('MajestyCompiler')
+
+
+def read_manifest(manifest_path):
+    """Читает список проектов: по одному пути в строке, строки с # пропускаются.
+
+    Относительные пути считаются от папки, в которой лежит манифест.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    projects = []
+    with open(manifest_path, 'r', encoding='utf-8') as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            projects.append(os.path.normpath(os.path.join(base_dir, line)))
+    return projects
+
+
+def collect_projects(args):
+    projects = list(args.projects)
+    if args.manifest:
+        projects.extend(read_manifest(args.manifest))
+
+    valid = []
+    for project in projects:
+        project = os.path.abspath(project)
+        if not is_valid_maven_project(project):
+            print(f"Пропущено: {project} (не найден pom.xml)", file=sys.stderr)
+            continue
+        if project not in valid:
+            valid.append(project)
+    return valid
+
+
+def load_filter_rules(args):
+    """Правила отфильтрованного лога из --filter и --filter-file; ошибки - OSError или re.error"""
+    rules = list(args.filter or [])
+    if args.filter_file:
+        rules.extend(LogFilter.from_file(args.filter_file).rules)
+    if rules:
+        # Регулярные выражения компилируются сейчас, а не после запуска Maven
+        LogFilter(rules)
+    return rules or None
+
+
+def check_filter_rules(args):
+    """Проверяет правила фильтра до начала сборок; при ошибке сообщает о ней и возвращает False"""
+    try:
+        load_filter_rules(args)
+    except (OSError, re.error) as e:
+        print(f"Ошибка в правилах фильтра лога: {str(e)}", file=sys.stderr)
+        return False
+    return True
+
+
+def make_build_options(args, project, toolchains, settings):
+    """Параметры сборки проекта из аргументов командной строки и запомненных настроек проекта"""
+    # Maven и JDK, выбранные для проекта ранее, если они не заданы явно
+    project_settings = settings.get(project)
+    maven_path = args.maven or project_settings.get("maven") or toolchains.default_maven(find_maven_executable)
+    options = BuildOptions.for_project(project, maven_path, output_root=args.output_root, log_root=args.log_root)
+    options.java_home = args.jdk or project_settings.get("java_home")
+    options.use_cache = not args.no_cache
+    options.incremental = args.incremental
+    options.use_daemon = args.daemon
+    options.filter_rules = load_filter_rules(args)
+    options.log_writer_thread = args.log_writer_thread
+    options.dedup = args.dedup
+    options.keep_last = args.keep_last
+    options.max_versions_mb = args.max_size_mb
+    options.profile = not args.no_profile
+    options.build_profile = args.build_profile or project_settings.get("build_profile")
+    options.artifact_types = args.artifact_type or project_settings.get("artifact_types") or options.artifact_types
+    options.artifact_include = args.include or project_settings.get("artifact_include", [])
+    options.artifact_exclude = args.exclude or project_settings.get("artifact_exclude", [])
+    options.publish_workers = args.publish_workers
+    options.prefetch = args.prefetch or project_settings.get("prefetch", False)
+    options.prefetch_mode = args.prefetch_mode
+    options.mirror = args.mirror or options.mirror
+    options.local_repository = args.local_repository or options.local_repository
+    options.test_shards = args.test_shards if args.test_shards is not None else project_settings.get("test_shards", 0)
+    return options
+
+
+def open_engine(args, toolchains, settings):
+    return BuildEngine(cache=open_cache(args), toolchains=toolchains, metrics=open_metrics(args), log_index=LogIndex(),
+                       settings=settings, tests=TestStore())
+
+
+def print_result(result):
+    mark = "OK  " if result.success and not result.error else "FAIL"
+    cached = ", из кэша" if result.cache_hit else ", mvnd" if result.daemon else ""
+    if result.build_profile:
+        cached += f", профиль {result.build_profile}"
+    print(f"[{mark}] {result.project_dir} ({result.duration:.1f} с{cached}, "
+          f"{result.line_count} строк лога, {result.lines_per_sec:.0f} строк/с)")
+    if result.status:
+        print(f"       {result.status}")
+    if result.error:
+        print(f"       {result.error}")
+    if len(result.artifacts) > 1:
+        for published in result.artifacts:
+            state = published.error or ("без изменений" if published.deduplicated and not published.linked else "")
+            print(f"         {published.artifact.module:<24} {os.path.basename(published.path or published.artifact.path)}"
+                  + (f" ({state})" if state else ""))
+    if result.test_count:
+        shards = f", частей: {result.test_shards}" if result.test_shards else ""
+        print(f"       Тесты: {result.test_count}, упало {result.test_failures}, пропущено {result.test_skipped} "
+              f"({result.test_time:.1f} с{shards})")
+        for name in result.failed_tests:
+            print(f"         {name}")
+    if result.regression:
+        print(f"       ВНИМАНИЕ: {result.regression}")
+    if result.profile_timeline and result.module_timings:
+        slowest = max(result.module_timings.items(), key=lambda item: item[1])
+        print(f"       Профиль: {result.profile_timeline} (дольше всего: {slowest[0]}, {slowest[1]:.1f} с)")
+
+
+def cmd_build(args):
+    projects = collect_projects(args)
+    if not projects:
+        print("Нет проектов для сборки", file=sys.stderr)
+        return 2
+    if not check_filter_rules(args):
+        return 2
+
+    toolchains = ToolchainCache()
+    settings = ProjectSettings()
+    options_list = [make_build_options(args, project, toolchains, settings) for project in projects]
+    results = run_batch(options_list, max_workers=args.jobs, engine=open_engine(args, toolchains, settings))
+
+    failed = 0
+    for result in results:
+        if not (result.success and not result.error):
+            failed += 1
+        print_result(result)
+    print(f"Собрано успешно: {len(results) - failed} из {len(results)}")
+    return 1 if failed else 0
+
+
+def cmd_watch(args):
+    project = os.path.abspath(args.project)
+    if not is_valid_maven_project(project):
+        print(f"Не найден pom.xml: {project}", file=sys.stderr)
+        return 2
+    if not check_filter_rules(args):
+        return 2
+
+    toolchains = ToolchainCache()
+    settings = ProjectSettings()
+    options = make_build_options(args, project, toolchains, settings)
+
+    def on_start(changed):
+        reason = f"изменено файлов: {len(changed)}" if changed else "первая сборка"
+        print(f"--- Сборка {time.strftime('%H:%M:%S')} ({reason})", flush=True)
+
+    def on_result(result):
+        if not result.cancelled:
+            print_result(result)
+            sys.stdout.flush()
+
+    builder = WatchBuilder(open_engine(args, toolchains, settings), options, on_start=on_start, on_result=on_result,
+                           debounce=args.debounce)
+    builder.start(build_now=not args.no_initial_build)
+    print(f"Наблюдение за {project} ({builder.watcher.backend.name}), Ctrl+C - выход", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Остановка наблюдения...")
+    finally:
+        builder.stop()
+        builder.join()
+    return 0
+
+
+def cmd_profiles(args):
+    profiles = load_profiles()
+    project = os.path.abspath(args.project) if args.project else None
+    settings = ProjectSettings()
+    if project and args.use is not None:
+        if args.use and args.use != PROFILE_BEST and args.use not in profiles:
+            print(f"Неизвестный профиль: {args.use}", file=sys.stderr)
+            return 2
+        settings.update(project, build_profile=args.use or None)
+
+    project_settings = settings.get(project) if project else {}
+    reactor = load_reactor(project) if project else []
+    resolved = bool(reactor) and project_settings.get("resolved_poms") == pom_digest(reactor)
+    for profile in profiles.values():
+        print(f"{profile.name:<8} {profile.description}")
+        if project:
+            maven_args, _ = profile_arguments(profile, reactor, dependencies_resolved=resolved)
+            print(f"         аргументы: {' '.join(maven_args) or '-'}")
+
+    if project:
+        stats = project_settings.get("profile_stats", {})
+        print(f"Проект {project}:")
+        print(f"  Модулей в реакторе: {len(reactor)}, зависимости загружены: {'да' if resolved else 'нет'}")
+        print(f"  Профиль по умолчанию: {project_settings.get('build_profile', 'не задан')}")
+        for name, entry in sorted(stats.items(), key=lambda item: item[1]["best"]):
+            print(f"  {name:<8} лучшее {entry['best']:.1f} с, последнее {entry['last']:.1f} с, сборок: {entry['runs']}")
+        if stats:
+            print(f"  Самый быстрый: {best_profile(project_settings)}")
+    return 0
+
+
+def cmd_prefetch(args):
+    projects = collect_projects(args)
+    if not projects:
+        print("Нет проектов для загрузки зависимостей", file=sys.stderr)
+        return 2
+
+    toolchains = ToolchainCache()
+    settings = ProjectSettings()
+    if args.status:
+        for project in projects:
+            resolved = is_resolved(settings.get(project), pom_digest(load_reactor(project)))
+            print(f"{'загружены' if resolved else 'не загружены':<13} {project}")
+        return 0
+
+    # Загрузки в один локальный репозиторий все равно идут по очереди (majesty_prefetch.RepositoryLock)
+    engine = BuildEngine(toolchains=toolchains, settings=settings)
+    failed = 0
+    for project in projects:
+        project_settings = settings.get(project)
+        maven_path = args.maven or project_settings.get("maven") or toolchains.default_maven(find_maven_executable)
+        options = BuildOptions.for_project(project, maven_path, log_root=args.log_root)
+        options.java_home = args.jdk or project_settings.get("java_home")
+        options.use_daemon = args.daemon
+        options.prefetch_mode = args.prefetch_mode
+        options.mirror = args.mirror or options.mirror
+        options.local_repository = args.local_repository or options.local_repository
+        result = engine.prefetch(options, force=args.force)
+        failed += not result.success
+        print(f"[{'OK  ' if result.success else 'FAIL'}] {project} ({result.duration:.1f} с)")
+        print(f"       {result.status}")
+        if result.error:
+            print(f"       {result.error}")
+        if result.prefetch_log and not result.success:
+            print(f"       Лог: {result.prefetch_log}")
+    print(f"Локальный репозиторий: {local_repository(args.local_repository or options.local_repository)}")
+    return 1 if failed else 0
+
+
+def open_cache(args):
+    return BuildCache(max_bytes=args.cache_size_mb * 1024 * 1024)
+
+
+def open_metrics(args):
+    return MetricsStore(window=args.window, threshold=args.threshold / 100)
+
+
+def cmd_history(args):
+    metrics = open_metrics(args)
+    project = os.path.abspath(args.project) if args.project else None
+
+    if args.module:
+        if not project:
+            print("Для --module нужно указать папку проекта", file=sys.stderr)
+            return 2
+        for started, duration in metrics.module_trend(project, args.module, limit=args.limit):
+            print(f"  {format_version_time(started)}  {duration:8.1f} с")
+        return 0
+
+    if args.regressions:
+        regressions = metrics.regressions(project, limit=args.limit)
+        for regression in regressions:
+            record = regression.record
+            print(f"#{record.id:<5} {format_version_time(record.started)}  {record.project}")
+            print(f"       {regression.describe()}")
+        if not regressions:
+            print("Замедлений не найдено")
+        return 0
+
+    print(f"{'#':<6} {'Дата':<19}  {'Время':>8}  {'Строк':>7}  {'Пред.':>5}  {'Ошиб.':>5}  {'JAR, КБ':>8}  Результат")
+    for record in metrics.builds(project, limit=args.limit):
+        result = "OK" if record.success else "FAIL"
+        if record.cache_hit:
+            result += ", кэш"
+        regression = metrics.check_regression(record)
+        if regression:
+            result += f", медленнее на {(regression.ratio - 1):.0%}"
+        name = "" if project else f"  {os.path.basename(record.project)}"
+        print(f"#{record.id:<5} {format_version_time(record.started)}  {record.duration:7.1f}с  {record.lines:>7}  "
+              f"{record.warnings:>5}  {record.errors:>5}  {record.artifact_size / 1024:>8.0f}  {result}{name}")
+    if project:
+        baseline = metrics.baseline(project)
+        if baseline:
+            print(f"Базовое время (медиана последних {metrics.window} сборок): {baseline:.1f} с")
+    return 0
+
+
+def cmd_tests(args):
+    project = os.path.abspath(args.project)
+    store = TestStore(window=args.window)
+    if args.use_shards is not None:
+        ProjectSettings().update(project, test_shards=args.use_shards or None)
+
+    if args.plan:
+        timings = store.class_timings(project)
+        if len(timings) < 2:
+            print("Истории времени тестов пока нет: соберите проект с тестами")
+            return 0
+        for shard in plan_shards(timings, args.plan):
+            rest = " + новые классы" if shard.rest else ""
+            print(f"Часть {shard.index + 1}: {shard.estimate:7.1f} с, классов {len(shard.classes)}{rest}")
+            for name in shard.classes[:args.limit]:
+                print(f"    {name:<70} {timings[name]:7.1f} с")
+        return 0
+
+    runs = store.runs(project, limit=args.window)
+    if not runs:
+        print("Отчетов тестов для проекта пока нет")
+        return 0
+    print(f"Последние запуски тестов ({len(runs)}):")
+    for run_id, started, tests, failures, skipped, duration, shards, build_id in runs[:5]:
+        build = f", сборка #{build_id}" if build_id else ""
+        parts = f", частей: {shards}" if shards else ""
+        print(f"  {format_version_time(started)}  тестов {tests}, упало {failures}, пропущено {skipped}, "
+              f"{duration:.1f} с{parts}{build}")
+
+    if args.failures:
+        title, timings = "Чаще всего падавшие тесты", store.failing_tests(project, args.limit)
+    elif args.classes:
+        title, timings = "Самые медленные классы тестов", store.slowest_classes(project, args.limit)
+    else:
+        title, timings = "Самые медленные тесты", store.slowest_tests(project, args.limit)
+    print(f"{title} (среднее за последние {args.window} запусков):")
+    for timing in timings:
+        failed = f", падал {timing.failures} из {timing.runs}" if timing.failures else ""
+        print(f"  {timing.average:7.2f} с (макс. {timing.longest:.2f}){failed}  {timing.full_name}")
+    if not timings:
+        print("  нет")
+    return 0
+
+
+def cmd_search(args):
+    index = LogIndex()
+    project = os.path.abspath(args.project) if args.project else None
+    text = " ".join(args.query)
+
+    if args.first:
+        entry = index.first_seen(text, project, args.kind)
+        if entry is None:
+            print("Ничего не найдено")
+            return 1
+        print(f"Впервые: {format_version_time(entry.started)}  {entry.project}")
+        print(f"  [{entry.kind}] {entry.module or '-'}  {entry.location()}  {entry.message}")
+        print(f"  Лог: {entry.full_log}:{entry.log_line}")
+        return 0
+
+    entries = index.search(text, project, args.kind, limit=args.limit)
+    for entry in entries:
+        print(f"{format_version_time(entry.started)}  #{entry.build_id:<5} [{entry.kind}] {entry.module or '-'}  "
+              f"{entry.location()}  {entry.message}")
+    if not entries:
+        print("Ничего не найдено")
+        return 1
+    return 0
+
+
+def cmd_serve(args):
+    toolchains = ToolchainCache()
+    settings = ProjectSettings()
+    host, port = split_address(args.address)
+    token = args.token or os.environ.get("MAJESTY_SERVER_TOKEN")
+    if not token:
+        token = ensure_token()
+        print(f"Токен для клиентов: {token_path()}")
+    print(f"Сервер сборок: {host}:{port}, одновременных сборок: {args.jobs}, Ctrl+C - выход", flush=True)
+    try:
+        run_server(open_engine(args, toolchains, settings), host, port, args.jobs, token, settings, toolchains)
+    except OSError as e:
+        print(f"Не удалось запустить сервер сборок: {str(e)}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def cmd_submit(args):
+    client = JobClient(args.server)
+    overrides = {}
+    if args.build_profile:
+        overrides["build_profile"] = args.build_profile
+    if args.incremental:
+        overrides["incremental"] = True
+    if args.no_cache:
+        overrides["use_cache"] = False
+    if args.daemon:
+        overrides["use_daemon"] = True
+    if args.goal:
+        overrides["goals"] = args.goal
+    if args.prefetch:
+        overrides["prefetch"] = True
+    if args.test_shards is not None:
+        overrides["test_shards"] = args.test_shards
+
+    try:
+        jobs = [client.submit(project, overrides, args.priority) for project in args.projects]
+        for job in jobs:
+            print(f"Задание {job['id']}: {job['project_dir']} (в очереди перед ним: {job.get('position') or 0})")
+        if not (args.wait or args.follow):
+            return 0
+        failed = 0
+        for job in jobs:
+            on_line = (lambda line: print(line, end="", flush=True)) if args.follow else None
+            job = client.wait(job["id"], on_line)
+            if job.get("result"):
+                print_result(result_from_dict(job["result"]))
+            else:
+                print(f"[{job['state']}] {job['project_dir']} {job.get('error') or ''}")
+            failed += job["state"] != SUCCEEDED
+    except JobServerError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    return 1 if failed else 0
+
+
+def cmd_jobs(args):
+    client = JobClient(args.server)
+    try:
+        if args.cancel:
+            for job_id in args.cancel:
+                job = client.cancel(job_id)
+                # Процесс Maven завершается в фоне, задание перейдет в cancelled чуть позже
+                print(f"Задание {job['id']}: {'отменяется' if job['state'] == RUNNING else job['state']}")
+            return 0
+        jobs = client.jobs()
+    except JobServerError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    if not args.all:
+        jobs = [job for job in jobs if job["state"] not in FINISHED_STATES]
+    for job in jobs:
+        place = f" #{job['position'] + 1}" if job.get("position") is not None else ""
+        print(f"{job['id']}  {job['state']:<9}{place:<4} приоритет {job['priority']:<3} "
+              f"{format_version_time(job['submitted'])}  {job['submitter'] or '-':<12} {job['project_dir']}")
+    if not jobs:
+        print("Заданий нет")
+    return 0
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD * 100,
+                        help="порог замедления относительно базового времени, %% (по умолчанию %(default).0f)")
+    parser.add_argument("--window", type=int, default=DEFAULT_BASELINE_WINDOW,
+                        help="сколько предыдущих сборок учитывать в базовом времени (по умолчанию %(default)s)")
+
+
+def cmd_cache(args):
+    cache = open_cache(args)
+    if args.action == "clear":
+        cache.clear()
+        print("Кэш сборок очищен")
+        return 0
+
+    stats = cache.stats()
+    print(f"Папка кэша:  {cache.cache_dir}")
+    print(f"Записей:     {stats['entries']}")
+    print(f"Объем:       {stats['size'] / 1024 / 1024:.1f} из {stats['max_size'] / 1024 / 1024:.0f} МБ")
+    print(f"Попадания:   {stats['hits']}")
+    print(f"Промахи:     {stats['misses']}")
+    print(f"Доля попаданий: {stats['hit_rate']:.0%}")
+    print(f"Вытеснено:   {stats['evictions']}")
+    return 0
+
+
+def cmd_daemon(args):
+    maven_path = args.maven or ToolchainCache().default_maven(find_maven_executable)
+    mvnd_path = find_mvnd(maven_path)
+    if not mvnd_path:
+        print("Maven Daemon (mvnd) не найден: задайте MVND_HOME или добавьте mvnd в PATH", file=sys.stderr)
+        return 2
+
+    if args.action == "stop":
+        if not stop_daemons(mvnd_path, startupinfo()):
+            print("Не удалось остановить Maven Daemon, подробности в журнале", file=sys.stderr)
+            return 1
+        print("Maven Daemon остановлен")
+        return 0
+
+    status = daemon_status(mvnd_path, startupinfo())
+    if status is None:
+        print("Не удалось получить статус Maven Daemon, подробности в журнале", file=sys.stderr)
+        return 1
+    print(f"mvnd: {mvnd_path}")
+    print(status.rstrip())
+    return 0
+
+
+def resolve_output_dir(args):
+    """Папка вывода: явно заданная или папка по умолчанию для проекта"""
+    if args.output:
+        return args.output
+    output_dir, _, _ = default_project_paths(os.path.abspath(args.project))
+    return output_dir
+
+
+def cmd_versions(args):
+    output_dir = resolve_output_dir(args)
+    if not os.path.isdir(output_dir):
+        print(f"Папка вывода не найдена: {output_dir}", file=sys.stderr)
+        return 2
+
+    registry = VersionRegistry.open(output_dir)
+    names = [args.name] if args.name else registry.artifact_names()
+    if not names and args.project:
+        names = [default_project_paths(os.path.abspath(args.project))[2]]
+
+    if args.prune:
+        max_bytes = args.max_size_mb * 1024 * 1024 if args.max_size_mb is not None else None
+        for name in names:
+            for entry in registry.prune(name, keep_last=args.keep_last, max_total_bytes=max_bytes):
+                print(f"Удалена версия: {entry.filename}")
+        return 0
+
+    for name in names:
+        print(f"{name}:")
+        for entry in registry.list_versions(name):
+            sha = entry.sha256[:12] if entry.sha256 else "-"
+            print(f"  v{entry.version:<4} {format_version_time(entry.timestamp)}  {entry.size:>12} байт  "
+                  f"{sha:<12}  {entry.filename}  {entry.build_log}")
+    return 0
+
+
+def cmd_toolchains(args):
+    toolchains = ToolchainCache()
+    if args.refresh:
+        toolchains.refresh()
+    print("Maven:")
+    for maven in toolchains.mavens():
+        default = " (по умолчанию)" if maven.path == toolchains.default_maven_path else ""
+        print(f"  {maven.version:<10} {maven.path}{default}")
+    print("JDK:")
+    for jdk in toolchains.jdks():
+        print(f"  {jdk.version:<10} {jdk.java_home}")
+
+    if args.project:
+        updates = {}
+        if args.use_maven is not None:
+            updates["maven"] = args.use_maven or None
+        if args.use_jdk is not None:
+            updates["java_home"] = args.use_jdk or None
+        if updates:
+            ProjectSettings().update(args.project, **updates)
+        selected = ProjectSettings().get(args.project)
+        print(f"Проект {os.path.abspath(args.project)}:")
+        print(f"  Maven: {selected.get('maven', 'по умолчанию')}")
+        print(f"  JDK:   {selected.get('java_home', 'по умолчанию')}")
+    return 0
+
+
+def add_repository_arguments(parser):
+    """Параметры загрузки зависимостей, общие для сборки и prefetch"""
+    parser.add_argument("--prefetch-mode", choices=sorted(PREFETCH_MODES), default="go-offline",
+                        help="как загружать зависимости: go-offline (dependency:go-offline) или resolve "
+                             "(dependency:resolve и resolve-plugins)")
+    parser.add_argument("--mirror", help="зеркало всех репозиториев Maven: папка с репозиторием или URL "
+                                         "(по умолчанию MAJESTY_MAVEN_MIRROR)")
+    parser.add_argument("--local-repository", help="локальный репозиторий Maven вместо ~/.m2/repository "
+                                                   "(по умолчанию MAJESTY_MAVEN_REPO_LOCAL)")
+
+
+def add_build_arguments(parser):
+    """Параметры сборки, общие для build и watch"""
+    parser.add_argument("--maven", help="путь к исполняемому файлу Maven (по умолчанию выбранный для проекта)")
+    parser.add_argument("--jdk", help="JAVA_HOME для сборки")
+    parser.add_argument("--output-root", help="общая папка для пакетов; внутри создается папка на каждый проект")
+    parser.add_argument("--log-root", help="общая папка для логов; внутри создается папка на каждый проект")
+    parser.add_argument("--incremental", action="store_true",
+                        help="собирать без clean только измененные модули и зависящие от них")
+    parser.add_argument("--daemon", action="store_true",
+                        help="собирать через Maven Daemon (mvnd), если он установлен")
+    parser.add_argument("--filter", action="append", metavar="RULE",
+                        help="правило отфильтрованного лога: подстрока или 're:регулярное выражение' (можно повторять)")
+    parser.add_argument("--filter-file", help="файл с правилами отфильтрованного лога, по одному в строке")
+    parser.add_argument("--log-writer-thread", action="store_true", help="писать логи на диск из отдельного потока")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default=DEDUP_SKIP,
+                        help="JAR совпадает с последней версией: skip - не копировать, link - жесткая ссылка, off - копировать")
+    parser.add_argument("--keep-last", type=int, help="хранить только N последних версий JAR")
+    parser.add_argument("--max-size-mb", type=int, help="предельный объем всех версий JAR в МБ")
+    parser.add_argument("--artifact-type", action="append", metavar="TYPE",
+                        help="публиковать артефакты этого типа упаковки: jar, war, ear (можно повторять; по умолчанию все три)")
+    parser.add_argument("--include", action="append", metavar="PATTERN",
+                        help="публиковать только артефакты, подходящие под шаблон имени или 'модуль/имя' (можно повторять)")
+    parser.add_argument("--exclude", action="append", metavar="PATTERN",
+                        help="не публиковать артефакты, подходящие под шаблон (можно повторять)")
+    parser.add_argument("--publish-workers", type=int, help="сколько артефактов копировать одновременно (по умолчанию 8)")
+    parser.add_argument("--build-profile", metavar="NAME",
+                        help="профиль параметров Maven: full, fast, best (самый быстрый для проекта) или свой из "
+                             "build_profiles.json; по умолчанию выбранный для проекта")
+    parser.add_argument("--no-profile", action="store_true", help="не сохранять профиль сборки (profile_*.json/html)")
+    parser.add_argument("--prefetch", action="store_true",
+                        help="загрузить зависимости перед сборкой и собирать автономно (-o)")
+    parser.add_argument("--test-shards", type=int, metavar="N",
+                        help="выполнять тесты в N параллельных процессах Maven, деля классы по истории их времени "
+                             "(по умолчанию выбранное для проекта)")
+    add_repository_arguments(parser)
+    parser.add_argument("--no-cache", action="store_true", help="всегда запускать Maven, не используя кэш сборок")
+    parser.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 // 1024,
+                        help="предельный объем кэша сборок в МБ")
+    add_metrics_arguments(parser)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="majesty_cli", description="Majesty Compiler без графического интерфейса")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="собрать один или несколько Maven-проектов")
+    build.add_argument("projects", nargs="*", help="папки Maven-проектов")
+    build.add_argument("--manifest", help="файл со списком папок проектов, по одной в строке")
+    build.add_argument("--jobs", "-j", type=int, default=None, help="число одновременных сборок (по умолчанию число ядер)")
+    add_build_arguments(build)
+    build.set_defaults(func=cmd_build)
+
+    watch = subparsers.add_parser("watch", help="пересобирать проект при изменении исходников и pom.xml")
+    watch.add_argument("project", nargs="?", default=".", help="папка проекта (по умолчанию текущая)")
+    watch.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                       help="сколько секунд ждать после последнего изменения (по умолчанию %(default)s)")
+    watch.add_argument("--no-initial-build", action="store_true", help="не собирать сразу при запуске")
+    add_build_arguments(watch)
+    watch.set_defaults(func=cmd_watch)
+
+    cache = subparsers.add_parser("cache", help="статистика и очистка кэша сборок")
+    cache.add_argument("action", choices=["stats", "clear"], nargs="?", default="stats")
+    cache.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 // 1024,
+                       help="предельный объем кэша сборок в МБ")
+    cache.set_defaults(func=cmd_cache)
+
+    daemon = subparsers.add_parser("daemon", help="запущенные демоны Maven Daemon (mvnd) и их остановка")
+    daemon.add_argument("action", choices=["status", "stop"], nargs="?", default="status")
+    daemon.add_argument("--maven", help="путь к Maven, рядом с которым искать mvnd")
+    daemon.set_defaults(func=cmd_daemon)
+
+    toolchains = subparsers.add_parser("toolchains", help="установленные Maven/JDK и выбор версий для проекта")
+    toolchains.add_argument("project", nargs="?", help="папка проекта для просмотра или изменения выбора")
+    toolchains.add_argument("--refresh", action="store_true", help="заново найти все установки")
+    toolchains.add_argument("--use-maven", help="запомнить Maven для проекта (пустая строка - по умолчанию)")
+    toolchains.add_argument("--use-jdk", help="запомнить JAVA_HOME для проекта (пустая строка - по умолчанию)")
+    toolchains.set_defaults(func=cmd_toolchains)
+
+    versions = subparsers.add_parser("versions", help="список опубликованных версий и удаление старых")
+    versions.add_argument("project", nargs="?", default=".", help="папка проекта (по умолчанию текущая)")
+    versions.add_argument("--output", help="папка вывода вместо папки проекта по умолчанию")
+    versions.add_argument("--name", help="имя артефакта, например service-majestycompiler.jar")
+    versions.add_argument("--prune", action="store_true", help="удалить старые версии сверх --keep-last/--max-size-mb")
+    versions.add_argument("--keep-last", type=int, help="сколько последних версий оставить")
+    versions.add_argument("--max-size-mb", type=int, help="предельный объем всех версий в МБ")
+    versions.set_defaults(func=cmd_versions)
+
+    prefetch = subparsers.add_parser("prefetch", help="заранее загрузить зависимости проектов для автономной сборки")
+    prefetch.add_argument("projects", nargs="*", help="папки Maven-проектов")
+    prefetch.add_argument("--manifest", help="файл со списком папок проектов, по одной в строке")
+    prefetch.add_argument("--status", action="store_true", help="только показать, для каких проектов зависимости загружены")
+    prefetch.add_argument("--force", action="store_true", help="загрузить, даже если зависимости уже загружены")
+    prefetch.add_argument("--maven", help="путь к исполняемому файлу Maven (по умолчанию выбранный для проекта)")
+    prefetch.add_argument("--jdk", help="JAVA_HOME для Maven")
+    prefetch.add_argument("--daemon", action="store_true", help="загружать через Maven Daemon (mvnd), если он установлен")
+    prefetch.add_argument("--log-root", help="общая папка для логов; внутри создается папка на каждый проект")
+    add_repository_arguments(prefetch)
+    prefetch.set_defaults(func=cmd_prefetch)
+
+    profiles = subparsers.add_parser("profiles", help="профили сборки и их время для проекта")
+    profiles.add_argument("project", nargs="?", help="папка проекта")
+    profiles.add_argument("--use", help="запомнить профиль по умолчанию для проекта (пустая строка - без профиля)")
+    profiles.set_defaults(func=cmd_profiles)
+
+    history = subparsers.add_parser("history", help="история сборок и замедления относительно базового времени")
+    history.add_argument("project", nargs="?", help="папка проекта (по умолчанию все проекты)")
+    history.add_argument("--limit", type=int, default=30, help="сколько последних сборок показать")
+    history.add_argument("--regressions", action="store_true", help="показать только замедлившиеся сборки")
+    history.add_argument("--module", help="время одного модуля в последних сборках проекта")
+    add_metrics_arguments(history)
+    history.set_defaults(func=cmd_history)
+
+    tests = subparsers.add_parser("tests", help="самые медленные и падающие тесты проекта и разбиение на части")
+    tests.add_argument("project", nargs="?", default=".", help="папка проекта (по умолчанию текущая)")
+    tests.add_argument("--classes", action="store_true", help="самые медленные классы вместо отдельных тестов")
+    tests.add_argument("--failures", action="store_true", help="тесты, падавшие в последних запусках")
+    tests.add_argument("--plan", type=int, metavar="N", help="показать разбиение классов на N частей")
+    tests.add_argument("--use-shards", type=int, metavar="N",
+                       help="запомнить для проекта число частей тестов (0 - не делить)")
+    tests.add_argument("--limit", type=int, default=20, help="сколько записей показать")
+    tests.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                       help="сколько последних запусков учитывать (по умолчанию %(default)s)")
+    tests.set_defaults(func=cmd_tests)
+
+    search = subparsers.add_parser("search", help="поиск ошибок, упавших тестов и предупреждений в логах сборок")
+    search.add_argument("query", nargs="+", help="искомые слова")
+    search.add_argument("--project", help="искать только в сборках этого проекта")
+    search.add_argument("--kind", choices=KINDS, help="тип записи")
+    search.add_argument("--limit", type=int, default=50, help="сколько записей показать")
+    search.add_argument("--first", action="store_true", help="показать сборку, в которой запись встретилась впервые")
+    search.set_defaults(func=cmd_search)
+
+    serve = subparsers.add_parser("serve", help="запустить локальный сервер сборок с общей очередью")
+    serve.add_argument("--address", default=default_address(),
+                       help="адрес сервера host:port (по умолчанию %(default)s; MAJESTY_SERVER)")
+    serve.add_argument("--jobs", "-j", type=int, default=DEFAULT_CONCURRENCY,
+                       help="сколько сборок выполнять одновременно (по умолчанию %(default)s)")
+    serve.add_argument("--token", help="токен, который должны передавать клиенты (или MAJESTY_SERVER_TOKEN; "
+                                       "по умолчанию создается в файле server_token в папке данных приложения)")
+    serve.add_argument("--cache-size-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 // 1024,
+                       help="предельный объем кэша сборок в МБ")
+    add_metrics_arguments(serve)
+    serve.set_defaults(func=cmd_serve)
+
+    submit = subparsers.add_parser("submit", help="поставить сборку в очередь сервера сборок")
+    submit.add_argument("projects", nargs="+", help="папки Maven-проектов")
+    submit.add_argument("--server", default=None, help="адрес сервера host:port (по умолчанию MAJESTY_SERVER или "
+                                                        "127.0.0.1:8765)")
+    submit.add_argument("--priority", type=int, default=0, help="приоритет: больше - раньше (по умолчанию 0)")
+    submit.add_argument("--wait", action="store_true", help="дождаться завершения и вывести итог")
+    submit.add_argument("--follow", action="store_true", help="дождаться завершения, выводя лог сборки по мере выполнения")
+    submit.add_argument("--goal", action="append", help="цель Maven вместо clean package (можно повторять)")
+    submit.add_argument("--build-profile", metavar="NAME", help="профиль параметров Maven")
+    submit.add_argument("--incremental", action="store_true", help="инкрементальная сборка")
+    submit.add_argument("--daemon", action="store_true", help="собирать через mvnd")
+    submit.add_argument("--no-cache", action="store_true", help="не использовать кэш сборок")
+    submit.add_argument("--prefetch", action="store_true", help="загрузить зависимости перед сборкой и собирать автономно")
+    submit.add_argument("--test-shards", type=int, metavar="N", help="выполнять тесты в N параллельных процессах Maven")
+    submit.set_defaults(func=cmd_submit)
+
+    jobs = subparsers.add_parser("jobs", help="очередь сервера сборок; --cancel снимает задания")
+    jobs.add_argument("--server", default=None, help="адрес сервера host:port")
+    jobs.add_argument("--all", action="store_true", help="показать и завершенные задания")
+    jobs.add_argument("--cancel", nargs="+", metavar="ID", help="отменить задания")
+    jobs.set_defaults(func=cmd_jobs)
+
+    return parser
+
+
+def main(argv=None):
+    # Журнал пишется в файл фоновым потоком, в консоль - только предупреждения и ошибки
+    setup_logging(console_level=logging.WARNING)
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,38 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import subprocess
+from tkinter.scrolledtext import ScrolledText
 import os
-import threading
 import re
-import time
+import threading
 import logging
-import platform
-from datetime import datetime
 import sys
+import webbrowser
+from collections import deque
+from dataclasses import asdict
+
+from majesty_cache import BuildCache
+from majesty_daemon import find_mvnd, stop_daemons
+from majesty_engine import (BuildEngine, BuildOptions, BuildResult, default_project_paths, find_maven_executable,
+                            get_next_version_filename, is_valid_maven_project, startupinfo)
+from majesty_logging import setup_logging
+from majesty_logindex import LogIndex
+from majesty_logpipe import LogFilter, filter_rules_path, load_log_filter
+from majesty_metrics import MetricsStore
+from majesty_profiles import PROFILE_BEST, load_profiles
+from majesty_registry import VersionRegistry, format_version_time
+from majesty_server import OPTION_FIELDS, JobClient, JobServerError, default_address, result_from_dict
+from majesty_settings import ProjectSettings
+from majesty_tests import TestStore
+from majesty_toolchain import ToolchainCache
+from majesty_watch import WatchBuilder
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='majestycompiler_log.txt',
-    filemode='a',
-    encoding='utf-8'  # Добавляем кодировку UTF-8 для корректного отображения русских символов
-)
 logger = logging.getLogger('MajestyCompiler')
 
+# Сколько последних строк вывода Maven хранит и показывает консоль сборки
+CONSOLE_MAX_LINES = 5000
+# Период обновления консоли сборки, мс
+CONSOLE_REFRESH_MS = 100
+
 # Функция для определения пути к ресурсам в случае упакованного приложения
 def resource_path(relative_path):
     """Получает абсолютный путь к ресурсу, работает как для разработки, так и для PyInstaller"""
@@ -35,7 +48,7 @@ class MajestyCompilerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Majesty Compiler")
-        self.root.geometry("900x350")  # Увеличиваем ширину окна ещё сильнее
+        self.root.geometry("900x940")  # Высота с запасом под панель консоли с выводом Maven
         
         # Устанавливаем иконку для окна и панели задач
         try:
@@ -65,10 +78,31 @@ class MajestyCompilerApp:
         self.filename = tk.StringVar()
         self.log_path = tk.StringVar()
         self.maven_path = tk.StringVar()
+        self.java_home = tk.StringVar()
+        self.use_cache = tk.BooleanVar(value=True)
+        self.incremental = tk.BooleanVar(value=False)
+        self.use_daemon = tk.BooleanVar(value=False)
+        self.use_server = tk.BooleanVar(value=False)
+        self.prefetch = tk.BooleanVar(value=False)
+        self.console_filtered_only = tk.BooleanVar(value=False)
+        self.watch_mode = tk.BooleanVar(value=False)
+        self.build_profile = tk.StringVar()
+        self.artifact_patterns = tk.StringVar()
+        self.watch_builder = None
+        
+        # Строки вывода Maven: поток сборки добавляет их в очередь, окно забирает пачками по таймеру.
+        # Обе очереди ограничены, поэтому память и стоимость отрисовки не растут на длинных сборках
+        self.console_pending = deque(maxlen=CONSOLE_MAX_LINES)
+        self.console_lines = deque(maxlen=CONSOLE_MAX_LINES)
+        self.console_job = None
         
         # Слежение за изменениями в project_path для обновления других полей
         self.project_path.trace_add("write", self.update_fields_based_on_project)
         
+        # Кэш установок Maven/JDK и настройки проектов
+        self.toolchains = self.open_toolchains()
+        self.project_settings = self.open_project_settings()
+        
         # Установим значения по умолчанию
         self.set_default_maven_path()
         
@@ -77,6 +111,13 @@ class MajestyCompilerApp:
         
         # Статус сборки
         self.is_building = False
+        self.metrics = self.open_metrics()
+        self.test_store = self.open_test_store()
+        self.engine = BuildEngine(cache=self.open_build_cache(), toolchains=self.toolchains, metrics=self.metrics,
+                                  log_index=self.open_log_index(), settings=self.project_settings,
+                                  tests=self.test_store)
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         logger.info("Приложение инициализировано")
     
@@ -84,21 +125,31 @@ class MajestyCompilerApp:
         project_path = self.project_path.get()
         
         if project_path and os.path.exists(project_path):
-            # Получаем имя папки проекта
-            project_folder_name = os.path.basename(project_path)
-            
             # Устанавливаем пути относительно проекта
-            output_path = os.path.join(project_path, "MajestyCompiler", "target")
-            log_path = os.path.join(project_path, "MajestyCompiler", "logs")
-            file_name = f"{project_folder_name}-majestycompiler.jar"
+            output_path, log_path, file_name = default_project_paths(project_path)
             
             # Обновляем значения переменных
             self.output_path.set(output_path)
             self.log_path.set(log_path)
             self.filename.set(file_name)
             
+            # Восстанавливаем Maven и JDK, выбранные для проекта ранее
+            if self.project_settings is not None:
+                settings = self.project_settings.get(project_path)
+                if settings.get("maven"):
+                    self.maven_path.set(settings["maven"])
+                self.java_home.set(settings.get("java_home", ""))
+                self.build_profile.set(settings.get("build_profile", ""))
+                self.prefetch.set(settings.get("prefetch", False))
+                self.artifact_patterns.set(" ".join(settings.get("artifact_include", [])
+                                                    + ["!" + p for p in settings.get("artifact_exclude", [])]))
+            
             # Разблокируем кнопку сборки
             self.build_button.config(state=tk.NORMAL)
+            self.versions_button.config(state=tk.NORMAL)
+            self.history_button.config(state=tk.NORMAL if self.metrics is not None else tk.DISABLED)
+            self.tests_button.config(state=tk.NORMAL if self.test_store is not None else tk.DISABLED)
+            self.watch_check.config(state=tk.NORMAL)
             
             logger.info(f"Поля автоматически обновлены на основе пути проекта: {project_path}")
             logger.info(f"Папка пакета: {output_path}")
@@ -107,92 +158,82 @@ class MajestyCompilerApp:
         else:
             # Если путь не указан или не существует, блокируем кнопку
             self.build_button.config(state=tk.DISABLED)
+            self.versions_button.config(state=tk.DISABLED)
+            self.history_button.config(state=tk.DISABLED)
+            self.tests_button.config(state=tk.DISABLED)
+            self.watch_check.config(state=tk.DISABLED)
     
     def set_default_maven_path(self):
-        # Поиск Maven в системных путях
-        logger.info("Поиск Maven в системных путях")
-        maven_cmd = "mvn.cmd" if platform.system() == "Windows" else "mvn"
-        
-        # Проверяем стандартные пути
-        possible_paths = [
-            os.path.join(os.environ.get('MAVEN_HOME', ''), 'bin', maven_cmd),
-            os.path.join(os.environ.get('M2_HOME', ''), 'bin', maven_cmd),
-            maven_cmd  # Просто имя команды, если Maven в PATH
-        ]
-        
-        # Для Windows также проверяем Program Files
-        if platform.system() == "Windows":
-            program_files = [
-                os.environ.get('ProgramFiles', 'C:\\Program Files'),
-                os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)')
-            ]
-            
-            for pf in program_files:
-                maven_dirs = [
-                    os.path.join(pf, 'apache-maven-*', 'bin', maven_cmd),
-                    os.path.join(pf, 'Maven', 'bin', maven_cmd),
-                    os.path.join(pf, 'Java', 'apache-maven-*', 'bin', maven_cmd)
-                ]
-                possible_paths.extend(maven_dirs)
-        
-        # Также ищем в локальной директории
-        if platform.system() == "Windows":
-            local_maven = os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Programs', 'apache-maven-*', 'bin', maven_cmd)
-            possible_paths.append(local_maven)
-            
-        # Также проверяем домашнюю директорию пользователя
-        home_dir = os.path.expanduser("~")
-        home_maven = os.path.join(home_dir, 'apache-maven*', 'bin', maven_cmd)
-        possible_paths.append(home_maven)
-        
-        # Проверяем пути на существование
-        for path in possible_paths:
-            # Раскрываем wildcard-пути если необходимо
-            if '*' in path:
-                parent_dir = os.path.dirname(os.path.dirname(path))
-                if os.path.exists(parent_dir):
-                    try:
-                        subdirs = os.listdir(parent_dir)
-                        for subdir in subdirs:
-                            if "maven" in subdir.lower():
-                                full_path = os.path.join(parent_dir, subdir, 'bin', maven_cmd)
-                                if os.path.exists(full_path):
-                                    self.maven_path.set(full_path)
-                                    logger.info(f"Найден Maven по пути: {full_path}")
-                                    return
-                    except Exception as e:
-                        logger.error(f"Ошибка при поиске Maven: {str(e)}")
-            elif os.path.exists(path):
-                self.maven_path.set(path)
-                logger.info(f"Найден Maven по пути: {path}")
-                return
-        
-        # Если не найдено точного пути, оставляем просто команду
-        self.maven_path.set(maven_cmd)
-        logger.info(f"Maven не найден в стандартных путях, будет использована команда: {maven_cmd}")
+        if self.toolchains is not None:
+            self.maven_path.set(self.toolchains.default_maven(find_maven_executable))
+        else:
+            self.maven_path.set(find_maven_executable())
+    
+    def fill_toolchain_lists(self):
+        """Заполняет списки Maven и JDK из кэша (полный поиск выполняется только при первом открытии)"""
+        if self.toolchains is None:
+            return
+        try:
+            self.maven_combo.config(values=[m.path for m in self.toolchains.mavens()])
+            self.jdk_combo.config(values=[""] + [j.java_home for j in self.toolchains.jdks()])
+        except Exception as e:
+            logger.error(f"Ошибка при получении списка установок Maven/JDK: {str(e)}")
+    
+    def refresh_toolchains(self):
+        if self.toolchains is None:
+            return
+        self.status_label.config(text="Поиск установок Maven и JDK...")
+        self.root.update_idletasks()
+        self.toolchains.refresh()
+        self.fill_toolchain_lists()
+        self.status_label.config(text=f"Найдено установок Maven: {len(self.toolchains.mavens())}, "
+                                      f"JDK: {len(self.toolchains.jdks())}")
     
     def get_next_version_filename(self, base_path, base_name):
         """Определяет следующую версию имени файла, если файл уже существует"""
-        # Проверяем существование файла
-        if not os.path.exists(os.path.join(base_path, base_name)):
-            return base_name
-            
-        # Разбиваем имя файла на части
-        name_parts = os.path.splitext(base_name)
-        base_filename = name_parts[0]
-        extension = name_parts[1]
-        
-        # Ищем существующие версии файла
-        version = 1
-        while True:
-            versioned_name = f"{base_filename}-v{version}{extension}"
-            full_path = os.path.join(base_path, versioned_name)
-            
-            if not os.path.exists(full_path):
-                logger.info(f"Новая версия файла: {versioned_name}")
-                return versioned_name
-                
-            version += 1
+        return get_next_version_filename(base_path, base_name)
+        
+    def open_toolchains(self):
+        try:
+            return ToolchainCache()
+        except Exception as e:
+            logger.error(f"Не удалось открыть кэш установок Maven/JDK: {str(e)}")
+            return None
+        
+    def open_project_settings(self):
+        try:
+            return ProjectSettings()
+        except Exception as e:
+            logger.error(f"Не удалось открыть настройки проектов: {str(e)}")
+            return None
+        
+    def open_build_cache(self):
+        try:
+            return BuildCache()
+        except Exception as e:
+            logger.error(f"Не удалось открыть кэш сборок: {str(e)}")
+            return None
+        
+    def open_log_index(self):
+        try:
+            return LogIndex()
+        except Exception as e:
+            logger.error(f"Не удалось открыть индекс логов: {str(e)}")
+            return None
+        
+    def open_metrics(self):
+        try:
+            return MetricsStore()
+        except Exception as e:
+            logger.error(f"Не удалось открыть историю сборок: {str(e)}")
+            return None
+        
+    def open_test_store(self):
+        try:
+            return TestStore()
+        except Exception as e:
+            logger.error(f"Не удалось открыть историю тестов: {str(e)}")
+            return None
         
     def create_widgets(self):
         # Создаем основной фрейм
@@ -234,20 +275,118 @@ class MajestyCompilerApp:
         self.log_entry = ttk.Entry(main_frame, textvariable=self.log_path, width=field_width, state="readonly")
         self.log_entry.grid(row=3, column=1, pady=5, padx=5, sticky="ew")
         
+        # Выбор Maven (список установок заполняется из кэша при открытии)
+        maven_label = ttk.Label(main_frame, text="Maven:", width=label_width, anchor="w")
+        maven_label.grid(row=4, column=0, sticky=tk.W, pady=5)
+        
+        self.maven_combo = ttk.Combobox(main_frame, textvariable=self.maven_path, width=field_width,
+                                        postcommand=self.fill_toolchain_lists)
+        self.maven_combo.grid(row=4, column=1, pady=5, padx=5, sticky="ew")
+        
+        refresh_button = ttk.Button(main_frame, text="Обновить", command=self.refresh_toolchains)
+        refresh_button.grid(row=4, column=2, pady=5)
+        
+        # Выбор JDK (пустое значение - JAVA_HOME из системы)
+        jdk_label = ttk.Label(main_frame, text="JDK (JAVA_HOME):", width=label_width, anchor="w")
+        jdk_label.grid(row=5, column=0, sticky=tk.W, pady=5)
+        
+        self.jdk_combo = ttk.Combobox(main_frame, textvariable=self.java_home, width=field_width,
+                                      postcommand=self.fill_toolchain_lists)
+        self.jdk_combo.grid(row=5, column=1, pady=5, padx=5, sticky="ew")
+        
+        # Профиль параметров Maven: -T, -o, пропуск тестов и документации (majesty_profiles)
+        profile_label = ttk.Label(main_frame, text="Профиль сборки:", width=label_width, anchor="w")
+        profile_label.grid(row=6, column=0, sticky=tk.W, pady=5)
+        
+        profile_names = [""] + list(load_profiles()) + [PROFILE_BEST]
+        self.profile_combo = ttk.Combobox(main_frame, textvariable=self.build_profile, values=profile_names,
+                                          state="readonly", width=field_width)
+        self.profile_combo.grid(row=6, column=1, pady=5, padx=5, sticky="ew")
+        
+        # Какие артефакты модулей публиковать: шаблоны имен через пробел, с "!" - исключения
+        artifacts_label = ttk.Label(main_frame, text="Артефакты:", width=label_width, anchor="w")
+        artifacts_label.grid(row=7, column=0, sticky=tk.W, pady=5)
+        
+        artifacts_entry = ttk.Entry(main_frame, textvariable=self.artifact_patterns, width=field_width)
+        artifacts_entry.grid(row=7, column=1, pady=5, padx=5, sticky="ew")
+        ttk.Label(main_frame, text="*.war !*-shaded.jar").grid(row=7, column=2, sticky=tk.W, pady=5, padx=5)
+        
+        # Использование кэша сборок
+        cache_check = ttk.Checkbutton(main_frame, text="Пропускать сборку, если проект не изменился (кэш сборок)",
+                                      variable=self.use_cache)
+        cache_check.grid(row=8, column=1, sticky=tk.W, pady=5, padx=5)
+        
+        # Инкрементальная сборка многомодульных проектов
+        incremental_check = ttk.Checkbutton(main_frame, text="Инкрементальная сборка (только измененные модули, без clean)",
+                                            variable=self.incremental)
+        incremental_check.grid(row=9, column=1, sticky=tk.W, pady=5, padx=5)
+        
+        # Прогретый Maven Daemon вместо запуска новой JVM на каждую сборку
+        daemon_check = ttk.Checkbutton(main_frame, text="Использовать Maven Daemon (mvnd), если установлен",
+                                       variable=self.use_daemon)
+        daemon_check.grid(row=10, column=1, sticky=tk.W, pady=5, padx=5)
+        ttk.Button(main_frame, text="Остановить mvnd", command=self.stop_mvnd).grid(row=10, column=2, sticky=tk.W,
+                                                                                  pady=5, padx=5)
+        
+        # Общая очередь сборок этой машины (majesty_cli.py serve) вместо собственного процесса Maven
+        server_check = ttk.Checkbutton(main_frame, text=f"Собирать через сервер сборок ({default_address()})",
+                                       variable=self.use_server)
+        server_check.grid(row=11, column=1, sticky=tk.W, pady=5, padx=5)
+        
+        # Зависимости загружаются заранее под блокировкой локального репозитория, затем сборка идет с -o
+        prefetch_check = ttk.Checkbutton(main_frame, text="Загружать зависимости заранее и собирать автономно (-o)",
+                                         variable=self.prefetch)
+        prefetch_check.grid(row=12, column=1, sticky=tk.W, pady=5, padx=5)
+        
         # Настройка расширения столбцов
         main_frame.columnconfigure(1, weight=1)
         
         # Текст для отображения ошибок
         self.error_label = ttk.Label(main_frame, text="", foreground="red")
-        self.error_label.grid(row=4, column=0, columnspan=3, pady=5, sticky="ew")
+        self.error_label.grid(row=13, column=0, columnspan=3, pady=5, sticky="ew")
         
         # Статус операции
         self.status_label = ttk.Label(main_frame, text="Выберите папку проекта для начала работы", wraplength=750)
-        self.status_label.grid(row=5, column=0, columnspan=3, pady=10, sticky="ew")
+        self.status_label.grid(row=14, column=0, columnspan=3, pady=10, sticky="ew")
+        
+        # Кнопки сборки и просмотра версий (заблокированы до выбора проекта)
+        buttons_frame = ttk.Frame(main_frame)
+        buttons_frame.grid(row=15, column=0, columnspan=3, pady=10)
+        
+        self.build_button = ttk.Button(buttons_frame, text="Собрать проект", command=self.start_build, state=tk.DISABLED)
+        self.build_button.pack(side=tk.LEFT, padx=5)
+        
+        self.versions_button = ttk.Button(buttons_frame, text="Версии...", command=self.show_versions, state=tk.DISABLED)
+        self.versions_button.pack(side=tk.LEFT, padx=5)
+        
+        # Временная диаграмма последней сборки (profile_*.html рядом с логами)
+        self.profile_button = ttk.Button(buttons_frame, text="Профиль сборки", command=self.show_profile, state=tk.DISABLED)
+        self.profile_button.pack(side=tk.LEFT, padx=5)
+        self.last_profile = None
         
-        # Кнопка сборки (заблокирована до выбора проекта)
-        self.build_button = ttk.Button(main_frame, text="Собрать проект", command=self.start_build, state=tk.DISABLED)
-        self.build_button.grid(row=6, column=0, columnspan=3, pady=10)
+        self.history_button = ttk.Button(buttons_frame, text="История...", command=self.show_history, state=tk.DISABLED)
+        self.history_button.pack(side=tk.LEFT, padx=5)
+        
+        # Самые медленные и падающие тесты по отчетам Surefire, число частей тестов для проекта
+        self.tests_button = ttk.Button(buttons_frame, text="Тесты...", command=self.show_tests, state=tk.DISABLED)
+        self.tests_button.pack(side=tk.LEFT, padx=5)
+        
+        # Режим наблюдения: сборка при каждом сохранении файлов в src и pom.xml
+        self.watch_check = ttk.Checkbutton(buttons_frame, text="Автосборка при изменениях", variable=self.watch_mode,
+                                           command=self.toggle_watch, state=tk.DISABLED)
+        self.watch_check.pack(side=tk.LEFT, padx=5)
+        
+        # Консоль с выводом Maven
+        console_header = ttk.Frame(main_frame)
+        console_header.grid(row=16, column=0, columnspan=3, sticky="ew")
+        ttk.Label(console_header, text="Вывод сборки:").pack(side=tk.LEFT)
+        ttk.Checkbutton(console_header, text="Только отфильтрованные строки",
+                        variable=self.console_filtered_only, command=self.redraw_console).pack(side=tk.RIGHT)
+        
+        self.console = ScrolledText(main_frame, height=15, wrap=tk.NONE, state=tk.DISABLED, font=("Consolas", 9))
+        self.console.grid(row=17, column=0, columnspan=3, sticky="nsew", pady=5)
+        self.console.tag_configure("matched", foreground="#b00000")
+        main_frame.rowconfigure(17, weight=1)
         
         logger.debug("Виджеты созданы")
         
@@ -265,7 +404,7 @@ class MajestyCompilerApp:
     
     def is_valid_maven_project(self, path):
         # Проверяем наличие pom.xml в папке проекта
-        return os.path.exists(os.path.join(path, "pom.xml"))
+        return is_valid_maven_project(path)
     
     def show_error(self, message):
         self.error_label.config(text=message)
@@ -294,6 +433,15 @@ class MajestyCompilerApp:
         if not self.maven_path.get():
             self.show_error("Не удалось найти Maven")
             return False
+        
+        # Ошибку в правилах фильтра лучше показать сразу, а не молча собирать со стандартным фильтром
+        rules_path = filter_rules_path()
+        if os.path.exists(rules_path):
+            try:
+                LogFilter.from_file(rules_path)
+            except (OSError, re.error) as e:
+                self.show_error(f"Ошибка в файле правил фильтра {rules_path}: {str(e)}")
+                return False
             
         # Создаем папки если они не существуют
         if not os.path.exists(self.output_path.get()):
@@ -327,158 +475,374 @@ class MajestyCompilerApp:
         self.build_button.config(state=tk.DISABLED)
         self.status_label.config(text="Выполняется сборка...")
         
+        options = self.collect_build_options()
+        
+        self.clear_console()
+        self.console_job = self.root.after(CONSOLE_REFRESH_MS, self.drain_console)
+        
         logger.info("Запуск процесса сборки")
-        build_thread = threading.Thread(target=self.build_project)
+        build_thread = threading.Thread(target=self.build_project, args=(options, self.use_server.get()))
         build_thread.daemon = True
         build_thread.start()
         
-    def build_project(self):
+    def collect_build_options(self):
+        """Параметры сборки из полей окна; выбранные Maven и JDK запоминаются для проекта"""
+        options = BuildOptions(
+            project_dir=self.project_path.get(),
+            output_dir=self.output_path.get(),
+            log_dir=self.log_path.get(),
+            filename=self.filename.get(),
+            maven_path=self.maven_path.get(),
+            use_cache=self.use_cache.get(),
+            incremental=self.incremental.get(),
+            use_daemon=self.use_daemon.get(),
+            java_home=self.java_home.get() or None,
+            build_profile=self.build_profile.get() or None,
+            prefetch=self.prefetch.get()
+        )
+        if self.project_settings is not None:
+            options.test_shards = self.project_settings.get(options.project_dir).get("test_shards", 0)
+        patterns = self.artifact_patterns.get().split()
+        options.artifact_include = [p for p in patterns if not p.startswith("!")]
+        options.artifact_exclude = [p[1:] for p in patterns if p.startswith("!") and len(p) > 1]
+        if self.project_settings is not None:
+            self.project_settings.update(options.project_dir, maven=options.maven_path, java_home=options.java_home,
+                                         build_profile=options.build_profile,
+                                         artifact_include=options.artifact_include,
+                                         artifact_exclude=options.artifact_exclude,
+                                         prefetch=options.prefetch or None)
+        return options
+        
+    def build_project(self, options, use_server=False):
         try:
-            project_dir = self.project_path.get()
-            output_dir = self.output_path.get()
-            filename = self.filename.get()
-            log_dir = self.log_path.get()
-            maven_path = self.maven_path.get()
+            if use_server:
+                result = self.build_via_server(options)
+            else:
+                result = self.engine.build(options, listeners=[self.on_build_line])
+            self.root.after(0, lambda: self.show_build_result(result))
+        except Exception as e:
+            logger.exception(f"Критическая ошибка при сборке: {str(e)}")
+            message = f"Произошла ошибка: {str(e)}"
+            self.root.after(0, lambda: self.show_error(message))
+            self.root.after(0, lambda: self.update_status("Ошибка при выполнении сборки"))
+        finally:
+            self.root.after(0, self.finish_build)
+            
+    def build_via_server(self, options):
+        """Ставит сборку в очередь сервера сборок и транслирует ее вывод в консоль"""
+        client = JobClient()
+        try:
+            log_filter = load_log_filter(options.filter_rules)
+            # Maven, JDK и папки сервер берет из своих настроек проекта
+            overrides = {name: value for name, value in asdict(options).items() if name in OPTION_FIELDS}
+            job = client.submit(options.project_dir, overrides)
+            logger.info(f"Сборка поставлена в очередь сервера: задание {job['id']}")
+            message = f"Сборка в очереди сервера (задание {job['id']}, перед ней: {job.get('position') or 0})"
+            self.root.after(0, lambda: self.update_status(message))
+            job = client.wait(job["id"], lambda line: self.on_build_line(line, log_filter.matches(line)))
+        except JobServerError as e:
+            logger.error(f"Ошибка сервера сборок: {str(e)}")
+            return BuildResult(options.project_dir, status="Сервер сборок недоступен", error=str(e))
+        if job.get("result"):
+            return result_from_dict(job["result"])
+        return BuildResult(options.project_dir, status=f"Задание {job['id']}: {job['state']}", error=job.get("error"))
             
-            logger.info(f"Начало сборки проекта: {project_dir}")
-            logger.info(f"Выходная папка: {output_dir}")
-            logger.info(f"Имя файла: {filename}")
-            logger.info(f"Папка для логов: {log_dir}")
-            logger.info(f"Путь к Maven: {maven_path}")
+    def show_build_result(self, result):
+        if result.profile_timeline:
+            self.set_last_profile(result.profile_timeline)
+        if result.error:
+            self.show_error(result.error)
+        if result.status:
+            status = result.status
+            if result.test_count and not result.test_failures:
+                status += f"\nТестов: {result.test_count}, пропущено {result.test_skipped}, {result.test_time:.1f} с"
+            self.update_status(f"{status}\n{result.regression}" if result.regression else status)
             
-            # Формируем имена лог-файлов с временной меткой
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            full_log_file = os.path.join(log_dir, f"full_log_{timestamp}.txt")
-            filtered_log_file = os.path.join(log_dir, f"filtered_log_{timestamp}.txt")
+    def toggle_watch(self):
+        if self.watch_mode.get():
+            self.start_watch()
+        else:
+            self.stop_watch()
             
-            logger.info(f"Файл полного лога: {full_log_file}")
-            logger.info(f"Файл отфильтрованного лога: {filtered_log_file}")
+    def start_watch(self):
+        """Включает автосборку: первая сборка сразу, затем после каждой серии изменений"""
+        if self.is_building or not self.validate_inputs():
+            self.watch_mode.set(False)
+            return
+        
+        self.clear_error()
+        self.build_button.config(state=tk.DISABLED)
+        self.watch_builder = WatchBuilder(
+            self.engine, self.collect_build_options(), listeners=[self.on_build_line],
+            on_start=lambda changed: self.root.after(0, lambda: self.on_watch_build_started(changed)),
+            on_result=lambda result: self.root.after(0, lambda: self.on_watch_build_finished(result))
+        )
+        self.watch_builder.start()
+        logger.info(f"Автосборка включена ({self.watch_builder.watcher.backend.name})")
+        
+    def stop_watch(self):
+        builder, self.watch_builder = self.watch_builder, None
+        if builder is not None:
+            # Остановка может ждать завершения Maven - не блокируем окно
+            threading.Thread(target=builder.stop, daemon=True).start()
+        self.build_button.config(state=tk.NORMAL)
+        self.update_status("Автосборка выключена")
+        
+    def on_watch_build_started(self, changed):
+        if self.watch_builder is None:
+            return
+        self.is_building = True
+        self.clear_error()
+        self.clear_console()
+        self.console_job = self.root.after(CONSOLE_REFRESH_MS, self.drain_console)
+        reason = f"изменено файлов: {len(changed)}" if changed else "первая сборка"
+        self.status_label.config(text=f"Автосборка ({reason})...")
+        
+    def on_watch_build_finished(self, result):
+        self.is_building = False
+        if self.console_job is not None:
+            self.root.after_cancel(self.console_job)
+        self.drain_console()
+        if not result.cancelled:
+            self.show_build_result(result)
             
-            # Запускаем команду Maven
-            si = subprocess.STARTUPINFO()
-            si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    def on_close(self):
+        if self.watch_builder is not None:
+            self.watch_builder.stop()
+        self.root.destroy()
             
-            # Проверяем доступность Maven
+    def set_last_profile(self, path):
+        self.last_profile = path
+        self.profile_button.config(state=tk.NORMAL)
+        
+    def show_profile(self):
+        """Открывает временную диаграмму последней сборки в браузере"""
+        if self.last_profile and os.path.exists(self.last_profile):
+            webbrowser.open(f"file://{os.path.abspath(self.last_profile)}")
+        else:
+            self.show_error("Профиль последней сборки не найден")
+        
+    def show_versions(self):
+        """Окно со списком опубликованных версий артефактов текущего проекта"""
+        output_dir = self.output_path.get()
+        versions = []
+        if output_dir and os.path.isdir(output_dir):
+            # В многомодульном проекте у каждого артефакта своя нумерация версий
+            versions = sorted(VersionRegistry.open(output_dir).list_versions(), key=lambda v: v.timestamp)
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"Версии артефактов: {output_dir}")
+        window.geometry("900x300")
+        
+        columns = ("version", "time", "size", "sha256", "filename")
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, title, width in [("version", "Версия", 60), ("time", "Дата", 140), ("size", "Размер", 100),
+                                     ("sha256", "SHA-256", 120), ("filename", "Файл", 400)]:
+            tree.heading(column, text=title)
+            tree.column(column, width=width, anchor="w")
+        for entry in reversed(versions):
+            tree.insert("", tk.END, values=(
+                f"v{entry.version}", format_version_time(entry.timestamp), f"{entry.size / 1024:.0f} КБ",
+                entry.sha256[:12], entry.filename
+            ))
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        if not versions:
+            ttk.Label(window, text="Опубликованных версий пока нет").pack(pady=5)
+        
+    def show_history(self):
+        """Окно с историей сборок проекта; замедлившиеся сборки выделены цветом"""
+        project_dir = self.project_path.get()
+        window = tk.Toplevel(self.root)
+        window.title(f"История сборок {os.path.basename(project_dir)}")
+        window.geometry("900x400")
+        
+        controls = ttk.Frame(window)
+        controls.pack(fill=tk.X, padx=10, pady=(10, 0))
+        ttk.Label(controls, text="Порог замедления, %:").pack(side=tk.LEFT)
+        threshold = tk.IntVar(value=int(self.metrics.threshold * 100))
+        baseline_label = ttk.Label(controls, text="")
+        
+        columns = ("id", "time", "duration", "lines", "warnings", "errors", "size", "result")
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, title, width in [("id", "№", 50), ("time", "Дата", 140), ("duration", "Время", 80),
+                                     ("lines", "Строк", 80), ("warnings", "Предупр.", 80), ("errors", "Ошибок", 70),
+                                     ("size", "JAR", 90), ("result", "Результат", 250)]:
+            tree.heading(column, text=title)
+            tree.column(column, width=width, anchor="w")
+        tree.tag_configure("regression", foreground="red")
+        
+        def fill():
+            tree.delete(*tree.get_children())
             try:
-                # Определяем команду Maven в зависимости от того, путь это или просто имя
-                if os.path.exists(maven_path):
-                    # Если указан полный путь к Maven
-                    mvn_cmd = maven_path
-                    logger.info(f"Используем Maven по указанному пути: {mvn_cmd}")
-                else:
-                    # Если указано только имя команды
-                    mvn_cmd = maven_path
-                    logger.info(f"Используем Maven из PATH: {mvn_cmd}")
-                
-                check_mvn = subprocess.run(
-                    [mvn_cmd, "--version"], 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE,
-                    startupinfo=si
-                )
-                if check_mvn.returncode != 0:
-                    error_output = check_mvn.stderr.decode('utf-8', errors='replace')
-                    logger.error(f"Maven недоступен: {error_output}")
-                    raise Exception(f"Maven не установлен или не доступен: {error_output}")
-                else:
-                    version_output = check_mvn.stdout.decode('utf-8', errors='replace')
-                    logger.info(f"Maven доступен: {version_output.splitlines()[0]}")
+                records = self.metrics.builds(project_dir, limit=200)
+                limit = max(threshold.get(), 0) / 100
             except Exception as e:
-                logger.error(f"Ошибка при проверке Maven: {str(e)}")
-                self.root.after(0, lambda: self.show_error(f"Ошибка Maven: {str(e)}"))
-                self.root.after(0, self.finish_build)
+                logger.error(f"Ошибка при чтении истории сборок: {str(e)}")
                 return
-            
-            # Запускаем Maven
-            logger.info("Запуск Maven процесса")
-            process = subprocess.Popen(
-                [mvn_cmd, "clean", "package"],
-                cwd=project_dir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                startupinfo=si
-            )
-            
-            with open(full_log_file, 'w', encoding='utf-8') as full_log:
-                with open(filtered_log_file, 'w', encoding='utf-8') as filtered_log:
-                    filtered_log.write(f"=== Отфильтрованный лог сборки {timestamp} ===\n\n")
-                    
-                    line_count = 0
-                    while True:
-                        line = process.stdout.readline()
-                        if not line and process.poll() is not None:
-                            break
-                            
-                        if line:
-                            line_count += 1
-                            full_log.write(line)
-                            full_log.flush()
-                            
-                            # Фильтрация важных сообщений
-                            if any(keyword in line for keyword in 
-                                   ["BUILD SUCCESS", "BUILD FAILURE", "WARNING", "ERROR"]):
-                                filtered_log.write(line)
-                                filtered_log.flush()
-                                logger.info(f"Важное сообщение в логе: {line.strip()}")
-                            
-                            # Периодически обновляем статус
-                            if line_count % 100 == 0:
-                                logger.debug(f"Обработано {line_count} строк лога")
-            
-            logger.info(f"Процесс сборки завершен с кодом: {process.returncode}")
-            
-            # Проверяем успешность сборки
-            if process.returncode == 0:
-                logger.info("Сборка успешна")
-                # Копируем JAR файл, если сборка успешна
-                target_dir = os.path.join(project_dir, "target")
-                logger.debug(f"Поиск JAR файлов в директории: {target_dir}")
-                
-                if os.path.exists(target_dir):
-                    jar_files = [f for f in os.listdir(target_dir) if f.endswith(".jar") and not f.endswith("-sources.jar")]
-                    logger.debug(f"Найдены JAR файлы: {jar_files}")
-                    
-                    if jar_files:
-                        # Берем первый найденный JAR файл
-                        source_jar = os.path.join(target_dir, jar_files[0])
-                        
-                        # Проверяем, существует ли файл в папке назначения и получаем имя с версией, если нужно
-                        final_filename = self.get_next_version_filename(output_dir, filename)
-                        dest_jar = os.path.join(output_dir, final_filename)
-                        
-                        logger.info(f"Копирование JAR из {source_jar} в {dest_jar}")
-                        
-                        try:
-                            # Копируем JAR в выходную директорию
-                            with open(source_jar, 'rb') as src_file:
-                                with open(dest_jar, 'wb') as dest_file:
-                                    dest_file.write(src_file.read())
-                                    
-                            self.root.after(0, lambda: self.update_status(f"Сборка успешно завершена. JAR сохранен в: {dest_jar}"))
-                        except Exception as e:
-                            logger.error(f"Ошибка при копировании JAR: {str(e)}")
-                            self.root.after(0, lambda: self.show_error(f"Ошибка при копировании JAR: {str(e)}"))
-                            self.root.after(0, lambda: self.update_status("Сборка успешна, но возникла ошибка при копировании JAR"))
-                    else:
-                        logger.warning("JAR файл не найден в директории target")
-                        self.root.after(0, lambda: self.update_status("Сборка успешна, но JAR файл не найден"))
+            for record in records:
+                result = "Успешно" if record.success else "Ошибка"
+                if record.cache_hit:
+                    result += ", из кэша"
+                regression = self.metrics.check_regression(record, threshold=limit)
+                if regression:
+                    result += f", медленнее на {(regression.ratio - 1):.0%}"
+                tree.insert("", tk.END, tags=("regression",) if regression else (), values=(
+                    record.id, format_version_time(record.started), f"{record.duration:.1f} с", record.lines,
+                    record.warnings, record.errors, f"{record.artifact_size / 1024:.0f} КБ", result
+                ))
+            baseline = self.metrics.baseline(project_dir)
+            baseline_label.config(text=f"Базовое время: {baseline:.1f} с" if baseline else "Базовое время: мало данных")
+        
+        ttk.Spinbox(controls, from_=5, to=500, increment=5, width=5, textvariable=threshold,
+                    command=fill).pack(side=tk.LEFT, padx=5)
+        baseline_label.pack(side=tk.LEFT, padx=20)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        fill()
+        
+    def stop_mvnd(self):
+        """Останавливает демоны mvnd, например чтобы освободить память или применить новые настройки JVM"""
+        maven_path = self.maven_path.get()
+        
+        def stop():
+            mvnd_path = find_mvnd(maven_path)
+            if not mvnd_path:
+                message = "Maven Daemon (mvnd) не найден"
+            elif stop_daemons(mvnd_path, startupinfo()):
+                message = "Maven Daemon остановлен"
+            else:
+                message = "Не удалось остановить Maven Daemon, подробности в журнале"
+            self.root.after(0, lambda: self.update_status(message))
+        
+        self.update_status("Остановка Maven Daemon...")
+        threading.Thread(target=stop, daemon=True).start()
+        
+    def show_tests(self):
+        """Окно с самыми медленными и падающими тестами проекта по истории отчетов Surefire"""
+        project_dir = self.project_path.get()
+        window = tk.Toplevel(self.root)
+        window.title(f"Тесты {os.path.basename(project_dir)}")
+        window.geometry("900x400")
+        
+        controls = ttk.Frame(window)
+        controls.pack(fill=tk.X, padx=10, pady=(10, 0))
+        view = tk.StringVar(value="tests")
+        settings = self.project_settings.get(project_dir) if self.project_settings is not None else {}
+        shards = tk.IntVar(value=settings.get("test_shards", 0))
+        summary_label = ttk.Label(window, text="")
+        
+        columns = ("average", "longest", "failures", "name")
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column, title, width in [("average", "Среднее", 90), ("longest", "Макс.", 90), ("failures", "Падал", 70),
+                                     ("name", "Тест", 600)]:
+            tree.heading(column, text=title)
+            tree.column(column, width=width, anchor="w")
+        tree.tag_configure("failed", foreground="red")
+        
+        def fill():
+            tree.delete(*tree.get_children())
+            try:
+                if view.get() == "classes":
+                    timings = self.test_store.slowest_classes(project_dir, limit=200)
+                elif view.get() == "failures":
+                    timings = self.test_store.failing_tests(project_dir, limit=200)
                 else:
-                    logger.error(f"Директория target не найдена: {target_dir}")
-                    self.root.after(0, lambda: self.show_error(f"Директория target не найдена: {target_dir}"))
-                    self.root.after(0, lambda: self.update_status("Сборка завершена, но директория target не найдена"))
+                    timings = self.test_store.slowest_tests(project_dir, limit=200)
+                runs = self.test_store.runs(project_dir, limit=1)
+            except Exception as e:
+                logger.error(f"Ошибка при чтении истории тестов: {str(e)}")
+                return
+            for timing in timings:
+                tree.insert("", tk.END, tags=("failed",) if timing.failures else (), values=(
+                    f"{timing.average:.2f} с", f"{timing.longest:.2f} с",
+                    f"{timing.failures} из {timing.runs}" if timing.failures else "", timing.full_name
+                ))
+            if runs:
+                _, started, tests, failures, skipped, duration, _, _ = runs[0]
+                summary_label.config(text=f"Последний запуск {format_version_time(started)}: тестов {tests}, "
+                                          f"упало {failures}, пропущено {skipped}, {duration:.1f} с")
             else:
-                logger.error("Ошибка сборки Maven")
-                self.root.after(0, lambda: self.update_status("Ошибка сборки. Проверьте лог-файлы."))
-                
-        except Exception as e:
-            logger.exception(f"Критическая ошибка при сборке: {str(e)}")
-            self.root.after(0, lambda: self.show_error(f"Произошла ошибка: {str(e)}"))
-            self.root.after(0, lambda: self.update_status("Ошибка при выполнении сборки"))
-        finally:
-            logger.info("Завершение процесса сборки")
-            self.root.after(0, self.finish_build)
+                summary_label.config(text="Отчетов тестов пока нет: соберите проект с тестами")
+        
+        def save_shards():
+            if self.project_settings is None:
+                return
+            try:
+                value = max(shards.get(), 0)
+            except tk.TclError:
+                return
+            self.project_settings.update(project_dir, test_shards=value or None)
+        
+        for value, text in [("tests", "Медленные тесты"), ("classes", "Медленные классы"), ("failures", "Падавшие")]:
+            ttk.Radiobutton(controls, text=text, value=value, variable=view, command=fill).pack(side=tk.LEFT, padx=5)
+        ttk.Spinbox(controls, from_=0, to=32, width=4, textvariable=shards,
+                    command=save_shards).pack(side=tk.RIGHT)
+        ttk.Label(controls, text="Частей тестов в сборке (0 - не делить):").pack(side=tk.RIGHT, padx=5)
+        summary_label.pack(fill=tk.X, padx=10, pady=(5, 0))
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        window.bind("<Destroy>", lambda event: save_shards() if event.widget is window else None)
+        fill()
+        
+    def on_build_line(self, line, matched):
+        # Вызывается в потоке сборки: только кладем строку в очередь, окно обновляется по таймеру
+        self.console_pending.append((line, matched))
+        
+    def clear_console(self):
+        if self.console_job is not None:
+            self.root.after_cancel(self.console_job)
+            self.console_job = None
+        self.console_pending.clear()
+        self.console_lines.clear()
+        self.console.config(state=tk.NORMAL)
+        self.console.delete("1.0", tk.END)
+        self.console.config(state=tk.DISABLED)
+        
+    def drain_console(self):
+        """Переносит накопившиеся строки в консоль одной вставкой"""
+        batch = []
+        while self.console_pending:
+            batch.append(self.console_pending.popleft())
+        
+        if batch:
+            self.console_lines.extend(batch)
+            self.console.config(state=tk.NORMAL)
+            self.insert_console_lines(batch[-CONSOLE_MAX_LINES:])
+            # Удаляем самые старые строки сверх лимита
+            line_total = int(self.console.index("end-1c").split(".")[0])
+            if line_total > CONSOLE_MAX_LINES:
+                self.console.delete("1.0", f"{line_total - CONSOLE_MAX_LINES + 1}.0")
+            self.console.config(state=tk.DISABLED)
+            self.console.see(tk.END)
+        
+        if self.is_building:
+            self.console_job = self.root.after(CONSOLE_REFRESH_MS, self.drain_console)
+        else:
+            self.console_job = None
+            
+    def insert_console_lines(self, lines):
+        """Вставляет строки, объединяя подряд идущие строки с одинаковой подсветкой в одну вставку"""
+        filtered_only = self.console_filtered_only.get()
+        chunk = []
+        chunk_matched = False
+        for line, matched in lines:
+            if filtered_only and not matched:
+                continue
+            if chunk and matched != chunk_matched:
+                self.console.insert(tk.END, "".join(chunk), ("matched",) if chunk_matched else ())
+                chunk = []
+            chunk.append(line)
+            chunk_matched = matched
+        if chunk:
+            self.console.insert(tk.END, "".join(chunk), ("matched",) if chunk_matched else ())
             
+    def redraw_console(self):
+        """Перерисовывает консоль из кольцевого буфера при переключении фильтра"""
+        self.console.config(state=tk.NORMAL)
+        self.console.delete("1.0", tk.END)
+        self.insert_console_lines(self.console_lines)
+        self.console.config(state=tk.DISABLED)
+        self.console.see(tk.END)
+        
     def update_status(self, message):
         self.status_label.config(text=message)
         logger.info(f"Статус обновлен: {message}")
@@ -486,10 +850,15 @@ class MajestyCompilerApp:
     def finish_build(self):
         self.build_button.config(state=tk.NORMAL)
         self.is_building = False
+        if self.console_job is not None:
+            self.root.after_cancel(self.console_job)
+        self.drain_console()
         logger.info("Процесс сборки завершен")
         messagebox.showinfo("Сборка завершена", "Процесс сборки Maven завершен. Проверьте статус и лог-файлы.")
 
 if __name__ == "__main__":
+    # Журнал пишется фоновым потоком с ротацией (см. majesty_logging)
+    setup_logging()
     try:
         root = tk.Tk()
         app = MajestyCompilerApp(root)
@@ -0,0 +1,92 @@
+"""Поддержка Maven Daemon (mvnd).
+
+mvnd держит прогретую JVM с загруженными плагинами Maven между сборками,
+поэтому повторные небольшие сборки выполняются в разы быстрее. Если mvnd
+не установлен или не запускается, сборка выполняется обычным Maven.
+"""
+import logging
+import os
+import platform
+import shutil
+import subprocess
+
+logger = logging.getLogger('MajestyCompiler')
+
+
+def mvnd_command_names():
+    if platform.system() == "Windows":
+        return ["mvnd.cmd", "mvnd.exe"]
+    return ["mvnd"]
+
+
+def find_mvnd(maven_path=None):
+    """Ищет mvnd в MVND_HOME, рядом с выбранным Maven и в PATH; возвращает путь или None"""
+    names = mvnd_command_names()
+    candidates = []
+
+    mvnd_home = os.environ.get("MVND_HOME")
+    if mvnd_home:
+        candidates.extend(os.path.join(mvnd_home, "bin", name) for name in names)
+
+    # Дистрибутив mvnd часто распаковывают рядом с Maven
+    if maven_path and os.path.isabs(maven_path):
+        maven_bin = os.path.dirname(maven_path)
+        candidates.extend(os.path.join(maven_bin, name) for name in names)
+        install_root = os.path.dirname(os.path.dirname(maven_bin))
+        if os.path.isdir(install_root):
+            try:
+                for subdir in os.listdir(install_root):
+                    if subdir.lower().startswith("maven-mvnd"):
+                        candidates.extend(os.path.join(install_root, subdir, "bin", name) for name in names)
+            except OSError as e:
+                logger.debug(f"Не удалось просмотреть {install_root}: {str(e)}")
+
+    for path in candidates:
+        if os.path.isfile(path):
+            logger.info(f"Найден Maven Daemon: {path}")
+            return path
+
+    for name in names:
+        path = shutil.which(name)
+        if path:
+            logger.info(f"Найден Maven Daemon в PATH: {path}")
+            return path
+
+    logger.info("Maven Daemon (mvnd) не найден")
+    return None
+
+
+def daemon_arguments():
+    """Аргументы mvnd для вывода в файл: без интерактивного интерфейса"""
+    return ["-B"]
+
+
+def daemon_status(mvnd_path, startupinfo=None):
+    """Возвращает вывод mvnd --status (список запущенных демонов) или None при ошибке"""
+    try:
+        status = subprocess.run(
+            [mvnd_path, "--status"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            startupinfo=startupinfo,
+            timeout=30
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Не удалось получить статус Maven Daemon: {str(e)}")
+        return None
+    return status.stdout.decode('utf-8', errors='replace')
+
+
+def stop_daemons(mvnd_path, startupinfo=None):
+    """Останавливает все запущенные демоны mvnd; возвращает True при успехе"""
+    try:
+        stopped = subprocess.run([mvnd_path, "--stop"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                 startupinfo=startupinfo, timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Не удалось остановить Maven Daemon: {str(e)}")
+        return False
+    if stopped.returncode != 0:
+        logger.warning(f"mvnd --stop завершился с кодом {stopped.returncode}")
+        return False
+    logger.info("Maven Daemon остановлен")
+    return True
@@ -0,0 +1,1062 @@
+"""Движок сборки Maven-проектов, не зависящий от графического интерфейса.
+
+Модуль используется как окном MajestyCompilerApp, так и консольной
+утилитой majesty_cli.py для пакетной сборки нескольких проектов.
+"""
+import contextlib
+import logging
+import os
+import re
+import platform
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from majesty_artifacts import (DEFAULT_ARTIFACT_TYPES, Artifact, PublishedArtifact, assign_published_names,
+                               discover_artifacts, primary_artifact, publish_artifacts)
+from majesty_cache import compute_cache_key
+from majesty_daemon import daemon_arguments, find_mvnd
+from majesty_logpipe import LogPipeline, LogStats, load_log_filter
+from majesty_prefetch import (PrefetchError, RepositoryLock, default_local_repository_override, default_mirror,
+                              is_resolved, local_repository, prefetch_goals, repository_arguments)
+from majesty_profiler import BuildProfiler
+from majesty_profiles import pom_digest, profile_arguments, profile_stats_update, resolve_profile
+from majesty_publish import DEDUP_SKIP
+from majesty_registry import VersionRegistry
+from majesty_reactor import ModuleIndex, dependents_of, load_reactor, plan_incremental_build
+from majesty_tests import (can_shard, collect_reports, has_reactor_dependencies, plan_shards, shard_arguments,
+                           shard_base_arguments)
+
+logger = logging.getLogger('MajestyCompiler')
+
+# Размер буфера чтения вывода Maven
+STDOUT_BUFFER_SIZE = 64 * 1024
+# Сколько ждать завершения Maven после SIGTERM, прежде чем убить принудительно
+TERMINATE_TIMEOUT = 5
+# Сколько упавших тестов перечислять в статусе сборки
+MAX_FAILED_TESTS = 20
+
+
+class BuildError(Exception):
+    """Ошибка подготовки или выполнения сборки"""
+
+
+def maven_command_name():
+    """Имя исполняемого файла Maven для текущей платформы"""
+    return "mvn.cmd" if platform.system() == "Windows" else "mvn"
+
+
+def startupinfo():
+    """Параметры запуска процесса без окна консоли (только для Windows)"""
+    if platform.system() != "Windows":
+        return None
+    si = subprocess.STARTUPINFO()
+    si.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return si
+
+
+def java_environment(java_home):
+    """Окружение процесса с выбранным JDK; None - окружение текущего процесса"""
+    if not java_home:
+        return None
+    env = dict(os.environ)
+    env["JAVA_HOME"] = java_home
+    env["PATH"] = os.path.join(java_home, "bin") + os.pathsep + env.get("PATH", "")
+    return env
+
+
+def process_group_kwargs():
+    """Параметры Popen, позволяющие затем завершить Maven вместе с дочерними процессами"""
+    if platform.system() == "Windows":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def kill_process_tree(process):
+    """Завершает процесс со всеми дочерними (форки surefire, демоны плагинов)"""
+    if process.poll() is not None:
+        return
+    logger.info(f"Остановка дерева процессов Maven (PID {process.pid})")
+    if platform.system() == "Windows":
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(process.pid)],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, startupinfo=startupinfo())
+        return
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(TERMINATE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # Maven запущен без отдельной группы процессов (сборка без отмены) - завершаем только его
+        process.kill()
+
+
+class BuildCancellation:
+    """Позволяет прервать выполняющуюся сборку из другого потока"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Процессы сборки: загрузка зависимостей, основная сборка и параллельные части тестов
+        self._processes = []
+        self.cancelled = False
+
+    def attach(self, process):
+        with self._lock:
+            self._processes = [p for p in self._processes if p.poll() is None] + [process]
+            cancelled = self.cancelled
+        if cancelled:
+            kill_process_tree(process)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            kill_process_tree(process)
+
+
+def find_maven_executable():
+    """Ищет Maven в системных путях и возвращает путь к нему или имя команды"""
+    logger.info("Поиск Maven в системных путях")
+    maven_cmd = maven_command_name()
+
+    # Проверяем стандартные пути
+    possible_paths = [
+        os.path.join(os.environ.get('MAVEN_HOME', ''), 'bin', maven_cmd),
+        os.path.join(os.environ.get('M2_HOME', ''), 'bin', maven_cmd),
+        maven_cmd  # Просто имя команды, если Maven в PATH
+    ]
+
+    # Для Windows также проверяем Program Files
+    if platform.system() == "Windows":
+        program_files = [
+            os.environ.get('ProgramFiles', 'C:\\Program Files'),
+            os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)')
+        ]
+
+        for pf in program_files:
+            maven_dirs = [
+                os.path.join(pf, 'apache-maven-*', 'bin', maven_cmd),
+                os.path.join(pf, 'Maven', 'bin', maven_cmd),
+                os.path.join(pf, 'Java', 'apache-maven-*', 'bin', maven_cmd)
+            ]
+            possible_paths.extend(maven_dirs)
+
+    # Также ищем в локальной директории
+    if platform.system() == "Windows":
+        local_maven = os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Programs', 'apache-maven-*', 'bin', maven_cmd)
+        possible_paths.append(local_maven)
+
+    # Также проверяем домашнюю директорию пользователя
+    home_dir = os.path.expanduser("~")
+    home_maven = os.path.join(home_dir, 'apache-maven*', 'bin', maven_cmd)
+    possible_paths.append(home_maven)
+
+    # Проверяем пути на существование
+    for path in possible_paths:
+        # Раскрываем wildcard-пути если необходимо
+        if '*' in path:
+            parent_dir = os.path.dirname(os.path.dirname(path))
+            if os.path.exists(parent_dir):
+                try:
+                    subdirs = os.listdir(parent_dir)
+                    for subdir in subdirs:
+                        if "maven" in subdir.lower():
+                            full_path = os.path.join(parent_dir, subdir, 'bin', maven_cmd)
+                            if os.path.exists(full_path):
+                                logger.info(f"Найден Maven по пути: {full_path}")
+                                return full_path
+                except Exception as e:
+                    logger.error(f"Ошибка при поиске Maven: {str(e)}")
+        elif os.path.exists(path):
+            logger.info(f"Найден Maven по пути: {path}")
+            return path
+
+    # Если не найдено точного пути, оставляем просто команду
+    logger.info(f"Maven не найден в стандартных путях, будет использована команда: {maven_cmd}")
+    return maven_cmd
+
+
+def get_next_version_filename(base_path, base_name):
+    """Определяет следующую версию имени файла, если файл уже существует"""
+    return VersionRegistry.open(base_path).peek_next(base_name)
+
+
+def toolchain_fingerprint(version_output):
+    """Выделяет из вывода mvn --version строки с версиями Maven и JDK"""
+    lines = [line.strip() for line in version_output.splitlines()
+             if (line.startswith("Apache Maven") and not line.startswith("Apache Maven Daemon"))
+             or line.startswith("Java version")]
+    return "\n".join(lines)
+
+
+def default_project_paths(project_dir):
+    """Возвращает папку пакета, папку логов и имя файла по умолчанию для проекта"""
+    project_folder_name = os.path.basename(os.path.normpath(project_dir))
+    output_path = os.path.join(project_dir, "MajestyCompiler", "target")
+    log_path = os.path.join(project_dir, "MajestyCompiler", "logs")
+    file_name = f"{project_folder_name}-majestycompiler.jar"
+    return output_path, log_path, file_name
+
+
+def is_valid_maven_project(path):
+    """Проверяет наличие pom.xml в папке проекта"""
+    return os.path.exists(os.path.join(path, "pom.xml"))
+
+
+@dataclass
+class BuildOptions:
+    """Параметры сборки одного проекта"""
+    project_dir: str
+    output_dir: str
+    log_dir: str
+    filename: str
+    maven_path: str
+    goals: List[str] = field(default_factory=lambda: ["clean", "package"])
+    use_cache: bool = True
+    # Собирать без clean только измененные модули и зависящие от них (-pl ... -amd)
+    incremental: bool = False
+    # Использовать Maven Daemon (mvnd), если он установлен
+    use_daemon: bool = False
+    # JDK для сборки (JAVA_HOME); None - как настроено в системе
+    java_home: Optional[str] = None
+    # Правила отфильтрованного лога (см. majesty_logpipe); None - из log_filters.txt или стандартные
+    filter_rules: Optional[List[str]] = None
+    # Писать логи на диск из отдельного потока
+    log_writer_thread: bool = False
+    # Что делать, если JAR совпадает с последней версией: skip, link или off (см. majesty_publish)
+    dedup: str = DEDUP_SKIP
+    # Хранение версий в папке вывода: сколько последних оставить и предельный объем в МБ
+    keep_last: Optional[int] = None
+    max_versions_mb: Optional[int] = None
+    # Сохранять профиль сборки (время модулей, фаз и плагинов) рядом с логами
+    profile: bool = True
+    # Профиль параметров Maven (см. majesty_profiles): fast, full, best или свой; None - только цели
+    build_profile: Optional[str] = None
+    # Какие артефакты модулей публиковать (см. majesty_artifacts): типы упаковки и шаблоны имен
+    artifact_types: List[str] = field(default_factory=lambda: list(DEFAULT_ARTIFACT_TYPES))
+    artifact_include: List[str] = field(default_factory=list)
+    artifact_exclude: List[str] = field(default_factory=list)
+    # Сколько артефактов копировать одновременно; None - по умолчанию
+    publish_workers: Optional[int] = None
+    # Загружать зависимости перед сборкой (см. majesty_prefetch) и собирать с -o; режим go-offline или resolve
+    prefetch: bool = False
+    prefetch_mode: str = "go-offline"
+    # Зеркало репозиториев (папка или URL) и локальный репозиторий Maven; None - как настроено в Maven
+    mirror: Optional[str] = field(default_factory=default_mirror)
+    local_repository: Optional[str] = field(default_factory=default_local_repository_override)
+    # На сколько параллельных процессов Maven делить тесты по истории их времени (majesty_tests); 0 - не делить
+    test_shards: int = 0
+
+    @classmethod
+    def for_project(cls, project_dir, maven_path, output_root=None, log_root=None):
+        """Параметры по умолчанию; при пакетной сборке логи и пакеты раскладываются по папкам проектов"""
+        project_dir = os.path.abspath(project_dir)
+        output_dir, log_dir, filename = default_project_paths(project_dir)
+        project_name = os.path.basename(project_dir)
+        if output_root:
+            output_dir = os.path.join(output_root, project_name)
+        if log_root:
+            log_dir = os.path.join(log_root, project_name)
+        return cls(project_dir, output_dir, log_dir, filename, maven_path)
+
+
+@dataclass
+class BuildResult:
+    """Итог сборки одного проекта"""
+    project_dir: str
+    success: bool = False
+    returncode: Optional[int] = None
+    artifact: Optional[str] = None
+    artifact_sha256: Optional[str] = None
+    artifact_size: int = 0
+    deduplicated: bool = False
+    # Все опубликованные артефакты модулей; поля artifact* выше относятся к основному из них
+    artifacts: List[PublishedArtifact] = field(default_factory=list)
+    full_log: Optional[str] = None
+    filtered_log: Optional[str] = None
+    line_count: int = 0
+    lines_per_sec: float = 0.0
+    warning_count: int = 0
+    error_count: int = 0
+    duration: float = 0.0
+    status: str = ""
+    error: Optional[str] = None
+    cache_hit: bool = False
+    daemon: bool = False
+    # Профиль сборки: profile_<время>.json и временная диаграмма .html
+    profile_report: Optional[str] = None
+    profile_timeline: Optional[str] = None
+    module_timings: Dict[str, float] = field(default_factory=dict)
+    # Запись в истории сборок (majesty_metrics) и предупреждение о замедлении
+    build_id: Optional[int] = None
+    log_build_id: Optional[int] = None
+    cancelled: bool = False
+    # Профиль параметров Maven, с которым шла сборка, и время работы самого Maven
+    build_profile: Optional[str] = None
+    maven_time: float = 0.0
+    regression: Optional[str] = None
+    # Лог предварительной загрузки зависимостей и шла ли сборка автономно (-o)
+    prefetch_log: Optional[str] = None
+    offline: bool = False
+    # Тесты из отчетов Surefire/Failsafe этой сборки (majesty_tests) и на сколько частей они делились
+    test_count: int = 0
+    test_failures: int = 0
+    test_skipped: int = 0
+    test_time: float = 0.0
+    failed_tests: List[str] = field(default_factory=list)
+    test_run_id: Optional[int] = None
+    test_shards: int = 0
+
+
+class BuildEngine:
+    """Выполняет сборку Maven-проекта и копирует полученный JAR в папку вывода"""
+
+    def __init__(self, listeners: Iterable[Callable[[str, bool], None]] = (), cache=None, toolchains=None,
+                 metrics=None, log_index=None, settings=None, tests=None):
+        # Обработчики каждой строки вывода Maven: listener(line, matched) для всех сборок
+        self.listeners = list(listeners)
+        # Кэш артефактов (majesty_cache.BuildCache); без него Maven запускается всегда
+        self.cache = cache
+        # Кэш установок Maven/JDK (majesty_toolchain.ToolchainCache): версии без запуска mvn --version
+        self.toolchains = toolchains
+        # История сборок (majesty_metrics.MetricsStore): каждая сборка записывается и сравнивается с базовой
+        self.metrics = metrics
+        # Поисковый индекс ошибок и предупреждений из логов (majesty_logindex.LogIndex), пополняется во время сборки
+        self.log_index = log_index
+        # Настройки проектов (majesty_settings.ProjectSettings): загруженные зависимости и время профилей сборки
+        self.settings = settings
+        # История тестов (majesty_tests.TestStore): время и результаты тестов, данные для разбиения на части
+        self.tests = tests
+        # Результаты mvn --version по (путь, mtime): повторные сборки не запускают лишнюю JVM
+        self._probe_cache = {}
+        self._probe_lock = threading.Lock()
+
+    def _probe_key(self, maven_path, java_home):
+        resolved = maven_path if os.path.exists(maven_path) else shutil.which(maven_path)
+        if not resolved:
+            return None
+        try:
+            return maven_path, os.path.getmtime(resolved), java_home
+        except OSError:
+            return None
+
+    def check_maven(self, maven_path, java_home=None, launch=False):
+        """Проверяет доступность Maven и возвращает строки с версиями Maven и JDK в формате mvn --version.
+
+        launch=True - обязательно запустить команду (mvnd может быть установлен, но не запускаться);
+        успешный запуск повторяется только после изменения файла.
+        """
+        if self.toolchains is not None and not launch:
+            maven = self.toolchains.maven_info(maven_path, startupinfo())
+            if maven is None:
+                raise BuildError(f"Maven не установлен или не доступен: {maven_path}")
+            jdk = self.toolchains.jdk_info(java_home or os.environ.get("JAVA_HOME") or self._java_home_from_path())
+            jdk_version = jdk.version if jdk else "unknown"
+            logger.info(f"Maven доступен: {maven.version} ({maven.path}), JDK: {jdk_version}")
+            return f"Apache Maven {maven.version}\nJava version: {jdk_version}\n"
+
+        probe_key = self._probe_key(maven_path, java_home)
+        with self._probe_lock:
+            if probe_key in self._probe_cache:
+                return self._probe_cache[probe_key]
+
+        if os.path.exists(maven_path):
+            logger.info(f"Используем Maven по указанному пути: {maven_path}")
+        else:
+            logger.info(f"Используем Maven из PATH: {maven_path}")
+
+        try:
+            check_mvn = subprocess.run(
+                [maven_path, "--version"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=java_environment(java_home),
+                startupinfo=startupinfo()
+            )
+        except OSError as e:
+            raise BuildError(f"Maven не установлен или не доступен: {str(e)}")
+
+        if check_mvn.returncode != 0:
+            error_output = check_mvn.stderr.decode('utf-8', errors='replace')
+            logger.error(f"Maven недоступен: {error_output}")
+            raise BuildError(f"Maven не установлен или не доступен: {error_output}")
+
+        version_output = check_mvn.stdout.decode('utf-8', errors='replace')
+        version_line = version_output.splitlines()[0] if version_output else ""
+        logger.info(f"Maven доступен: {version_line}")
+        if probe_key is not None:
+            with self._probe_lock:
+                self._probe_cache[probe_key] = version_output
+        return version_output
+
+    @staticmethod
+    def _java_home_from_path():
+        java = shutil.which("java")
+        return os.path.dirname(os.path.dirname(os.path.realpath(java))) if java else None
+
+    def build_environment(self, options):
+        """Окружение процесса Maven с выбранным JDK"""
+        return java_environment(options.java_home)
+
+    def resolve_maven(self, options):
+        """Выбирает команду сборки: mvnd, если он запрошен и работает, иначе обычный Maven.
+
+        Возвращает (команда, вывод --version, используется ли демон).
+        """
+        if options.use_daemon:
+            mvnd_path = find_mvnd(options.maven_path)
+            if mvnd_path:
+                try:
+                    # Версию mvnd можно прочитать из установки, но работает ли демон, видно только при запуске
+                    return mvnd_path, self.check_maven(mvnd_path, options.java_home, launch=True), True
+                except BuildError as e:
+                    logger.warning(f"Maven Daemon недоступен, используется обычный Maven: {str(e)}")
+        return options.maven_path, self.check_maven(options.maven_path, options.java_home), False
+
+    def prepare_dirs(self, options):
+        """Создает папки вывода и логов, если они не существуют"""
+        for path in (options.output_dir, options.log_dir):
+            if not os.path.exists(path):
+                os.makedirs(path, exist_ok=True)
+                logger.info(f"Создана папка: {path}")
+
+    def build(self, options: BuildOptions, listeners: Iterable[Callable[[str, bool], None]] = (),
+              cancellation: Optional[BuildCancellation] = None) -> BuildResult:
+        """Собирает проект; listeners получают строки вывода только этой сборки"""
+        result = BuildResult(project_dir=options.project_dir)
+        started = time.monotonic()
+        try:
+            self._build(options, result, self.listeners + list(listeners), cancellation)
+        except Exception as e:
+            logger.exception(f"Критическая ошибка при сборке: {str(e)}")
+            result.error = f"Произошла ошибка: {str(e)}"
+            result.status = "Ошибка при выполнении сборки"
+        finally:
+            result.duration = time.monotonic() - started
+            logger.info(f"Завершение процесса сборки {options.project_dir} за {result.duration:.1f} с")
+        # Отмененные сборки не попадают в историю: их время ничего не говорит о проекте
+        if self.metrics is not None and not result.cancelled:
+            self.record_metrics(result)
+        return result
+
+    def record_metrics(self, result):
+        """Записывает сборку в историю; ошибка базы не влияет на результат сборки"""
+        try:
+            result.build_id = self.metrics.record(result)
+            if self.log_index is not None and result.log_build_id is not None:
+                self.log_index.link_build(result.log_build_id, result.build_id)
+            if self.tests is not None and result.test_run_id is not None:
+                self.tests.link_build(result.test_run_id, result.build_id)
+            regression = self.metrics.check_regression(self.metrics.get(result.build_id))
+        except Exception as e:
+            logger.warning(f"Не удалось записать сборку в историю: {str(e)}")
+            return
+        if regression:
+            result.regression = regression.describe()
+            logger.info(f"{result.project_dir}: {result.regression}")
+
+    def _build(self, options, result, listeners, cancellation=None):
+        project_dir = options.project_dir
+        output_dir = options.output_dir
+        log_dir = options.log_dir
+
+        logger.info(f"Начало сборки проекта: {project_dir}")
+        logger.info(f"Выходная папка: {output_dir}")
+        logger.info(f"Имя файла: {options.filename}")
+        logger.info(f"Папка для логов: {log_dir}")
+        logger.info(f"Путь к Maven: {options.maven_path}")
+
+        self.prepare_dirs(options)
+
+        # Формируем имена лог-файлов с временной меткой
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        result.full_log = os.path.join(log_dir, f"full_log_{timestamp}.txt")
+        result.filtered_log = os.path.join(log_dir, f"filtered_log_{timestamp}.txt")
+
+        logger.info(f"Файл полного лога: {result.full_log}")
+        logger.info(f"Файл отфильтрованного лога: {result.filtered_log}")
+
+        # Проверяем доступность Maven
+        try:
+            maven_cmd, version_output, result.daemon = self.resolve_maven(options)
+        except BuildError as e:
+            logger.error(f"Ошибка при проверке Maven: {str(e)}")
+            result.error = f"Ошибка Maven: {str(e)}"
+            result.status = "Ошибка Maven"
+            return
+
+        # Аргументы профиля (-DskipTests, пропуск javadoc и т.д.) входят в ключ кэша
+        profile_state = None
+        if options.build_profile:
+            try:
+                profile_state = self.apply_build_profile(options, result)
+            except BuildError as e:
+                logger.error(str(e))
+                result.error = str(e)
+                result.status = "Ошибка профиля сборки"
+                return
+        profile_args = profile_state[3] if profile_state is not None else []
+
+        # Если проект не менялся с последней успешной сборки с теми же аргументами, берем JAR из кэша
+        cache_key = None
+        if self.cache is not None and options.use_cache:
+            cache_key = compute_cache_key(project_dir, toolchain_fingerprint(version_output),
+                                          list(options.goals) + profile_args)
+            cached = self.cache.lookup(cache_key)
+            if cached:
+                self.restore_from_cache(options, result, cached, cache_key, timestamp)
+                return
+
+        goals = list(options.goals)
+        plan = None
+        if options.incremental:
+            index = ModuleIndex(project_dir)
+            plan = plan_incremental_build(project_dir, index)
+            goals = [goal for goal in goals if goal != "clean"]
+            if plan.up_to_date:
+                artifacts = self.find_artifacts(options, result, plan.reactor)
+                if artifacts:
+                    self.write_skipped_logs(result, timestamp, "Файлы проекта не изменились с последней сборки, Maven не запускался")
+                    result.success = True
+                    result.returncode = 0
+                    self.publish_artifacts(options, result, artifacts)
+                    if result.artifact:
+                        result.status = f"Изменений нет, сборка пропущена. {self.published_summary(result)}"
+                    return
+                # Артефакта нет (например, target удален) - собираем весь реактор
+                plan.full = True
+            goals += plan.maven_arguments()
+
+        goals += profile_args
+
+        try:
+            repository_args = repository_arguments(options.local_repository, options.mirror)
+        except (PrefetchError, OSError) as e:
+            logger.error(f"Ошибка настройки репозитория Maven: {str(e)}")
+            result.error = str(e)
+            result.status = "Ошибка настройки репозитория Maven"
+            return
+
+        if options.prefetch:
+            reactor = plan.reactor if plan is not None else load_reactor(project_dir)
+            resolved = self.prefetch_dependencies(options, result, maven_cmd, reactor, repository_args, listeners,
+                                                  cancellation, timestamp)
+            if cancellation is not None and cancellation.cancelled:
+                result.cancelled = True
+                result.status = "Сборка отменена"
+                return
+            # Без загруженных зависимостей сборка идет как обычно, с обращением к репозиториям
+            if resolved and "-o" not in goals:
+                goals.append("-o")
+        goals += repository_args
+        result.offline = "-o" in goals
+
+        if result.daemon:
+            goals = daemon_arguments() + goals
+
+        # Тесты частями: основная сборка компилирует тесты, но не выполняет их; затем части параллельно
+        shards = None
+        if options.test_shards > 1:
+            shards = self.plan_test_shards(options, goals,
+                                           plan.reactor if plan is not None else load_reactor(project_dir))
+        if shards:
+            shard_args = shard_base_arguments(goals)
+            goals.append("-DskipTests")
+
+        profiler = BuildProfiler() if options.profile else None
+
+        # Фильтр и лог-файлы готовятся до запуска Maven: их ошибки не должны оставлять процесс без присмотра
+        try:
+            log_filter = load_log_filter(options.filter_rules)
+        except re.error as e:
+            logger.error(f"Ошибка в правилах фильтра лога: {str(e)}")
+            result.error = f"Ошибка в правилах фильтра лога: {str(e)}"
+            result.status = "Ошибка в правилах фильтра лога"
+            return
+        try:
+            pipeline = LogPipeline(
+                result.full_log,
+                result.filtered_log,
+                header=f"=== Отфильтрованный лог сборки {timestamp} ===\n\n",
+                log_filter=log_filter,
+                background=options.log_writer_thread
+            )
+        except OSError as e:
+            logger.error(f"Не удалось создать лог-файлы сборки: {str(e)}")
+            result.error = f"Не удалось создать лог-файлы сборки: {str(e)}"
+            result.status = "Ошибка записи логов"
+            return
+        if profiler is not None:
+            pipeline.add_listener(profiler.on_line)
+        indexer = self.open_log_indexer(project_dir, result)
+        if indexer is not None:
+            pipeline.add_listener(indexer.on_line)
+        for listener in listeners:
+            pipeline.add_listener(listener)
+
+        # Запускаем Maven
+        logger.info(f"Запуск Maven процесса: {maven_cmd} {' '.join(goals)}")
+        maven_started = time.monotonic()
+        # Отчеты тестов и артефакты старше начала сборки остались от прошлых сборок
+        reports_since = time.time() - 1
+        try:
+            with self.maven_process([maven_cmd] + goals, options, cancellation) as process:
+                for line in process.stdout:
+                    pipeline.feed(line)
+                process.wait()
+        finally:
+            stats = pipeline.close()
+            if indexer is not None:
+                indexer.close()
+        result.maven_time = time.monotonic() - maven_started
+
+        result.line_count = stats.lines
+        result.lines_per_sec = stats.lines_per_sec
+        result.warning_count = stats.warnings
+        result.error_count = stats.errors
+        result.returncode = process.returncode
+        logger.info(f"Процесс сборки завершен с кодом: {process.returncode}")
+
+        if cancellation is not None and cancellation.cancelled:
+            logger.info("Сборка отменена")
+            result.cancelled = True
+            result.status = "Сборка отменена"
+            return
+
+        if profiler is not None:
+            self.write_profile(profiler, result, log_dir, timestamp)
+        if profile_state is not None:
+            self.record_build_profile(options, result, profile_state)
+
+        if shards and process.returncode == 0:
+            self.run_test_shards(options, result, maven_cmd, shard_args, shards, listeners, cancellation, timestamp)
+            if cancellation is not None and cancellation.cancelled:
+                logger.info("Сборка отменена")
+                result.cancelled = True
+                result.status = "Сборка отменена"
+                return
+        self.record_tests(options, result, plan.reactor if plan is not None else load_reactor(project_dir),
+                          reports_since)
+
+        # Проверяем успешность сборки
+        if process.returncode != 0:
+            logger.error("Ошибка сборки Maven")
+            if options.prefetch and result.offline and not result.test_failures:
+                # Возможно, go-offline загрузил не все: следующая сборка загрузит зависимости заново
+                self.forget_resolved_dependencies(options.project_dir)
+            result.status = self.tests_failed_status(result) or "Ошибка сборки. Проверьте лог-файлы."
+            return
+        if result.returncode != 0:
+            logger.error("Ошибка при выполнении тестов")
+            result.status = self.tests_failed_status(result) or "Ошибка при выполнении тестов. Проверьте лог-файлы."
+            return
+
+        logger.info("Сборка успешна")
+        result.success = True
+        if plan is not None:
+            index.save(plan.snapshot)
+
+        if plan is not None:
+            rebuilt = dependents_of(plan.reactor, plan.changed) if plan.maven_arguments() else None
+            artifacts = self.find_artifacts(options, result, plan.reactor, reports_since, rebuilt)
+        else:
+            artifacts = self.find_artifacts(options, result, since=reports_since)
+        if not artifacts:
+            return
+
+        if cache_key:
+            try:
+                self.cache.store(cache_key, [(a.path, a.cache_meta()) for a in artifacts])
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить артефакты в кэш: {str(e)}")
+
+        self.publish_artifacts(options, result, artifacts)
+
+    def apply_build_profile(self, options, result):
+        """Аргументы Maven для профиля сборки; возвращает (профиль, хэш pom.xml, -o, аргументы)"""
+        project_settings = self.settings.get(options.project_dir) if self.settings is not None else {}
+        profile = resolve_profile(options.build_profile, project_settings)
+        if profile is None:
+            raise BuildError(f"Неизвестный профиль сборки: {options.build_profile}")
+        reactor = load_reactor(options.project_dir)
+        digest = pom_digest(reactor)
+        args, offline = profile_arguments(profile, reactor, daemon=result.daemon,
+                                          dependencies_resolved=project_settings.get("resolved_poms") == digest)
+        result.build_profile = profile.name
+        logger.info(f"Профиль сборки {profile.name}: {' '.join(args) or 'без дополнительных параметров'}")
+        return profile, digest, offline, args
+
+    def record_build_profile(self, options, result, profile_state):
+        """Запоминает для проекта время сборки с профилем и загруженные зависимости"""
+        if self.settings is None:
+            return
+        profile, digest, offline, _ = profile_state
+        project_settings = self.settings.get(options.project_dir)
+        updates = profile_stats_update(project_settings, profile.name, result.maven_time,
+                                       result.returncode == 0, digest, offline)
+        if updates:
+            try:
+                self.settings.update(options.project_dir, **updates)
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить статистику профиля сборки: {str(e)}")
+
+    def dependencies_resolved(self, project_dir, digest):
+        if self.settings is None:
+            return False
+        return is_resolved(self.settings.get(project_dir), digest)
+
+    def forget_resolved_dependencies(self, project_dir):
+        if self.settings is None:
+            return
+        try:
+            self.settings.update(project_dir, resolved_poms=None)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить настройки проекта: {str(e)}")
+
+    def prefetch_dependencies(self, options, result, maven_cmd, reactor, repository_args, listeners=(),
+                              cancellation=None, timestamp=None, force=False):
+        """Загружает зависимости проекта в локальный репозиторий; True - сборку можно вести автономно (-o)"""
+        project_dir = options.project_dir
+        digest = pom_digest(reactor)
+        if not force and self.dependencies_resolved(project_dir, digest):
+            logger.info(f"Зависимости {project_dir} уже загружены, сборка пойдет автономно")
+            return True
+
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+        result.prefetch_log = os.path.join(options.log_dir, f"prefetch_log_{timestamp}.txt")
+        repository = local_repository(options.local_repository)
+        try:
+            command = [maven_cmd, "-B"] + prefetch_goals(options.prefetch_mode) + repository_args
+            with RepositoryLock(repository, cancellation=cancellation):
+                # Пока ждали очереди, зависимости могла загрузить другая сборка этого проекта
+                if not force and self.dependencies_resolved(project_dir, digest):
+                    logger.info(f"Зависимости {project_dir} загружены другой сборкой")
+                    return True
+                returncode = self.run_prefetch(options, command, result.prefetch_log, listeners, cancellation)
+        except (PrefetchError, OSError) as e:
+            logger.warning(f"Не удалось загрузить зависимости {project_dir}: {str(e)}")
+            return False
+
+        if cancellation is not None and cancellation.cancelled:
+            return False
+        if returncode != 0:
+            logger.warning(f"Загрузка зависимостей {project_dir} завершилась с кодом {returncode}, "
+                           f"подробности: {result.prefetch_log}")
+            return False
+        if self.settings is not None:
+            try:
+                self.settings.update(project_dir, resolved_poms=digest)
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить настройки проекта: {str(e)}")
+        logger.info(f"Зависимости {project_dir} загружены в {repository}")
+        return True
+
+    def start_maven(self, command, options, cancellation=None):
+        """Запускает процесс Maven в папке проекта; вывод читается построчно из process.stdout"""
+        process = subprocess.Popen(
+            command,
+            cwd=options.project_dir,
+            env=self.build_environment(options),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=STDOUT_BUFFER_SIZE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            startupinfo=startupinfo(),
+            # Отдельная группа нужна только для отмены: иначе Ctrl+C в консоли должен доходить до Maven
+            **(process_group_kwargs() if cancellation is not None else {})
+        )
+        if cancellation is not None:
+            cancellation.attach(process)
+        return process
+
+    @contextlib.contextmanager
+    def maven_process(self, command, options, cancellation=None):
+        """start_maven для with: если чтение вывода прервано ошибкой, Maven завершается вместе с дочерними процессами"""
+        process = self.start_maven(command, options, cancellation)
+        try:
+            yield process
+        finally:
+            if process.poll() is None:
+                kill_process_tree(process)
+                process.wait()
+
+    def run_prefetch(self, options, command, log_path, listeners=(), cancellation=None):
+        """Запускает Maven для загрузки зависимостей; вывод пишется в лог и передается слушателям"""
+        logger.info(f"Загрузка зависимостей: {' '.join(command)}")
+        with open(log_path, 'w', encoding='utf-8') as log, \
+                self.maven_process(command, options, cancellation) as process:
+            for line in process.stdout:
+                log.write(line)
+                for listener in listeners:
+                    listener(line, False)
+            process.wait()
+        return process.returncode
+
+    def prefetch(self, options: BuildOptions, listeners: Iterable[Callable[[str, bool], None]] = (),
+                 cancellation: Optional[BuildCancellation] = None, force=False) -> BuildResult:
+        """Только загружает зависимости проекта, без сборки"""
+        result = BuildResult(project_dir=options.project_dir)
+        started = time.monotonic()
+        try:
+            self.prepare_dirs(options)
+            maven_cmd, _, result.daemon = self.resolve_maven(options)
+            repository_args = repository_arguments(options.local_repository, options.mirror)
+            result.success = self.prefetch_dependencies(options, result, maven_cmd, load_reactor(options.project_dir),
+                                                        repository_args, self.listeners + list(listeners),
+                                                        cancellation, force=force)
+        except (BuildError, PrefetchError, OSError) as e:
+            logger.error(f"Ошибка загрузки зависимостей: {str(e)}")
+            result.error = str(e)
+        finally:
+            result.duration = time.monotonic() - started
+        result.offline = result.success
+        if cancellation is not None and cancellation.cancelled:
+            result.cancelled = True
+            result.success = False
+            result.status = "Загрузка отменена"
+        elif result.success:
+            result.status = "Зависимости загружены" if result.prefetch_log else "Зависимости уже загружены"
+        elif not result.error:
+            result.status = "Ошибка загрузки зависимостей. Проверьте лог."
+        else:
+            result.status = "Ошибка загрузки зависимостей"
+        return result
+
+    def plan_test_shards(self, options, goals, reactor):
+        """Части тестов по истории времени классов; None - тесты выполняются в основной сборке"""
+        if self.tests is None:
+            logger.warning("История тестов недоступна, тесты выполняются в основной сборке")
+            return None
+        if not can_shard(goals):
+            logger.info("Тесты не выполняются или цели идут дальше package, тесты не делятся на части")
+            return None
+        if has_reactor_dependencies(reactor):
+            logger.info("Модули реактора зависят друг от друга, тесты выполняются в основной сборке")
+            return None
+        try:
+            timings = self.tests.class_timings(options.project_dir)
+        except Exception as e:
+            logger.warning(f"История тестов недоступна: {str(e)}")
+            return None
+        if len(timings) < 2:
+            logger.info("Истории времени тестов пока нет, тесты выполняются в основной сборке")
+            return None
+        shards = plan_shards(timings, options.test_shards)
+        logger.info(f"Тесты делятся на части ({len(shards)}), расчетное время: "
+                    + ", ".join(f"{shard.estimate:.1f} с" for shard in shards))
+        return shards
+
+    def run_test_shards(self, options, result, maven_cmd, shard_args, shards, listeners, cancellation, timestamp):
+        """Запускает части тестов параллельно; код завершения сборки - первый ненулевой код части"""
+        result.test_shards = len(shards)
+        log_filter = load_log_filter(options.filter_rules)
+        listener_lock = threading.Lock()
+        started = time.monotonic()
+
+        def run_shard(shard):
+            number = f"{shard.index + 1}/{len(shards)}"
+            command = [maven_cmd] + shard_args + shard_arguments(shard, shards)
+            logger.info(f"Часть тестов {number}: классов {len(shard.classes)}"
+                        + (" и новые классы" if shard.rest else "") + f", расчетное время {shard.estimate:.1f} с")
+            log_path = os.path.join(options.log_dir, f"tests_shard{shard.index + 1}_{timestamp}.txt")
+            matched_lines = []
+            stats = LogStats()
+            with open(log_path, 'w', encoding='utf-8') as log, \
+                    self.maven_process(command, options, cancellation) as process:
+                for line in process.stdout:
+                    log.write(line)
+                    stats.count(line)
+                    matched = log_filter.matches(line)
+                    if matched:
+                        matched_lines.append(f"[{number}] {line}")
+                    with listener_lock:
+                        for listener in listeners:
+                            listener(f"[{number}] {line}", matched)
+                process.wait()
+            return log_path, process.returncode, matched_lines, stats
+
+        with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="majesty-tests") as pool:
+            outcomes = list(pool.map(run_shard, shards))
+        logger.info(f"Части тестов выполнены за {time.monotonic() - started:.1f} с")
+
+        # Выводы частей дописываются в логи сборки друг за другом, а не вперемешку
+        try:
+            with open(result.full_log, 'a', encoding='utf-8') as full, \
+                    open(result.filtered_log, 'a', encoding='utf-8') as filtered:
+                for shard, (log_path, returncode, matched_lines, _) in zip(shards, outcomes):
+                    header = f"\n=== Часть тестов {shard.index + 1}/{len(shards)}, код завершения {returncode} ===\n"
+                    full.write(header)
+                    with open(log_path, 'r', encoding='utf-8') as shard_log:
+                        shutil.copyfileobj(shard_log, full)
+                    os.remove(log_path)
+                    filtered.write(header)
+                    filtered.writelines(matched_lines)
+        except OSError as e:
+            logger.warning(f"Не удалось дописать выводы частей тестов в лог сборки: {str(e)}")
+        # Строки частей входят в итог сборки наравне со строками основной сборки
+        for _, _, _, stats in outcomes:
+            result.line_count += stats.lines
+            result.warning_count += stats.warnings
+            result.error_count += stats.errors
+        failed = [returncode for _, returncode, _, _ in outcomes if returncode != 0]
+        result.returncode = failed[0] if failed else 0
+
+    def record_tests(self, options, result, reactor, since):
+        """Разбирает отчеты тестов этой сборки и записывает их в историю; ошибки не влияют на сборку"""
+        try:
+            report = collect_reports(options.project_dir, reactor, since)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать отчеты тестов: {str(e)}")
+            return
+        if not report.cases:
+            return
+        result.test_count = len(report.cases)
+        result.test_failures = report.failures
+        result.test_skipped = report.skipped
+        result.test_time = report.duration
+        result.failed_tests = [case.full_name for case in report.failed_cases()[:MAX_FAILED_TESTS]]
+        if self.tests is None:
+            return
+        try:
+            result.test_run_id = self.tests.record(options.project_dir, report, result.test_shards)
+        except Exception as e:
+            logger.warning(f"Не удалось записать тесты в историю: {str(e)}")
+
+    @staticmethod
+    def tests_failed_status(result):
+        """Статус сборки, упавшей на тестах; None, если упавших тестов нет"""
+        if not result.test_failures:
+            return None
+        names = ", ".join(result.failed_tests[:3])
+        more = f" и еще {result.test_failures - 3}" if result.test_failures > 3 else ""
+        return f"Тесты не прошли: {result.test_failures} из {result.test_count} ({names}{more}). Проверьте лог-файлы."
+
+    def open_log_indexer(self, project_dir, result):
+        """Слушатель, пополняющий индекс логов; без индекса или при ошибке базы - None"""
+        if self.log_index is None:
+            return None
+        try:
+            indexer = self.log_index.indexer(project_dir, result.full_log)
+        except Exception as e:
+            logger.warning(f"Индекс логов недоступен: {str(e)}")
+            return None
+        result.log_build_id = indexer.build_id
+        return indexer
+
+    def write_profile(self, profiler, result, log_dir, timestamp):
+        """Сохраняет профиль сборки; ошибка записи не влияет на результат сборки"""
+        profiler.finish(result.returncode)
+        result.module_timings = profiler.module_timings()
+        json_path = os.path.join(log_dir, f"profile_{timestamp}.json")
+        html_path = os.path.join(log_dir, f"profile_{timestamp}.html")
+        try:
+            profiler.write_reports(json_path, html_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить профиль сборки: {str(e)}")
+            return
+        result.profile_report = json_path
+        result.profile_timeline = html_path
+        logger.info(f"Профиль сборки сохранен: {html_path}")
+
+    def restore_from_cache(self, options, result, cached, cache_key, timestamp):
+        """Публикует артефакт из кэша вместо запуска Maven"""
+        artifacts = [Artifact.from_cache(path, meta) for path, meta in cached]
+        names = ", ".join(meta["name"] for _, meta in cached)
+        self.write_skipped_logs(
+            result, timestamp,
+            f"Проект не изменился, сборка пропущена: артефакты {names} взяты из кэша ({cache_key[:12]})"
+        )
+
+        result.cache_hit = True
+        result.success = True
+        result.returncode = 0
+        self.publish_artifacts(options, result, assign_published_names(artifacts, options.filename))
+        if result.artifact:
+            result.status = f"Сборка взята из кэша. {self.published_summary(result)}"
+
+    def write_skipped_logs(self, result, timestamp, message):
+        """Записывает в оба лога причину, по которой Maven не запускался"""
+        for log_file in (result.full_log, result.filtered_log):
+            with open(log_file, 'w', encoding='utf-8') as log:
+                log.write(f"=== Лог сборки {timestamp} ===\n\n{message}\n")
+
+    def find_artifacts(self, options, result, reactor=None, since=None, rebuilt=None):
+        """Ищет собранные артефакты в папках target всех модулей проекта; since - начало запуска Maven"""
+        artifacts = discover_artifacts(options.project_dir, reactor, options.artifact_types,
+                                       options.artifact_include, options.artifact_exclude, since, rebuilt)
+        if not artifacts:
+            logger.warning("Артефакты сборки не найдены в папках target модулей")
+            result.status = "Сборка успешна, но артефакты (JAR/WAR/EAR) не найдены"
+            return []
+        return assign_published_names(artifacts, options.filename)
+
+    def publish_artifacts(self, options, result, artifacts):
+        """Копирует артефакты в папку вывода, каждый под очередным именем своей версии"""
+        registry = VersionRegistry.open(options.output_dir)
+        logger.info(f"Копирование артефактов ({len(artifacts)}) в {options.output_dir}")
+
+        result.artifacts = publish_artifacts(registry, artifacts, options.dedup, result.full_log,
+                                             options.publish_workers)
+        if options.keep_last is not None or options.max_versions_mb is not None:
+            max_bytes = options.max_versions_mb * 1024 * 1024 if options.max_versions_mb is not None else None
+            for artifact in artifacts:
+                try:
+                    registry.prune(artifact.base_name, keep_last=options.keep_last, max_total_bytes=max_bytes)
+                except OSError as e:
+                    logger.warning(f"Не удалось удалить старые версии {artifact.base_name}: {str(e)}")
+
+        failed = [p for p in result.artifacts if p.error]
+        primary = primary_artifact(result.artifacts)
+        if primary is not None:
+            result.artifact = primary.path
+            result.artifact_sha256 = primary.sha256
+            result.artifact_size = primary.size
+            result.deduplicated = primary.deduplicated
+        if failed:
+            names = ", ".join(os.path.basename(p.artifact.path) for p in failed)
+            result.error = f"Ошибка при копировании: {names}: {failed[0].error}"
+            result.status = "Сборка успешна, но возникла ошибка при копировании артефактов"
+        else:
+            result.status = f"Сборка успешно завершена. {self.published_summary(result)}"
+
+    @staticmethod
+    def published_summary(result):
+        """Куда опубликованы артефакты - для строки статуса"""
+        if len(result.artifacts) == 1:
+            published = result.artifacts[0]
+            if published.deduplicated and not published.linked:
+                return f"JAR не изменился, последняя версия: {published.path}"
+            return f"JAR сохранен в: {published.path}"
+        unchanged = sum(1 for p in result.artifacts if p.deduplicated and not p.linked)
+        folder = os.path.dirname(result.artifact) if result.artifact else ""
+        return (f"Опубликовано артефактов: {len(result.artifacts)}"
+                + (f", без изменений: {unchanged}" if unchanged else "") + f", папка: {folder}")
+
+
+def run_batch(options_list, max_workers=None, engine=None):
+    """Собирает несколько проектов параллельно в ограниченном пуле потоков.
+
+    Каждая сборка выполняется в собственном процессе Maven, поэтому потоков
+    достаточно: они лишь ожидают вывод дочерних процессов. Результаты
+    возвращаются в порядке исходного списка.
+    """
+    if not options_list:
+        return []
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(options_list)))
+    engine = engine or BuildEngine()
+
+    logger.info(f"Пакетная сборка {len(options_list)} проектов, потоков: {max_workers}")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="majesty-build") as pool:
+        return list(pool.map(engine.build, options_list))
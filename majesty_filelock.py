@@ -0,0 +1,106 @@
+"""Межпроцессная блокировка файлов для общих данных приложения.
+
+Окно, консольная утилита и сервер сборок работают с одними и теми же
+файлами (индекс кэша, манифест версий, настройки проектов, локальный
+репозиторий Maven). Чтение-изменение-запись таких файлов выполняется под
+FileLock: блокировка файла <имя>.lock (flock, в Windows - msvcrt.locking)
+защищает от других процессов, блокировка потока - от потоков этого же
+процесса.
+"""
+import logging
+import os
+import threading
+import time
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger('MajestyCompiler')
+
+# Сколько ждать освобождения блокировки, прежде чем сообщить об ошибке
+DEFAULT_LOCK_TIMEOUT = 60
+LOCK_POLL_INTERVAL = 0.05
+
+
+class FileLockTimeout(OSError):
+    """Блокировка занята дольше допустимого"""
+
+
+def _try_lock(f):
+    if os.name == "nt":
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _unlock(f):
+    if os.name == "nt":
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class FileLock:
+    """Монопольная блокировка файла path для всех процессов и потоков"""
+
+    poll_interval = LOCK_POLL_INTERVAL
+
+    _thread_locks = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path, timeout=DEFAULT_LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._file = None
+        with self._registry_lock:
+            key = os.path.normcase(os.path.abspath(path))
+            self._thread_lock = self._thread_locks.setdefault(key, threading.Lock())
+
+    def waiting(self, deadline, other_process):
+        """Вызывается, пока блокировка занята; исключение прерывает ожидание"""
+        if time.monotonic() > deadline:
+            raise FileLockTimeout(f"Файл занят дольше {self.timeout} с: {self.path}")
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while not self._thread_lock.acquire(timeout=self.poll_interval):
+            self.waiting(deadline, False)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, 'a+')
+            while True:
+                try:
+                    _try_lock(self._file)
+                    break
+                except OSError:
+                    self.waiting(deadline, True)
+                    time.sleep(self.poll_interval)
+        except BaseException:
+            self._close()
+            self._thread_lock.release()
+            raise
+        return self
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def release(self):
+        try:
+            _unlock(self._file)
+        except OSError as e:
+            logger.warning(f"Не удалось снять блокировку {self.path}: {str(e)}")
+        finally:
+            self._close()
+            self._thread_lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
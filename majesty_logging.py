@@ -0,0 +1,133 @@
+"""Журнал приложения, не задерживающий потоки сборки и окна.
+
+Потоки только кладут записи в очередь (QueueHandler); на диск их пишет
+отдельный поток QueueListener. Файл журнала ограничен по размеру: при
+переполнении он переименовывается в majestycompiler_log.txt.1.gz (сжатие
+выполняется тем же фоновым потоком), хранится несколько таких архивов.
+
+Настройка через переменные окружения:
+    MAJESTY_LOG_LEVEL      уровень журнала: DEBUG, INFO, WARNING... (по умолчанию INFO)
+    MAJESTY_LOG_FILE       путь к файлу журнала (по умолчанию majestycompiler_log.txt)
+    MAJESTY_LOG_MAX_MB     размер файла, после которого он архивируется (по умолчанию 10)
+    MAJESTY_LOG_BACKUPS    сколько архивов хранить (по умолчанию 5)
+    MAJESTY_LOG_HOT_PATH   0 - писать каждую строку вывода Maven на уровне DEBUG
+                           (только вместе с MAJESTY_LOG_LEVEL=DEBUG); по умолчанию
+                           построчные записи отключены
+"""
+import atexit
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+
+LOG_FILENAME = "majestycompiler_log.txt"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DEFAULT_LEVEL = "INFO"
+DEFAULT_MAX_MB = 10
+DEFAULT_BACKUPS = 5
+# Журнал строк вывода Maven: дочерний логгер, чтобы его можно было отключить отдельно
+BUILD_LINES_LOGGER = 'MajestyCompiler.maven'
+
+_lock = threading.Lock()
+_listener = None
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def log_level():
+    """Уровень журнала из MAJESTY_LOG_LEVEL"""
+    name = os.environ.get("MAJESTY_LOG_LEVEL", DEFAULT_LEVEL).strip().upper()
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else logging.INFO
+
+
+def hot_path_mode():
+    """Построчные записи вывода Maven отключены (режим по умолчанию)"""
+    return os.environ.get("MAJESTY_LOG_HOT_PATH", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def build_lines_logger():
+    """Логгер для построчной записи вывода Maven или None, если она отключена.
+
+    Проверяется один раз перед сборкой, чтобы в цикле чтения вывода не
+    тратить время даже на вызов logger.debug.
+    """
+    if hot_path_mode():
+        return None
+    line_logger = logging.getLogger(BUILD_LINES_LOGGER)
+    return line_logger if line_logger.isEnabledFor(logging.DEBUG) else None
+
+
+def _gzip_namer(name):
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source, dest):
+    """Сжимает заполненный журнал в архив; выполняется в потоке QueueListener"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def rotating_file_handler(path, max_bytes, backups):
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                   encoding='utf-8', delay=True)
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    return handler
+
+
+def setup_logging(console_level=None, filename=None):
+    """Направляет журнал приложения в файл через фоновый поток.
+
+    console_level - с какого уровня дублировать сообщения в консоль (None - не
+    дублировать). Повторный вызов ничего не меняет.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        handlers = [rotating_file_handler(
+            filename or os.environ.get("MAJESTY_LOG_FILE") or LOG_FILENAME,
+            max(1, _env_int("MAJESTY_LOG_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024,
+            max(0, _env_int("MAJESTY_LOG_BACKUPS", DEFAULT_BACKUPS)),
+        )]
+        if console_level is not None:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+            console_handler.setLevel(console_level)
+            handlers.append(console_handler)
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        root.setLevel(log_level())
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        # Дописываем оставшиеся в очереди записи при выходе
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    """Останавливает фоновый поток, записав все накопившиеся сообщения"""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
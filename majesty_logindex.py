@@ -0,0 +1,277 @@
+"""Поисковый индекс по логам сборок.
+
+Во время сборки слушатель конвейера логов выделяет из вывода Maven ошибки
+компиляции (файл:строка), упавшие тесты и предупреждения и пачками
+передает их фоновому потоку, который записывает их в SQLite-базу
+log_index.db в папке данных приложения.
+Для полнотекстового поиска используется FTS5; если SQLite собран без него,
+поиск выполняется через LIKE.
+"""
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from majesty_cache import app_data_dir
+
+logger = logging.getLogger('MajestyCompiler')
+
+LOG_INDEX_FILENAME = "log_index.db"
+# Записей за одну сборку; остальное есть в полном логе
+MAX_ENTRIES_PER_BUILD = 5000
+INSERT_BATCH = 200
+# Пачек в очереди фоновой записи; при заполнении чтение вывода Maven ждет базу
+WRITE_QUEUE_BATCHES = 16
+
+KIND_COMPILE_ERROR = "compile_error"
+KIND_COMPILE_WARNING = "compile_warning"
+KIND_TEST_FAILURE = "test_failure"
+KIND_ERROR = "error"
+KIND_WARNING = "warning"
+KINDS = (KIND_COMPILE_ERROR, KIND_COMPILE_WARNING, KIND_TEST_FAILURE, KIND_ERROR, KIND_WARNING)
+
+# [ERROR] /src/main/java/App.java:[12,5] cannot find symbol
+COMPILER_PATTERN = re.compile(r"^\[(ERROR|WARNING)\] (.+?\.(?:java|kt|scala|groovy)):\[(\d+)(?:,(\d+))?\] (.*)$")
+# [ERROR] testFoo(com.x.MyTest)  Time elapsed: 0.01 s  <<< FAILURE!
+# [ERROR] com.x.MyTest.testFoo -- Time elapsed: 0.011 s <<< ERROR!
+TEST_FAILURE_PATTERN = re.compile(r"^\[ERROR\] (.+?)\s+(?:--\s+)?Time elapsed: .*<<< (FAILURE|ERROR)!")
+MOJO_MODULE_PATTERN = re.compile(r" @ (\S+) ---")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    started REAL NOT NULL,
+    full_log TEXT,
+    metrics_build_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    build_id INTEGER NOT NULL REFERENCES log_builds (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    module TEXT,
+    file TEXT,
+    line INTEGER,
+    log_line INTEGER NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_build ON entries (build_id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(message, file, content='entries', content_rowid='id');
+"""
+
+
+@dataclass
+class LogEntry:
+    id: int
+    build_id: int
+    kind: str
+    module: Optional[str]
+    file: Optional[str]
+    line: Optional[int]
+    log_line: int
+    message: str
+    project: str
+    started: float
+    full_log: Optional[str]
+
+    def location(self):
+        if self.file:
+            return f"{self.file}:{self.line}" if self.line else self.file
+        return f"{os.path.basename(self.full_log or '')}:{self.log_line}"
+
+
+def fts_query(text):
+    """Превращает произвольный текст в запрос FTS5: все слова должны встретиться"""
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"' for word in words)
+
+
+class LogIndex:
+    """База индекса логов; одно соединение на процесс, запись под блокировкой"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(app_data_dir(), LOG_INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA foreign_keys=ON")
+            self._db.executescript(SCHEMA)
+            try:
+                self._db.executescript(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                logger.info(f"FTS5 недоступен, поиск по логам будет выполняться через LIKE: {str(e)}")
+                self.fts = False
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def indexer(self, project_dir, full_log=None):
+        """Слушатель для конвейера логов одной сборки"""
+        with self._lock, self._db:
+            build_id = self._db.execute(
+                "INSERT INTO log_builds (project, started, full_log) VALUES (?, ?, ?)",
+                (os.path.normcase(os.path.abspath(project_dir)), time.time(), full_log)
+            ).lastrowid
+        return LogIndexer(self, build_id, project_dir)
+
+    def link_build(self, log_build_id, metrics_build_id):
+        """Связывает сборку в индексе с записью в истории сборок (majesty_metrics)"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE log_builds SET metrics_build_id = ? WHERE id = ?", (metrics_build_id, log_build_id))
+
+    def _insert(self, rows):
+        with self._lock, self._db:
+            for row in rows:
+                entry_id = self._db.execute(
+                    "INSERT INTO entries (build_id, kind, module, file, line, log_line, message) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", row
+                ).lastrowid
+                if self.fts:
+                    self._db.execute("INSERT INTO entries_fts (rowid, message, file) VALUES (?, ?, ?)",
+                                     (entry_id, row[6], row[3] or ""))
+
+    def search(self, text, project_dir=None, kind=None, limit=50, oldest_first=False) -> List[LogEntry]:
+        """Записи, содержащие все слова запроса; по умолчанию сначала новые"""
+        conditions, params = [], []
+        if self.fts and fts_query(text):
+            conditions.append("e.id IN (SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?)")
+            params.append(fts_query(text))
+        elif text:
+            conditions.append("(e.message LIKE ? OR e.file LIKE ?)")
+            params += [f"%{text}%", f"%{text}%"]
+        if project_dir:
+            conditions.append("b.project = ?")
+            params.append(os.path.normcase(os.path.abspath(project_dir)))
+        if kind:
+            conditions.append("e.kind = ?")
+            params.append(kind)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "ASC" if oldest_first else "DESC"
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT e.id, e.build_id, e.kind, e.module, e.file, e.line, e.log_line, e.message, "
+                "b.project, b.started, b.full_log FROM entries e JOIN log_builds b ON b.id = e.build_id "
+                f"{where} ORDER BY b.started {order}, e.id {order} LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [LogEntry(*row) for row in rows]
+
+    def first_seen(self, text, project_dir=None, kind=None) -> Optional[LogEntry]:
+        """Самая ранняя сборка, в логе которой встретилась запись"""
+        found = self.search(text, project_dir, kind, limit=1, oldest_first=True)
+        return found[0] if found else None
+
+
+class _IndexWriter:
+    """Фоновый поток, записывающий пачки записей в индекс: поток чтения вывода Maven не ждет SQLite"""
+
+    def __init__(self, index: LogIndex):
+        self.index = index
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_BATCHES)
+        self._thread = threading.Thread(target=self._run, name="majesty-log-index", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows):
+        self._queue.put(rows)
+
+    def _run(self):
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                return
+            try:
+                self.index._insert(rows)
+            except sqlite3.Error as e:
+                logger.warning(f"Не удалось записать в индекс логов: {str(e)}")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class LogIndexer:
+    """Разбирает строки вывода одной сборки и пачками пишет найденное в индекс"""
+
+    def __init__(self, index: LogIndex, build_id, project_dir):
+        self.index = index
+        self.build_id = build_id
+        self.project_dir = os.path.abspath(project_dir)
+        self.module = None
+        self.entries = 0
+        self._log_line = 0
+        self._pending = []
+        # Поток записи запускается с первой пачкой: у многих сборок нет ни ошибок, ни предупреждений
+        self._writer = None
+
+    def _relative(self, path):
+        try:
+            if os.path.isabs(path) and os.path.commonpath([self.project_dir, os.path.abspath(path)]) == self.project_dir:
+                return os.path.relpath(path, self.project_dir).replace(os.sep, "/")
+        except ValueError:
+            pass
+        return path
+
+    def _add(self, kind, message, file=None, line=None):
+        if self.entries >= MAX_ENTRIES_PER_BUILD:
+            return
+        self.entries += 1
+        self._pending.append((self.build_id, kind, self.module, file, line, self._log_line, message))
+        if len(self._pending) >= INSERT_BATCH:
+            self.flush()
+
+    def on_line(self, line, matched=False):
+        self._log_line += 1
+        # Большинство строк - [INFO]; для них нужен только модуль из маркера цели плагина
+        if line.startswith("[INFO] "):
+            if line.startswith("[INFO] --- "):
+                match = MOJO_MODULE_PATTERN.search(line)
+                if match:
+                    self.module = match.group(1)
+            return
+        is_error = line.startswith("[ERROR]")
+        if not is_error and not line.startswith("[WARNING]"):
+            return
+
+        line = line.rstrip()
+        match = COMPILER_PATTERN.match(line)
+        if match:
+            level, path, line_no, _, message = match.groups()
+            kind = KIND_COMPILE_ERROR if level == "ERROR" else KIND_COMPILE_WARNING
+            self._add(kind, message.strip(), self._relative(path), int(line_no))
+            return
+        if is_error:
+            match = TEST_FAILURE_PATTERN.match(line)
+            if match:
+                self._add(KIND_TEST_FAILURE, f"{match.group(1)} {match.group(2)}")
+                return
+        message = line.split("] ", 1)[1].strip() if "] " in line else ""
+        if message:
+            self._add(KIND_ERROR if is_error else KIND_WARNING, message)
+
+    def flush(self):
+        """Передает накопленные записи потоку записи"""
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        if self._writer is None:
+            self._writer = _IndexWriter(self.index)
+        self._writer.submit(rows)
+
+    def close(self):
+        """Дописывает оставшиеся записи и ждет, пока они окажутся в базе"""
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        logger.info(f"В индекс логов добавлено записей: {self.entries}")
@@ -0,0 +1,234 @@
+"""Потоковая обработка вывода Maven.
+
+Строки пишутся в полный и отфильтрованный логи пачками, а не по одной
+с flush() после каждой, и проверяются одним заранее скомпилированным
+регулярным выражением. Запись на диск можно вынести в отдельный поток:
+тогда чтение вывода Maven ждет диск, только если очередь записи
+заполнена.
+
+Правила фильтра задаются списком строк: обычная строка ищется как
+подстрока, строка с префиксом "re:" - как регулярное выражение. Правила
+можно сохранить в файл log_filters.txt в папке данных приложения, по
+одному в строке.
+"""
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+from majesty_cache import app_data_dir
+from majesty_logging import build_lines_logger
+
+logger = logging.getLogger('MajestyCompiler')
+
+DEFAULT_FILTER_RULES = ["BUILD SUCCESS", "BUILD FAILURE", "WARNING", "ERROR"]
+FILTER_RULES_FILE = "log_filters.txt"
+REGEX_PREFIX = "re:"
+# Пачек в очереди фонового потока записи; при заполнении чтение вывода Maven ждет диск
+WRITER_QUEUE_CHUNKS = 64
+
+
+class LogFilter:
+    """Набор правил фильтрации, объединенный в одно регулярное выражение"""
+
+    def __init__(self, rules=None):
+        self.rules = list(rules) if rules else list(DEFAULT_FILTER_RULES)
+        parts = []
+        for rule in self.rules:
+            if rule.startswith(REGEX_PREFIX):
+                parts.append(f"(?:{rule[len(REGEX_PREFIX):]})")
+            else:
+                parts.append(re.escape(rule))
+        self._search = re.compile("|".join(parts)).search
+
+    def matches(self, line):
+        return self._search(line) is not None
+
+    @classmethod
+    def from_file(cls, path):
+        """Читает правила из файла: по одному в строке, строки с # пропускаются"""
+        with open(path, 'r', encoding='utf-8') as f:
+            rules = [line.rstrip("\n") for line in f if line.strip() and not line.startswith("#")]
+        return cls(rules)
+
+
+def filter_rules_path():
+    """Файл правил фильтра в папке данных приложения"""
+    return os.path.join(app_data_dir(), FILTER_RULES_FILE)
+
+
+def load_log_filter(rules=None):
+    """Фильтр из явно заданных правил, из log_filters.txt или стандартный"""
+    if rules:
+        return LogFilter(rules)
+    path = filter_rules_path()
+    if os.path.exists(path):
+        try:
+            return LogFilter.from_file(path)
+        except (OSError, re.error) as e:
+            logger.error(f"Ошибка в файле правил фильтра {path}: {str(e)}")
+    return LogFilter()
+
+
+class _BatchWriter:
+    """Фоновый поток, записывающий готовые пачки строк в файлы"""
+
+    def __init__(self, max_chunks=WRITER_QUEUE_CHUNKS):
+        # Ограниченная очередь: если диск не успевает, submit ждет, а память не растет
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._thread = threading.Thread(target=self._run, name="majesty-log-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, log_file, chunk):
+        self._queue.put((log_file, chunk))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            log_file, chunk = item
+            log_file.write(chunk)
+            log_file.flush()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class LogStats:
+    """Счетчики конвейера логов"""
+
+    def __init__(self):
+        self.lines = 0
+        self.matched = 0
+        self.warnings = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    def count(self, line):
+        """Учитывает строку в счетчиках строк, предупреждений и ошибок"""
+        self.lines += 1
+        if line.startswith("[WARNING]"):
+            self.warnings += 1
+        elif line.startswith("[ERROR]"):
+            self.errors += 1
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def lines_per_sec(self):
+        elapsed = self.elapsed
+        return self.lines / elapsed if elapsed > 0 else 0.0
+
+
+class LogPipeline:
+    """Принимает строки вывода Maven и пишет полный и отфильтрованный логи.
+
+    Буфер сбрасывается на диск, когда в нем накопилось batch_lines строк, а
+    таймер раз в flush_interval секунд дописывает то, что успело накопиться,
+    даже если Maven замолчал. Слушатели вызываются для каждой строки с
+    признаком совпадения с фильтром и не должны блокироваться.
+    """
+
+    def __init__(self, full_path, filtered_path, header="", log_filter=None,
+                 batch_lines=1000, flush_interval=0.5, background=False):
+        self.log_filter = log_filter or LogFilter()
+        self.batch_lines = batch_lines
+        self.flush_interval = flush_interval
+        self.stats = LogStats()
+        self.listeners = []
+
+        self._full_log = open(full_path, 'w', encoding='utf-8')
+        self._filtered_log = open(filtered_path, 'w', encoding='utf-8')
+        self._full_batch = []
+        self._filtered_batch = []
+        # Буферы общие для потока чтения и таймера
+        self._lock = threading.Lock()
+        self._writer = _BatchWriter() if background else None
+        self._closed = False
+        self._stop_timer = threading.Event()
+        self._timer = None
+        if flush_interval:
+            self._timer = threading.Thread(target=self._flush_periodically, name="majesty-log-flush", daemon=True)
+            self._timer.start()
+        # Построчная запись в журнал приложения только вне режима hot path (см. majesty_logging)
+        self._line_logger = build_lines_logger()
+
+        if header:
+            self._filtered_log.write(header)
+
+    def add_listener(self, listener):
+        """listener(line, matched) вызывается в потоке, читающем вывод Maven"""
+        self.listeners.append(listener)
+
+    def feed(self, line):
+        self.stats.count(line)
+        matched = self.log_filter.matches(line)
+        with self._lock:
+            self._full_batch.append(line)
+            if matched:
+                self.stats.matched += 1
+                self._filtered_batch.append(line)
+            if len(self._full_batch) >= self.batch_lines:
+                self._flush_locked()
+        if self._line_logger is not None:
+            self._line_logger.debug(line.rstrip("\n"))
+
+        for listener in self.listeners:
+            listener(line, matched)
+
+    def _flush_periodically(self):
+        while not self._stop_timer.wait(self.flush_interval):
+            self.flush()
+
+    def _write(self, log_file, batch):
+        if not batch:
+            return
+        chunk = "".join(batch)
+        if self._writer is not None:
+            self._writer.submit(log_file, chunk)
+        else:
+            log_file.write(chunk)
+            log_file.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._write(self._full_log, self._full_batch)
+        self._write(self._filtered_log, self._filtered_batch)
+        self._full_batch = []
+        self._filtered_batch = []
+
+    def close(self):
+        if self._closed:
+            return self.stats
+        self._closed = True
+        if self._timer is not None:
+            self._stop_timer.set()
+            self._timer.join()
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+        self._full_log.close()
+        self._filtered_log.close()
+        self.stats.finished = time.monotonic()
+        logger.info(
+            f"Обработано строк лога: {self.stats.lines}, важных: {self.stats.matched}, "
+            f"предупреждений: {self.stats.warnings}, ошибок: {self.stats.errors}, "
+            f"скорость: {self.stats.lines_per_sec:.0f} строк/с"
+        )
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
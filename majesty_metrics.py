@@ -0,0 +1,237 @@
+"""История сборок и поиск замедлений.
+
+Каждая сборка записывается в SQLite-базу metrics.db в папке данных
+приложения: длительность, число строк лога, результат, размер артефакта,
+попадание в кэш, число предупреждений и ошибок и время модулей из профиля
+сборки. Сборка считается замедлением, если она дольше медианы предыдущих
+сборок проекта (скользящее окно) больше чем на заданный порог.
+"""
+import logging
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from majesty_cache import app_data_dir
+
+logger = logging.getLogger('MajestyCompiler')
+
+METRICS_FILENAME = "metrics.db"
+DEFAULT_BASELINE_WINDOW = 10
+DEFAULT_REGRESSION_THRESHOLD = 0.25
+# Меньше сборок в окне - базовое время считается ненадежным
+MIN_BASELINE_BUILDS = 3
+# Разница меньше этой не считается замедлением, как бы мала ни была сама сборка
+MIN_REGRESSION_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    lines INTEGER NOT NULL DEFAULT 0,
+    lines_per_sec REAL NOT NULL DEFAULT 0,
+    success INTEGER NOT NULL,
+    returncode INTEGER,
+    artifact TEXT,
+    artifact_size INTEGER NOT NULL DEFAULT 0,
+    cache_hit INTEGER NOT NULL DEFAULT 0,
+    daemon INTEGER NOT NULL DEFAULT 0,
+    warnings INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    status TEXT,
+    full_log TEXT
+);
+CREATE INDEX IF NOT EXISTS builds_project_started ON builds (project, started);
+CREATE TABLE IF NOT EXISTS module_timings (
+    build_id INTEGER NOT NULL REFERENCES builds (id) ON DELETE CASCADE,
+    module TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS module_timings_build ON module_timings (build_id);
+"""
+
+BUILD_COLUMNS = ("id", "project", "started", "duration", "lines", "lines_per_sec", "success", "returncode",
+                 "artifact", "artifact_size", "cache_hit", "daemon", "warnings", "errors", "status", "full_log")
+
+
+@dataclass
+class BuildRecord:
+    id: int
+    project: str
+    started: float
+    duration: float
+    lines: int
+    lines_per_sec: float
+    success: bool
+    returncode: Optional[int]
+    artifact: Optional[str]
+    artifact_size: int
+    cache_hit: bool
+    daemon: bool
+    warnings: int
+    errors: int
+    status: Optional[str]
+    full_log: Optional[str]
+    modules: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def ran_maven(self):
+        """Maven действительно выполнял сборку (не кэш и не пропуск без изменений)"""
+        return self.success and not self.cache_hit and self.lines > 0
+
+
+@dataclass
+class Regression:
+    record: BuildRecord
+    baseline: float
+    ratio: float
+
+    def describe(self):
+        return (f"Сборка медленнее обычного: {self.record.duration:.1f} с при базовом времени "
+                f"{self.baseline:.1f} с (+{(self.ratio - 1):.0%})")
+
+
+def project_key(project_dir):
+    return os.path.normcase(os.path.abspath(project_dir))
+
+
+class MetricsStore:
+    """Хранилище истории сборок; безопасно для использования из нескольких потоков"""
+
+    def __init__(self, path=None, window=DEFAULT_BASELINE_WINDOW, threshold=DEFAULT_REGRESSION_THRESHOLD):
+        self.path = path or os.path.join(app_data_dir(), METRICS_FILENAME)
+        self.window = window
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA foreign_keys=ON")
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def record(self, result, finished=None) -> int:
+        """Сохраняет итог сборки (majesty_engine.BuildResult) и возвращает номер записи"""
+        finished = finished or time.time()
+        values = (
+            project_key(result.project_dir), finished - result.duration, result.duration, result.line_count,
+            result.lines_per_sec, int(result.success and not result.error), result.returncode, result.artifact,
+            result.artifact_size, int(result.cache_hit), int(result.daemon), result.warning_count,
+            result.error_count, result.status, result.full_log,
+        )
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                f"INSERT INTO builds ({', '.join(BUILD_COLUMNS[1:])}) VALUES ({', '.join('?' * len(values))})",
+                values
+            )
+            build_id = cursor.lastrowid
+            if result.module_timings:
+                self._db.executemany(
+                    "INSERT INTO module_timings (build_id, module, duration) VALUES (?, ?, ?)",
+                    [(build_id, module, duration) for module, duration in result.module_timings.items()]
+                )
+        return build_id
+
+    def _records(self, rows, with_modules=False):
+        records = [BuildRecord(**{name: row[name] for name in BUILD_COLUMNS}) for row in rows]
+        for record in records:
+            record.success = bool(record.success)
+            record.cache_hit = bool(record.cache_hit)
+            record.daemon = bool(record.daemon)
+        if with_modules and records:
+            by_id = {record.id: record for record in records}
+            placeholders = ", ".join("?" * len(by_id))
+            with self._lock:
+                timings = self._db.execute(
+                    f"SELECT build_id, module, duration FROM module_timings WHERE build_id IN ({placeholders})",
+                    list(by_id)
+                ).fetchall()
+            for build_id, module, duration in timings:
+                by_id[build_id].modules[module] = duration
+        return records
+
+    def builds(self, project_dir=None, limit=50, since=None, with_modules=False) -> List[BuildRecord]:
+        """Последние сборки (всех проектов или одного), от новых к старым"""
+        conditions, params = [], []
+        if project_dir:
+            conditions.append("project = ?")
+            params.append(project_key(project_dir))
+        if since is not None:
+            conditions.append("started >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(BUILD_COLUMNS)} FROM builds {where} ORDER BY started DESC, id DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return self._records(rows, with_modules)
+
+    def get(self, build_id) -> Optional[BuildRecord]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(BUILD_COLUMNS)} FROM builds WHERE id = ?",
+                                    (build_id,)).fetchall()
+        records = self._records(rows, with_modules=True)
+        return records[0] if records else None
+
+    def projects(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT project FROM builds ORDER BY project")]
+
+    def baseline(self, project_dir, before=None, window=None) -> Optional[float]:
+        """Медиана длительности последних сборок проекта, в которых действительно работал Maven"""
+        window = window or self.window
+        params = [project_key(project_dir)]
+        before_clause = ""
+        if before is not None:
+            before_clause = "AND started < ?"
+            params.append(before)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT duration FROM builds WHERE project = ? {before_clause} "
+                "AND success = 1 AND cache_hit = 0 AND lines > 0 ORDER BY started DESC LIMIT ?",
+                params + [window]
+            ).fetchall()
+        if len(rows) < MIN_BASELINE_BUILDS:
+            return None
+        return statistics.median(row[0] for row in rows)
+
+    def check_regression(self, record: BuildRecord, threshold=None, window=None) -> Optional[Regression]:
+        """Замедление относительно предыдущих сборок проекта или None"""
+        threshold = self.threshold if threshold is None else threshold
+        if not record.ran_maven:
+            return None
+        baseline = self.baseline(record.project, before=record.started, window=window)
+        if not baseline:
+            return None
+        ratio = record.duration / baseline
+        if ratio > 1 + threshold and record.duration - baseline >= MIN_REGRESSION_SECONDS:
+            return Regression(record, baseline, ratio)
+        return None
+
+    def regressions(self, project_dir=None, limit=50, threshold=None, window=None) -> List[Regression]:
+        """Замедлившиеся сборки среди последних limit сборок"""
+        found = []
+        for record in self.builds(project_dir, limit=limit):
+            regression = self.check_regression(record, threshold, window)
+            if regression:
+                found.append(regression)
+        return found
+
+    def module_trend(self, project_dir, module, limit=20):
+        """Время модуля в последних сборках проекта: [(время начала, длительность)], от новых к старым"""
+        with self._lock:
+            return [tuple(row) for row in self._db.execute(
+                "SELECT b.started, m.duration FROM module_timings m JOIN builds b ON b.id = m.build_id "
+                "WHERE b.project = ? AND m.module = ? ORDER BY b.started DESC LIMIT ?",
+                (project_key(project_dir), module, limit)
+            )]
@@ -0,0 +1,172 @@
+"""Предварительная загрузка зависимостей проекта в локальный репозиторий Maven.
+
+Перед сборкой запускается dependency:go-offline (или другие цели, которые
+только загружают зависимости). После успешной загрузки хэш pom.xml проекта
+запоминается в настройках проекта (resolved_poms, как и после успешной
+сборки с профилем), и следующие сборки тех же pom.xml идут с -o, не
+обращаясь к удаленным репозиториям.
+
+Запись в общий локальный репозиторий (~/.m2/repository или заданный
+maven.repo.local) защищена межпроцессной блокировкой файла
+.majesty-prefetch.lock в его корне: загрузки из окна, консоли и сервера
+сборок выполняются по очереди, а сборки после загрузки идут автономно и
+репозиторий только читают.
+
+Для машин без доступа к сети вместо удаленных репозиториев можно указать
+зеркало - папку с репозиторием Maven или URL. Для него создается
+settings.xml с <mirrorOf>*</mirrorOf>, который передается Maven через -s.
+Зеркало задается в параметрах сборки или переменной MAJESTY_MAVEN_MIRROR,
+локальный репозиторий - переменной MAJESTY_MAVEN_REPO_LOCAL.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from majesty_cache import app_data_dir
+from majesty_filelock import FileLock
+
+logger = logging.getLogger('MajestyCompiler')
+
+# Цели Maven для загрузки зависимостей и плагинов сборки
+PREFETCH_GOALS = ["dependency:go-offline"]
+# Только зависимости и плагины проекта, без отчетов - если go-offline не справляется с проектом
+RESOLVE_GOALS = ["dependency:resolve", "dependency:resolve-plugins"]
+PREFETCH_MODES = {"go-offline": PREFETCH_GOALS, "resolve": RESOLVE_GOALS}
+
+LOCK_FILENAME = ".majesty-prefetch.lock"
+# Сколько ждать, пока другая загрузка освободит репозиторий
+DEFAULT_LOCK_TIMEOUT = 30 * 60
+LOCK_POLL_INTERVAL = 0.5
+
+MIRROR_ID = "majesty-mirror"
+SETTINGS_DIRNAME = "maven_settings"
+
+
+class PrefetchError(Exception):
+    """Ошибка загрузки зависимостей или настройки репозитория"""
+
+
+def default_mirror():
+    """Зеркало репозиториев из MAJESTY_MAVEN_MIRROR; None - репозитории из настроек Maven"""
+    return os.environ.get("MAJESTY_MAVEN_MIRROR") or None
+
+
+def default_local_repository_override():
+    """Локальный репозиторий из MAJESTY_MAVEN_REPO_LOCAL; None - как настроено в Maven"""
+    return os.environ.get("MAJESTY_MAVEN_REPO_LOCAL") or None
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def local_repository(override=None):
+    """Папка локального репозитория, в которую будет писать Maven"""
+    if override:
+        return os.path.abspath(os.path.expanduser(override))
+    user_settings = os.path.join(os.path.expanduser("~"), ".m2", "settings.xml")
+    try:
+        root = ET.parse(user_settings).getroot()
+        for child in root:
+            if _local_name(child.tag) == "localRepository" and child.text and child.text.strip():
+                return os.path.abspath(os.path.expanduser(child.text.strip()))
+    except (OSError, ET.ParseError):
+        pass
+    return os.path.join(os.path.expanduser("~"), ".m2", "repository")
+
+
+def mirror_url(mirror):
+    """URL зеркала: путь к папке превращается в file://, URL остается как есть"""
+    if re.match(r"^[A-Za-z][A-Za-z0-9+.-]+://", mirror):
+        return mirror
+    path = os.path.abspath(os.path.expanduser(mirror))
+    if not os.path.isdir(path):
+        raise PrefetchError(f"Папка зеркала репозитория не найдена: {path}")
+    return Path(path).as_uri()
+
+
+def mirror_settings_file(mirror):
+    """settings.xml, направляющий все репозитории Maven в зеркало; создается в папке данных приложения"""
+    url = mirror_url(mirror)
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<!-- Создан Majesty Compiler: все репозитории направлены в зеркало -->\n'
+        '<settings xmlns="http://maven.apache.org/SETTINGS/1.0.0">\n'
+        '  <mirrors>\n'
+        '    <mirror>\n'
+        f'      <id>{MIRROR_ID}</id>\n'
+        '      <mirrorOf>*</mirrorOf>\n'
+        f'      <url>{escape(url)}</url>\n'
+        '    </mirror>\n'
+        '  </mirrors>\n'
+        '</settings>\n'
+    )
+    folder = os.path.join(app_data_dir(), SETTINGS_DIRNAME)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"mirror_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}.xml")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return path
+    except OSError:
+        pass
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    logger.info(f"Создан settings.xml для зеркала {url}: {path}")
+    return path
+
+
+def repository_arguments(local_repository_override=None, mirror=None):
+    """Аргументы Maven для выбранного локального репозитория и зеркала"""
+    args = []
+    if mirror:
+        args += ["-s", mirror_settings_file(mirror)]
+    if local_repository_override:
+        args.append(f"-Dmaven.repo.local={local_repository(local_repository_override)}")
+    return args
+
+
+def prefetch_goals(mode):
+    goals = PREFETCH_MODES.get(mode)
+    if goals is None:
+        raise PrefetchError(f"Неизвестный режим загрузки зависимостей: {mode}")
+    return list(goals)
+
+
+def is_resolved(project_settings, digest):
+    """Зависимости текущих pom.xml уже загружены"""
+    return bool(digest) and project_settings.get("resolved_poms") == digest
+
+
+class RepositoryLock(FileLock):
+    """Монопольная запись в локальный репозиторий Maven на время загрузки зависимостей.
+
+    Файл блокировки лежит в корне репозитория, поэтому загрузки из окна,
+    консоли и сервера сборок (и потоки пакетной сборки) идут по очереди.
+    """
+
+    poll_interval = LOCK_POLL_INTERVAL
+
+    def __init__(self, repository, timeout=DEFAULT_LOCK_TIMEOUT, cancellation=None):
+        super().__init__(os.path.join(repository, LOCK_FILENAME), timeout)
+        self.repository = repository
+        self.cancellation = cancellation
+        self._reported = False
+
+    def waiting(self, deadline, other_process):
+        if not self._reported:
+            owner = "другим процессом" if other_process else "другой загрузкой"
+            logger.info(f"Локальный репозиторий занят {owner}, ожидание: {self.repository}")
+            self._reported = True
+        if self.cancellation is not None and self.cancellation.cancelled:
+            raise PrefetchError("Ожидание локального репозитория прервано")
+        if time.monotonic() > deadline:
+            raise PrefetchError(f"Локальный репозиторий занят дольше {self.timeout} с: {self.repository}")
@@ -0,0 +1,329 @@
+"""Профилирование сборки по выводу Maven.
+
+Профилировщик подключается к конвейеру логов как слушатель, отмечает время
+получения каждой строки и разбирает маркеры Maven:
+
+    [INFO] ------------------------< com.example:core >-------------------------
+    [INFO] Building core 1.0-SNAPSHOT                                   [2/5]
+    [INFO] --- compiler:3.11.0:compile (default-compile) @ core ---
+    [INFO] Reactor Summary for parent 1.0-SNAPSHOT:
+    [INFO] core ............................................... SUCCESS [  1.234 s]
+
+Цель плагина относится к модулю по artifactId после "@", а не к последней
+строке Building: при параллельной сборке (-T) модули выполняются
+одновременно и их строки перемешаны. В этом случае время модуля и его
+последней цели берется из сводки реактора.
+
+По ним строится модель времени по модулям, фазам и плагинам, которая
+сохраняется рядом с логами в profile_<время>.json и в виде временной
+диаграммы profile_<время>.html.
+"""
+import html
+import json
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+MODULE_PATTERN = re.compile(r"^\[INFO\] Building (?!\w+: )(.+?) (\S+?)(?:\s+\[(\d+)/(\d+)\])?\s*$")
+PROJECT_PATTERN = re.compile(r"^\[INFO\] -+< [^\s:]+:([^\s:>]+) >-+")
+BUILDER_PATTERN = re.compile(r"^\[INFO\] Using the \w+ implementation with a thread count of (\d+)")
+MOJO_PATTERN = re.compile(r"^\[INFO\] --- ([^\s:]+):([^\s:]+):([^\s:]+) \(([^)]*)\) @ (\S+) ---")
+SUMMARY_PATTERN = re.compile(r"^\[INFO\] (.+?) \.+ ?(SUCCESS|FAILURE|SKIPPED)(?: \[\s*([\d:.]+) (s|min|h)\])?")
+
+# Фаза жизненного цикла по цели плагина (Maven не выводит фазы явно)
+GOAL_PHASES = {
+    "clean": "clean",
+    "resources": "process-resources",
+    "compile": "compile",
+    "testResources": "process-test-resources",
+    "testCompile": "test-compile",
+    "test": "test",
+    "jar": "package",
+    "war": "package",
+    "ear": "package",
+    "shade": "package",
+    "single": "package",
+    "repackage": "package",
+    "test-jar": "package",
+    "integration-test": "integration-test",
+    "verify": "verify",
+    "install": "install",
+    "deploy": "deploy",
+}
+
+
+def parse_maven_duration(value, unit):
+    """Переводит '1.234 s', '01:02 min', '01:02 h' в секунды"""
+    parts = [float(p) for p in value.split(":")]
+    if unit == "s":
+        return parts[0]
+    if unit == "min":
+        return parts[0] * 60 + (parts[1] if len(parts) > 1 else 0)
+    return parts[0] * 3600 + (parts[1] * 60 if len(parts) > 1 else 0)
+
+
+@dataclass
+class MojoTiming:
+    plugin: str
+    version: str
+    goal: str
+    execution: str
+    phase: str
+    started: float
+    duration: float = 0.0
+
+
+@dataclass
+class ModuleTiming:
+    name: str
+    version: str = ""
+    artifact_id: str = ""
+    started: float = 0.0
+    duration: float = 0.0
+    status: str = ""
+    reported_duration: Optional[float] = None
+    mojos: List[MojoTiming] = field(default_factory=list)
+
+
+class BuildProfiler:
+    """Слушатель конвейера логов, собирающий временную модель сборки"""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._t0 = time.monotonic()
+        self.modules: List[ModuleTiming] = []
+        self.result = ""
+        self.lines = 0
+        self.duration = 0.0
+        # Параллельная сборка: строка Building не завершает выполняющиеся модули
+        self.parallel = False
+        # Выполняющиеся модули и открытая цель каждого из них (по artifactId)
+        self._running: List[ModuleTiming] = []
+        self._by_artifact: Dict[str, ModuleTiming] = {}
+        self._mojos: Dict[str, MojoTiming] = {}
+        self._project_artifact: Optional[str] = None
+        self._in_summary = False
+
+    def _now(self):
+        return time.monotonic() - self._t0
+
+    def _close_mojo(self, artifact, now):
+        mojo = self._mojos.pop(artifact, None)
+        if mojo is not None:
+            mojo.duration = max(now - mojo.started, 0.0)
+
+    def _close_module(self, module, now):
+        if module.artifact_id:
+            self._close_mojo(module.artifact_id, now)
+        if module in self._running:
+            module.duration = max(now - module.started, 0.0)
+            self._running.remove(module)
+
+    def _close_modules(self, now):
+        for module in list(self._running):
+            self._close_module(module, now)
+
+    def _module_named(self, name):
+        for module in self.modules:
+            if module.name == name:
+                return module
+        return None
+
+    def on_line(self, line, matched=False):
+        self.lines += 1
+        # Быстрая проверка: маркеры Maven бывают только в строках [INFO]
+        if not line.startswith("[INFO] ") and "\x1b" not in line:
+            return
+        if "\x1b" in line:
+            line = ANSI_ESCAPE.sub("", line)
+            if not line.startswith("[INFO] "):
+                return
+
+        now = self._now()
+        if line.startswith("[INFO] --- "):
+            match = MOJO_PATTERN.match(line)
+            if match:
+                self._on_mojo(match, now)
+            return
+        if line.startswith("[INFO] ---"):
+            match = PROJECT_PATTERN.match(line)
+            if match:
+                self._project_artifact = match.group(1)
+            return
+
+        if self._in_summary:
+            match = SUMMARY_PATTERN.match(line)
+            if match:
+                self._on_summary(match)
+                return
+
+        if line.startswith("[INFO] Building "):
+            match = MODULE_PATTERN.match(line)
+            if match:
+                self._on_module(match, now)
+        elif line.startswith("[INFO] Using the "):
+            match = BUILDER_PATTERN.match(line)
+            if match:
+                self.parallel = int(match.group(1)) > 1
+        elif line.startswith("[INFO] Reactor Summary"):
+            # Модули параллельной сборки завершаются по времени из сводки (_on_summary)
+            if not self.parallel:
+                self._close_modules(now)
+            self._in_summary = True
+        elif line.startswith("[INFO] BUILD "):
+            self._close_modules(now)
+            self._in_summary = False
+            self.result = line[len("[INFO] BUILD "):].strip()
+
+    def _on_module(self, match, now):
+        if not self.parallel:
+            self._close_modules(now)
+        module = ModuleTiming(name=match.group(1), version=match.group(2), artifact_id=self._project_artifact or "",
+                              started=now)
+        self._project_artifact = None
+        self.modules.append(module)
+        self._running.append(module)
+        if module.artifact_id:
+            self._by_artifact[module.artifact_id] = module
+
+    def _module_for(self, artifact, now):
+        """Модуль цели по artifactId из строки цели"""
+        module = self._by_artifact.get(artifact)
+        if module is not None:
+            return module
+        # Maven без строки <groupId:artifactId>: первая цель модуля идет после его строки Building
+        module = next((m for m in reversed(self._running) if not m.artifact_id), None)
+        if module is None:
+            # Одномодульная сборка без строки Building
+            module = ModuleTiming(name=artifact, started=now)
+            self.modules.append(module)
+            self._running.append(module)
+        module.artifact_id = artifact
+        self._by_artifact[artifact] = module
+        return module
+
+    def _on_mojo(self, match, now):
+        plugin, version, goal, execution, artifact = match.groups()
+        module = self._module_for(artifact, now)
+        self._close_mojo(artifact, now)
+        mojo = MojoTiming(plugin=plugin, version=version, goal=goal, execution=execution,
+                          phase=GOAL_PHASES.get(goal, "other"), started=now)
+        self._mojos[artifact] = mojo
+        module.mojos.append(mojo)
+
+    def _on_summary(self, match):
+        name, status, value, unit = match.groups()
+        # В сводке после имени модуля может стоять версия
+        module = self._module_named(name) or self._module_named(name.rsplit(" ", 1)[0])
+        if module is None:
+            module = ModuleTiming(name=name)
+            self.modules.append(module)
+        module.status = status
+        if value:
+            module.reported_duration = parse_maven_duration(value, unit)
+            if module in self._running:
+                # Параллельная сборка: модуль закончился через указанное в сводке время после своего начала
+                self._close_module(module, min(module.started + module.reported_duration, self._now()))
+
+    def finish(self, returncode=None):
+        now = self._now()
+        self._close_modules(now)
+        self.duration = now
+        if not self.result and returncode is not None:
+            self.result = "SUCCESS" if returncode == 0 else "FAILURE"
+
+    def module_timings(self) -> Dict[str, float]:
+        """Время каждого модуля: по сводке Maven, а если ее нет - по меткам строк"""
+        return {m.name: m.reported_duration if m.reported_duration is not None else m.duration
+                for m in self.modules}
+
+    def report(self):
+        phases: Dict[str, float] = {}
+        plugins: Dict[str, float] = {}
+        for module in self.modules:
+            for mojo in module.mojos:
+                phases[mojo.phase] = phases.get(mojo.phase, 0.0) + mojo.duration
+                key = f"{mojo.plugin}:{mojo.goal}"
+                plugins[key] = plugins.get(key, 0.0) + mojo.duration
+        slowest = sorted(
+            ({"module": m.name, "mojo": f"{j.plugin}:{j.goal} ({j.execution})", "duration": round(j.duration, 3)}
+             for m in self.modules for j in m.mojos),
+            key=lambda item: item["duration"], reverse=True
+        )[:10]
+        return {
+            "build": {
+                "started": self.started_at.isoformat(timespec="seconds"),
+                "duration": round(self.duration, 3),
+                "result": self.result,
+                "lines": self.lines,
+            },
+            "modules": [asdict(m) for m in self.modules],
+            "phases": dict(sorted(phases.items(), key=lambda item: item[1], reverse=True)),
+            "plugins": dict(sorted(plugins.items(), key=lambda item: item[1], reverse=True)),
+            "slowest_mojos": slowest,
+        }
+
+    def write_reports(self, json_path, html_path):
+        report = self.report()
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(render_timeline(report))
+        return report
+
+
+def _bar(left, width, color, title, label=""):
+    return (f'<div class="bar" style="left:{left:.3f}%;width:{max(width, 0.15):.3f}%;background:{color}" '
+            f'title="{html.escape(title)}">{html.escape(label)}</div>')
+
+
+PHASE_COLORS = {
+    "clean": "#9e9e9e", "process-resources": "#90caf9", "compile": "#1e88e5", "process-test-resources": "#a5d6a7",
+    "test-compile": "#43a047", "test": "#fb8c00", "package": "#8e24aa", "integration-test": "#f4511e",
+    "verify": "#6d4c41", "install": "#00897b", "deploy": "#3949ab", "other": "#757575",
+}
+
+
+def render_timeline(report):
+    """Простая HTML-диаграмма: строка на модуль, полосы - выполнение целей плагинов"""
+    total = report["build"]["duration"] or 1.0
+    rows = []
+    for module in report["modules"]:
+        bars = [_bar(module["started"] / total * 100, module["duration"] / total * 100, "#e0e0e0",
+                     f'{module["name"]}: {module["duration"]:.2f} с')]
+        for mojo in module["mojos"]:
+            title = f'{mojo["plugin"]}:{mojo["goal"]} ({mojo["execution"]}) - {mojo["phase"]}, {mojo["duration"]:.2f} с'
+            bars.append(_bar(mojo["started"] / total * 100, mojo["duration"] / total * 100,
+                             PHASE_COLORS.get(mojo["phase"], "#757575"), title, mojo["goal"]))
+        rows.append(f'<div class="row"><div class="name">{html.escape(module["name"])} '
+                    f'<small>{module["duration"]:.1f} с</small></div><div class="track">{"".join(bars)}</div></div>')
+
+    plugin_rows = "".join(f"<tr><td>{html.escape(name)}</td><td>{seconds:.2f} с</td></tr>"
+                          for name, seconds in report["plugins"].items())
+    phase_rows = "".join(f'<tr><td><span class="swatch" style="background:{PHASE_COLORS.get(name, "#757575")}">'
+                         f'</span>{html.escape(name)}</td><td>{seconds:.2f} с</td></tr>'
+                         for name, seconds in report["phases"].items())
+    build = report["build"]
+    return f"""<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>Профиль сборки {html.escape(build["started"])}</title>
+<style>
+body {{ font-family: Segoe UI, Arial, sans-serif; margin: 20px; }}
+.row {{ display: flex; align-items: center; height: 24px; }}
+.name {{ width: 260px; overflow: hidden; white-space: nowrap; text-overflow: ellipsis; font-size: 13px; }}
+.track {{ position: relative; flex: 1; height: 18px; background: #fafafa; border-left: 1px solid #ccc; }}
+.bar {{ position: absolute; top: 0; height: 18px; font-size: 10px; color: #fff; overflow: hidden;
+        white-space: nowrap; box-sizing: border-box; border-right: 1px solid #fff; }}
+table {{ border-collapse: collapse; margin-top: 16px; display: inline-table; margin-right: 40px; vertical-align: top; }}
+td {{ padding: 2px 12px 2px 0; font-size: 13px; }}
+.swatch {{ display: inline-block; width: 10px; height: 10px; margin-right: 6px; }}
+</style></head><body>
+<h2>Профиль сборки {html.escape(build["started"])}</h2>
+<p>Результат: {html.escape(build["result"] or "-")}, время: {build["duration"]:.1f} с, строк лога: {build["lines"]}</p>
+{"".join(rows)}
+<table><tr><th align="left">Фаза</th><th align="left">Время</th></tr>{phase_rows}</table>
+<table><tr><th align="left">Плагин:цель</th><th align="left">Время</th></tr>{plugin_rows}</table>
+</body></html>
+"""
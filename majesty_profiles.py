@@ -0,0 +1,172 @@
+"""Профили сборки: параллельность, автономный режим и пропуск необязательных шагов.
+
+Профиль превращается в аргументы Maven:
+- -T N, где N - меньшее из числа ядер и ширины графа модулей (сколько
+  модулей реактора могут собираться одновременно);
+- -o, если зависимости текущих pom.xml уже были загружены успешной сборкой;
+- -DskipTests, пропуск javadoc/sources и -q для быстрого профиля.
+
+Встроенные профили fast и full можно дополнить или переопределить в файле
+build_profiles.json в папке данных приложения. Для каждого проекта в
+ProjectSettings запоминается время сборок по профилям и какой из них был
+быстрее.
+"""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from majesty_cache import app_data_dir
+
+logger = logging.getLogger('MajestyCompiler')
+
+PROFILES_FILENAME = "build_profiles.json"
+PROFILE_FULL = "full"
+PROFILE_FAST = "fast"
+# Вместо имени профиля: самый быстрый из уже опробованных для проекта
+PROFILE_BEST = "best"
+THREADS_AUTO = "auto"
+
+
+@dataclass
+class BuildProfile:
+    name: str
+    description: str = ""
+    # "auto" - по числу ядер и ширине графа модулей, число или строка Maven вида "1C", None - без -T
+    threads: Optional[str] = THREADS_AUTO
+    # Включать -o, когда зависимости текущих pom.xml уже загружены
+    offline: bool = False
+    skip_tests: bool = False
+    skip_docs: bool = False
+    quiet: bool = False
+    extra_args: List[str] = field(default_factory=list)
+
+
+DEFAULT_PROFILES = {
+    PROFILE_FULL: BuildProfile(PROFILE_FULL, "Полная сборка с тестами"),
+    PROFILE_FAST: BuildProfile(PROFILE_FAST, "Без тестов, javadoc и sources, автономно, краткий вывод",
+                               offline=True, skip_tests=True, skip_docs=True, quiet=True),
+}
+
+
+def load_profiles(path=None) -> Dict[str, BuildProfile]:
+    """Встроенные профили и профили из build_profiles.json ({"имя": {поля BuildProfile}})"""
+    profiles = dict(DEFAULT_PROFILES)
+    path = path or os.path.join(app_data_dir(), PROFILES_FILENAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            custom = json.load(f)
+        for name, values in custom.items():
+            base = asdict(profiles.get(name, BuildProfile(name)))
+            base.update(values, name=name)
+            profiles[name] = BuildProfile(**base)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Не удалось прочитать профили сборки из {path}: {str(e)}")
+    return profiles
+
+
+def reactor_width(reactor):
+    """Наибольшее число модулей реактора, которые не зависят друг от друга и могут собираться одновременно"""
+    by_coords = {m.coordinates: m for m in reactor}
+    upstream = {}
+    for module in reactor:
+        deps = module.dependencies + ([module.parent] if module.parent else [])
+        upstream[module.name] = {by_coords[c].name for c in deps if c in by_coords and by_coords[c].name != module.name}
+
+    levels = {}
+
+    def level(name, visiting=()):
+        if name in levels:
+            return levels[name]
+        if name in visiting:
+            return 0  # цикл в pom.xml - Maven сам сообщит об ошибке
+        value = 1 + max((level(u, visiting + (name,)) for u in upstream[name]), default=-1)
+        levels[name] = value
+        return value
+
+    width = {}
+    for module in reactor:
+        # Агрегирующий pom без кода собирается мгновенно и не занимает поток
+        if module.packaging == "pom":
+            continue
+        value = level(module.name)
+        width[value] = width.get(value, 0) + 1
+    return max(width.values(), default=1)
+
+
+def thread_count(reactor, cpu_count=None):
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, min(cpu_count, reactor_width(reactor)))
+
+
+def pom_digest(reactor):
+    """Хэш всех pom.xml реактора: зависимости проекта не менялись, пока он тот же"""
+    digest = hashlib.sha256()
+    for module in sorted(reactor, key=lambda m: m.name):
+        digest.update(module.name.encode('utf-8'))
+        try:
+            with open(os.path.join(module.path, "pom.xml"), 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            pass
+    return digest.hexdigest()
+
+
+def profile_arguments(profile: BuildProfile, reactor, daemon=False, dependencies_resolved=False):
+    """Аргументы Maven для профиля; возвращает (аргументы, используется ли -o)"""
+    args = []
+    # mvnd сам собирает модули параллельно
+    if profile.threads and not daemon:
+        threads = str(thread_count(reactor)) if profile.threads == THREADS_AUTO else str(profile.threads)
+        if threads != "1":
+            args += ["-T", threads]
+    offline = profile.offline and dependencies_resolved
+    if offline:
+        args.append("-o")
+    if profile.skip_tests:
+        args.append("-DskipTests")
+    if profile.skip_docs:
+        args += ["-Dmaven.javadoc.skip=true", "-Dmaven.source.skip=true"]
+    if profile.quiet:
+        args.append("-q")
+    return args + list(profile.extra_args), offline
+
+
+def best_profile(project_settings, default=PROFILE_FULL):
+    """Профиль с наименьшим временем сборки среди опробованных для проекта"""
+    stats = project_settings.get("profile_stats", {})
+    if not stats:
+        return default
+    return min(stats, key=lambda name: stats[name]["best"])
+
+
+def resolve_profile(name, project_settings, profiles=None) -> Optional[BuildProfile]:
+    """Профиль по имени; 'best' - самый быстрый для проекта; None, если такого профиля нет"""
+    profiles = profiles or load_profiles()
+    if name == PROFILE_BEST:
+        name = best_profile(project_settings)
+    return profiles.get(name)
+
+
+def profile_stats_update(project_settings, profile_name, wall_time, success, digest, offline):
+    """Новые значения настроек проекта после сборки с профилем (для ProjectSettings.update)"""
+    updates = {}
+    if success:
+        # Успешная сборка без -o загрузила все зависимости этих pom.xml
+        updates["resolved_poms"] = digest
+        stats = dict(project_settings.get("profile_stats", {}))
+        entry = dict(stats.get(profile_name, {"runs": 0, "best": wall_time}))
+        entry["runs"] += 1
+        entry["last"] = round(wall_time, 2)
+        entry["best"] = round(min(entry["best"], wall_time), 2)
+        stats[profile_name] = entry
+        updates["profile_stats"] = stats
+        updates["last_profile"] = profile_name
+    elif offline:
+        # Возможно, не хватило зависимостей: следующая сборка пойдет без -o
+        updates["resolved_poms"] = None
+    return updates
@@ -0,0 +1,164 @@
+"""Публикация собранных артефактов в папку вывода.
+
+Файл копируется потоково (средствами ядра через copy_file_range/sendfile,
+где они доступны, иначе блоками), сначала во временный файл, который затем
+атомарно переименовывается. Рядом сохраняется файл .sha256 в формате
+sha256sum. Выбор имени версии и дедупликация - в majesty_registry.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from dataclasses import dataclass
+
+logger = logging.getLogger('MajestyCompiler')
+
+COPY_CHUNK = 1024 * 1024
+SIDECAR_SUFFIX = ".sha256"
+
+# Режимы дедупликации одинаковых артефактов
+DEDUP_SKIP = "skip"  # не создавать новую версию, вернуть путь к последней
+DEDUP_LINK = "link"  # создать новую версию жесткой ссылкой на последнюю
+DEDUP_OFF = "off"    # всегда копировать
+DEDUP_MODES = (DEDUP_SKIP, DEDUP_LINK, DEDUP_OFF)
+
+
+@dataclass
+class PublishResult:
+    path: str
+    sha256: str
+    size: int
+    deduplicated: bool = False
+    linked: bool = False
+
+
+def sha256_of_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sidecar_path(path):
+    return path + SIDECAR_SUFFIX
+
+
+def read_sidecar(path):
+    """Хэш из файла .sha256 рядом с артефактом или None"""
+    try:
+        with open(sidecar_path(path), 'r', encoding='utf-8') as f:
+            value = f.read().split()
+    except OSError:
+        return None
+    return value[0] if value else None
+
+
+def write_sidecar(path, digest):
+    target = sidecar_path(path)
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(f"{digest}  {os.path.basename(path)}\n")
+    os.replace(tmp_path, target)
+
+
+def file_sha256(path):
+    """Хэш артефакта: из файла .sha256, если он есть, иначе вычисляется"""
+    return read_sidecar(path) or sha256_of_file(path)
+
+
+def _kernel_copy(src, dst, size):
+    """Копирование без передачи данных через память процесса; False, если не поддерживается"""
+    copy_range = getattr(os, "copy_file_range", None)
+    if copy_range is not None:
+        try:
+            copied = 0
+            while copied < size:
+                sent = copy_range(src.fileno(), dst.fileno(), size - copied)
+                if sent == 0:
+                    break
+                copied += sent
+            if copied == size:
+                return True
+        except OSError:
+            pass
+        src.seek(0)
+        dst.seek(0)
+        dst.truncate()
+
+    sendfile = getattr(os, "sendfile", None)
+    if sendfile is not None and os.name != "nt":
+        try:
+            offset = 0
+            while offset < size:
+                sent = sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            if offset == size:
+                dst.seek(offset)
+                return True
+        except OSError:
+            pass
+        src.seek(0)
+        dst.seek(0)
+        dst.truncate()
+    return False
+
+
+def copy_file_streaming(src_path, dst_path):
+    """Копирует файл без загрузки его целиком в память"""
+    size = os.path.getsize(src_path)
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        if not _kernel_copy(src, dst, size):
+            shutil.copyfileobj(src, dst, COPY_CHUNK)
+        dst.flush()
+        os.fsync(dst.fileno())
+    return size
+
+
+def publish_file(src_path, dest_path, digest=None):
+    """Атомарно публикует файл: копия во временный файл рядом с назначением и переименование"""
+    digest = digest or sha256_of_file(src_path)
+    dest_dir = os.path.dirname(dest_path)
+    tmp_path = os.path.join(dest_dir, f".{os.path.basename(dest_path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        size = copy_file_streaming(src_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    write_sidecar(dest_path, digest)
+    return PublishResult(path=dest_path, sha256=digest, size=size)
+
+
+def same_content(path, digest, size):
+    """Совпадает ли файл с артефактом, у которого известны хэш и размер"""
+    return os.path.exists(path) and os.path.getsize(path) == size and file_sha256(path) == digest
+
+
+def link_file(existing_path, dest_path, digest):
+    """Публикует одинаковый артефакт жесткой ссылкой; None, если ссылки не поддерживаются"""
+    # Ссылка создается под временным именем и заменяет файл назначения (заглушку реестра) атомарно
+    tmp_path = os.path.join(os.path.dirname(dest_path),
+                            f".{os.path.basename(dest_path)}.{os.getpid()}.{threading.get_ident()}.link")
+    try:
+        os.link(existing_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except OSError as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        logger.warning(f"Не удалось создать жесткую ссылку, файл будет скопирован: {str(e)}")
+        return None
+    write_sidecar(dest_path, digest)
+    logger.info(f"Артефакт не изменился, создана жесткая ссылка {dest_path} -> {existing_path}")
+    return PublishResult(path=dest_path, sha256=digest, size=os.path.getsize(dest_path), deduplicated=True, linked=True)
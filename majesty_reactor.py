@@ -0,0 +1,254 @@
+"""Разбор многомодульных Maven-проектов и индекс измененных файлов.
+
+Индекс хранится в <проект>/MajestyCompiler/module_index.json и содержит
+для каждого файла модуля время изменения, размер и SHA-256. Хэш
+пересчитывается только для файлов, у которых изменились mtime или размер,
+поэтому проверка большого проекта занимает доли секунды.
+"""
+import hashlib
+import json
+import logging
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger('MajestyCompiler')
+
+INDEX_FILENAME = "module_index.json"
+# Папки внутри модуля, не влияющие на сборку
+IGNORED_DIRS = {"target", "MajestyCompiler", ".git", ".svn", ".hg", ".idea", ".vscode", ".settings", "node_modules"}
+
+
+@dataclass
+class MavenModule:
+    """Модуль реактора Maven"""
+    name: str  # путь относительно корня проекта, "." для корневого pom.xml
+    path: str
+    group_id: str
+    artifact_id: str
+    packaging: str = "jar"
+    version: str = ""
+    modules: List[str] = field(default_factory=list)
+    dependencies: List[Tuple[str, str]] = field(default_factory=list)
+    parent: Optional[Tuple[str, str]] = None
+
+    @property
+    def coordinates(self):
+        return self.group_id, self.artifact_id
+
+
+def _strip_ns(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child(element, name):
+    for child in element:
+        if _strip_ns(child.tag) == name:
+            return child
+    return None
+
+
+def _child_text(element, name, default=""):
+    child = _child(element, name) if element is not None else None
+    return child.text.strip() if child is not None and child.text else default
+
+
+def parse_pom(pom_path):
+    """Читает координаты, модули и зависимости из pom.xml"""
+    root = ET.parse(pom_path).getroot()
+    parent = _child(root, "parent")
+    parent_coords = None
+    if parent is not None:
+        parent_coords = (_child_text(parent, "groupId"), _child_text(parent, "artifactId"))
+
+    group_id = _child_text(root, "groupId") or (parent_coords[0] if parent_coords else "")
+    version = _child_text(root, "version") or _child_text(parent, "version")
+    module = MavenModule(
+        name="",
+        path=os.path.dirname(os.path.abspath(pom_path)),
+        group_id=group_id,
+        artifact_id=_child_text(root, "artifactId"),
+        packaging=_child_text(root, "packaging", "jar"),
+        version=version,
+        parent=parent_coords,
+    )
+
+    modules = _child(root, "modules")
+    if modules is not None:
+        module.modules = [m.text.strip() for m in modules if _strip_ns(m.tag) == "module" and m.text]
+
+    dependencies = _child(root, "dependencies")
+    if dependencies is not None:
+        for dep in dependencies:
+            if _strip_ns(dep.tag) != "dependency":
+                continue
+            dep_group = _child_text(dep, "groupId").replace("${project.groupId}", group_id)
+            module.dependencies.append((dep_group, _child_text(dep, "artifactId")))
+    return module
+
+
+def load_reactor(project_dir):
+    """Возвращает список модулей реактора, начиная с корневого, обходя <modules> рекурсивно"""
+    project_dir = os.path.abspath(project_dir)
+    reactor = []
+    seen = set()
+
+    def visit(module_dir):
+        pom_path = os.path.join(module_dir, "pom.xml")
+        real_dir = os.path.normcase(os.path.realpath(module_dir))
+        if real_dir in seen or not os.path.exists(pom_path):
+            return
+        seen.add(real_dir)
+        try:
+            module = parse_pom(pom_path)
+        except (ET.ParseError, OSError) as e:
+            logger.warning(f"Не удалось разобрать {pom_path}: {str(e)}")
+            return
+        rel_path = os.path.relpath(module_dir, project_dir)
+        module.name = rel_path.replace(os.sep, "/")
+        reactor.append(module)
+        for child in module.modules:
+            visit(os.path.normpath(os.path.join(module_dir, child)))
+
+    visit(project_dir)
+    return reactor
+
+
+def dependents_of(reactor, changed_names):
+    """Возвращает измененные модули вместе со всеми модулями, которые от них зависят"""
+    by_coords = {m.coordinates: m for m in reactor}
+    users = {m.name: set() for m in reactor}
+    for module in reactor:
+        for coords in module.dependencies + ([module.parent] if module.parent else []):
+            upstream = by_coords.get(coords)
+            if upstream is not None and upstream.name != module.name:
+                users[upstream.name].add(module.name)
+
+    result = set()
+    stack = list(changed_names)
+    while stack:
+        name = stack.pop()
+        if name in result:
+            continue
+        result.add(name)
+        stack.extend(users.get(name, ()))
+    return result
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModuleIndex:
+    """Постоянный индекс состояния файлов каждого модуля проекта"""
+
+    def __init__(self, project_dir, index_dir=None):
+        self.project_dir = os.path.abspath(project_dir)
+        index_dir = index_dir or os.path.join(self.project_dir, "MajestyCompiler")
+        self.index_path = os.path.join(index_dir, INDEX_FILENAME)
+        self.modules = self._load()
+
+    @property
+    def exists(self):
+        return bool(self.modules)
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("modules", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Индекс модулей поврежден и будет пересоздан: {str(e)}")
+            return {}
+
+    def save(self, modules):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"modules": modules}, f)
+        os.replace(tmp_path, self.index_path)
+        self.modules = modules
+
+    def _scan_module(self, module, nested_dirs, previous):
+        """Снимок файлов модуля без вложенных модулей; хэши берутся из индекса, если файл не трогали"""
+        snapshot = {}
+        stack = [module.path]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = list(os.scandir(current))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in IGNORED_DIRS or os.path.normcase(entry.path) in nested_dirs:
+                        continue
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    rel_path = os.path.relpath(entry.path, module.path).replace(os.sep, "/")
+                    old = previous.get(rel_path)
+                    if old and old[0] == stat.st_mtime_ns and old[1] == stat.st_size:
+                        snapshot[rel_path] = old
+                    else:
+                        snapshot[rel_path] = [stat.st_mtime_ns, stat.st_size, _hash_file(entry.path)]
+        return snapshot
+
+    def scan(self, reactor):
+        """Возвращает (новый снимок, имена измененных модулей)"""
+        module_dirs = {os.path.normcase(m.path) for m in reactor}
+        snapshot = {}
+        changed = []
+        for module in reactor:
+            nested = module_dirs - {os.path.normcase(module.path)}
+            previous = self.modules.get(module.name, {})
+            files = self._scan_module(module, nested, previous)
+            snapshot[module.name] = files
+            old_hashes = {path: entry[2] for path, entry in previous.items()}
+            new_hashes = {path: entry[2] for path, entry in files.items()}
+            if old_hashes != new_hashes:
+                changed.append(module.name)
+        return snapshot, changed
+
+
+@dataclass
+class IncrementalPlan:
+    """Что именно нужно собрать при инкрементальной сборке"""
+    reactor: List[MavenModule]
+    snapshot: dict
+    changed: List[str]
+    full: bool  # собрать весь реактор (нет индекса или изменился корневой pom.xml)
+
+    @property
+    def up_to_date(self):
+        return not self.full and not self.changed
+
+    def maven_arguments(self):
+        """Аргументы -pl/-amd для Maven; пустой список означает сборку всего реактора"""
+        if self.full or not self.changed:
+            return []
+        return ["-pl", ",".join(sorted(self.changed)), "-amd"]
+
+    def describe(self):
+        if self.full:
+            return "весь реактор"
+        if not self.changed:
+            return "изменений нет"
+        affected = dependents_of(self.reactor, self.changed)
+        return f"измененные модули: {', '.join(sorted(self.changed))}; вместе с зависимыми: {len(affected)}"
+
+
+def plan_incremental_build(project_dir, index):
+    """Сравнивает текущее состояние проекта с индексом и составляет план сборки"""
+    reactor = load_reactor(project_dir)
+    snapshot, changed = index.scan(reactor)
+    full = not index.exists or (bool(changed) and ("." in changed or len(reactor) <= 1))
+    plan = IncrementalPlan(reactor=reactor, snapshot=snapshot, changed=changed, full=full)
+    logger.info(f"Инкрементальная сборка: {plan.describe()}")
+    return plan
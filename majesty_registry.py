@@ -0,0 +1,268 @@
+"""Реестр опубликованных версий артефактов.
+
+Манифест .majesty_versions.json в папке вывода хранит для каждого имени
+артефакта номер следующей версии и список опубликованных версий (номер,
+время, размер, SHA-256, лог сборки). Следующее имя вычисляется без
+перебора файлов; при отсутствии манифеста он один раз восстанавливается
+по содержимому папки.
+
+Нумерация совпадает с прежней: первая сборка сохраняется под базовым
+именем (версия 0), следующие - как <имя>-v1, <имя>-v2 и т.д.
+
+В одну папку могут публиковать окно, консоль и сервер сборок: манифест
+изменяется под межпроцессной блокировкой, а имя новой версии занимается
+пустым файлом, созданным с O_EXCL, до копирования артефакта.
+"""
+import contextlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+from majesty_publish import (DEDUP_LINK, DEDUP_OFF, DEDUP_SKIP, SIDECAR_SUFFIX, PublishResult, link_file,
+                             publish_file, read_sidecar, same_content, sha256_of_file)
+from majesty_filelock import FileLock
+
+logger = logging.getLogger('MajestyCompiler')
+
+MANIFEST_FILENAME = ".majesty_versions.json"
+
+# Один реестр на папку: параллельные публикации в процессе работают с общим манифестом
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+@dataclass
+class VersionEntry:
+    version: int
+    filename: str
+    timestamp: float
+    size: int = 0
+    sha256: str = ""
+    build_log: str = ""
+
+
+def versioned_filename(base_name, version):
+    if version == 0:
+        return base_name
+    stem, extension = os.path.splitext(base_name)
+    return f"{stem}-v{version}{extension}"
+
+
+class VersionRegistry:
+    """Манифест версий артефактов в одной папке вывода"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self._lock = threading.RLock()
+        self._manifest_mtime = None
+        self._artifacts = self._load()
+
+    @classmethod
+    def open(cls, output_dir):
+        """Общий экземпляр реестра для папки"""
+        key = os.path.normcase(os.path.abspath(output_dir))
+        with _registries_lock:
+            registry = _registries.get(key)
+            if registry is None:
+                registry = _registries[key] = cls(output_dir)
+            else:
+                registry.reload_if_changed()
+            return registry
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self):
+        """Перечитывает манифест, если его изменил или удалил другой процесс"""
+        with self._lock:
+            if self._current_mtime() != self._manifest_mtime:
+                self._artifacts = self._load()
+
+    def _load(self):
+        self._manifest_mtime = self._current_mtime()
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("artifacts", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Манифест версий поврежден и будет восстановлен по файлам: {str(e)}")
+            return {}
+
+    @contextlib.contextmanager
+    def _locked_manifest(self):
+        """Чтение-изменение-запись манифеста: блокировка потоков и процессов, манифест перечитан с диска"""
+        with self._lock, FileLock(f"{self.manifest_path}.lock"):
+            self._artifacts = self._load()
+            yield
+
+    def _save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"artifacts": self._artifacts}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = self._current_mtime()
+
+    def _artifact(self, base_name):
+        artifact = self._artifacts.get(base_name)
+        if artifact is None:
+            artifact = self._artifacts[base_name] = self._scan(base_name)
+        return artifact
+
+    def _scan(self, base_name):
+        """Восстанавливает сведения о версиях по файлам в папке (один проход scandir)"""
+        stem, extension = os.path.splitext(base_name)
+        pattern = re.compile(rf"^{re.escape(stem)}(?:-v(\d+))?{re.escape(extension)}$")
+        versions = []
+        if os.path.isdir(self.output_dir):
+            with os.scandir(self.output_dir) as entries:
+                for entry in entries:
+                    match = pattern.match(entry.name)
+                    if not match or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    version = int(match.group(1)) if match.group(1) else 0
+                    sha256 = read_sidecar(entry.path) or ""
+                    versions.append(asdict(VersionEntry(version, entry.name, stat.st_mtime, stat.st_size, sha256)))
+        versions.sort(key=lambda v: v["version"])
+        next_version = versions[-1]["version"] + 1 if versions else 0
+        if versions:
+            logger.info(f"Манифест версий {base_name} восстановлен по файлам: {len(versions)} версий")
+        return {"next_version": next_version, "versions": versions}
+
+    def peek_next(self, base_name):
+        """Имя, под которым будет опубликована следующая версия"""
+        with self._lock:
+            return versioned_filename(base_name, self._artifact(base_name)["next_version"])
+
+    def reserve(self, base_name):
+        """Резервирует номер следующей версии и возвращает (номер, имя файла).
+
+        Имя занимается пустым файлом, который затем заменяет опубликованный артефакт.
+        """
+        with self._locked_manifest():
+            artifact = self._artifact(base_name)
+            version = artifact["next_version"]
+            # Файл мог появиться в обход реестра - пропускаем занятые имена
+            while True:
+                path = os.path.join(self.output_dir, versioned_filename(base_name, version))
+                try:
+                    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    break
+                except FileExistsError:
+                    version += 1
+            artifact["next_version"] = version + 1
+            self._save()
+            filename = versioned_filename(base_name, version)
+            logger.info(f"Новая версия файла: {filename}")
+            return version, filename
+
+    def record(self, base_name, entry: VersionEntry):
+        with self._locked_manifest():
+            artifact = self._artifact(base_name)
+            artifact["versions"].append(asdict(entry))
+            artifact["versions"].sort(key=lambda v: v["version"])
+            self._save()
+
+    def latest(self, base_name) -> Optional[VersionEntry]:
+        """Последняя опубликованная версия, файл которой существует"""
+        with self._lock:
+            for version in reversed(self._artifact(base_name)["versions"]):
+                if os.path.exists(os.path.join(self.output_dir, version["filename"])):
+                    return VersionEntry(**version)
+            return None
+
+    def list_versions(self, base_name=None) -> List[VersionEntry]:
+        """Версии одного артефакта или всех артефактов папки, от старых к новым"""
+        with self._lock:
+            names = [base_name] if base_name else list(self._artifacts)
+            return [VersionEntry(**v) for name in names for v in self._artifact(name)["versions"]]
+
+    def artifact_names(self):
+        with self._lock:
+            return list(self._artifacts)
+
+    def publish(self, base_name, src_path, dedup=DEDUP_SKIP, build_log=""):
+        """Публикует артефакт как очередную версию base_name с учетом дедупликации"""
+        digest = sha256_of_file(src_path)
+        size = os.path.getsize(src_path)
+
+        latest = self.latest(base_name) if dedup != DEDUP_OFF else None
+        latest_path = os.path.join(self.output_dir, latest.filename) if latest else None
+        duplicate = latest_path is not None and same_content(latest_path, digest, size)
+        if duplicate and dedup == DEDUP_SKIP:
+            logger.info(f"Артефакт не изменился, новая версия не создается: {latest_path}")
+            return PublishResult(path=latest_path, sha256=digest, size=size, deduplicated=True)
+
+        version, filename = self.reserve(base_name)
+        dest_path = os.path.join(self.output_dir, filename)
+        try:
+            published = None
+            if duplicate and dedup == DEDUP_LINK:
+                published = link_file(latest_path, dest_path, digest)
+            if published is None:
+                logger.info(f"Публикация артефакта {src_path} -> {dest_path}")
+                published = publish_file(src_path, dest_path, digest)
+        except BaseException:
+            # Заглушка зарезервированного имени не должна выглядеть опубликованной версией
+            try:
+                os.remove(dest_path)
+            except OSError:
+                pass
+            raise
+
+        self.record(base_name, VersionEntry(version, filename, time.time(), size, digest, build_log or ""))
+        return published
+
+    def _remove_version(self, filename):
+        """Удаляет файл версии и его .sha256; False - файл версии остался на диске"""
+        path = os.path.join(self.output_dir, filename)
+        for victim in (path, path + SIDECAR_SUFFIX):
+            try:
+                os.remove(victim)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Не удалось удалить старую версию {victim}: {str(e)}")
+                if victim == path:
+                    return False
+        return True
+
+    def prune(self, base_name, keep_last=None, max_total_bytes=None):
+        """Удаляет старые версии сверх лимитов; последняя версия не удаляется никогда"""
+        removed = []
+        with self._locked_manifest():
+            versions = self._artifact(base_name)["versions"]
+            kept = list(versions)
+            # Версии, файл которых удалить не удалось: остаются в манифесте до следующей очистки
+            locked = []
+            total = sum(v["size"] for v in kept)
+            while len(kept) > 1 and (
+                (keep_last is not None and len(kept) > keep_last)
+                or (max_total_bytes is not None and total > max_total_bytes)
+            ):
+                oldest = kept.pop(0)
+                total -= oldest["size"]
+                if self._remove_version(oldest["filename"]):
+                    removed.append(VersionEntry(**oldest))
+                else:
+                    locked.append(oldest)
+            if removed:
+                self._artifacts[base_name]["versions"] = locked + kept
+                self._save()
+                logger.info(f"Удалено старых версий {base_name}: {len(removed)}")
+        return removed
+
+
+def format_version_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
@@ -0,0 +1,614 @@
+"""Локальный сервер сборок: общая очередь для всех пользователей и скриптов машины.
+
+Сервер (asyncio, HTTP на 127.0.0.1) принимает задания на сборку, ставит их
+в очередь с приоритетами и запускает не больше заданного числа сборок
+одновременно; два задания одного проекта никогда не выполняются
+параллельно. Вывод Maven транслируется клиентам по мере сборки, задание
+можно отменить в очереди или во время выполнения.
+
+    GET  /status              состояние сервера
+    GET  /jobs                задания (в очереди, выполняющиеся, завершенные)
+    POST /jobs                новое задание: {"project_dir", "priority", "submitter", "options": {...}}
+    GET  /jobs/<id>           состояние задания и итог сборки
+    GET  /jobs/<id>/log       вывод Maven (?from=N - с N-й строки, ?follow=0 - не ждать новых строк)
+    POST /jobs/<id>/cancel    отменить задание
+
+Каждый запрос должен передавать токен сервера в заголовке X-Majesty-Token.
+Токен задается --token или MAJESTY_SERVER_TOKEN; если он не задан, сервер
+создает случайный токен в файле server_token в папке данных приложения
+(доступ только владельцу), и JobClient того же пользователя читает его
+оттуда. Клиент может переопределить только параметры сборки из
+OPTION_FIELDS: Maven, JDK и папки вывода сервер берет из своих настроек.
+"""
+import asyncio
+import hmac
+import http.client
+import itertools
+import json
+import logging
+import os
+import re
+import secrets
+import signal
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from majesty_artifacts import Artifact, PublishedArtifact
+from majesty_cache import app_data_dir
+from majesty_engine import BuildCancellation, BuildOptions, BuildResult, find_maven_executable, is_valid_maven_project
+from majesty_prefetch import PREFETCH_MODES
+
+logger = logging.getLogger('MajestyCompiler')
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CONCURRENCY = 2
+TOKEN_HEADER = "X-Majesty-Token"
+TOKEN_FILENAME = "server_token"
+# Сколько последних строк вывода каждого задания хранится для клиентов
+LOG_BUFFER_LINES = 20000
+# Сколько завершенных заданий помнит сервер
+FINISHED_JOBS_KEPT = 200
+MAX_REQUEST_BODY = 1024 * 1024
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Параметры сборки, которые клиент может передать в задании, и их типы. Остальные (Maven, JDK,
+# папки вывода и логов, репозитории, правила фильтра) сервер берет из настроек проекта и своих
+OPTION_FIELDS = {
+    "goals": list,
+    "build_profile": str,
+    "incremental": bool,
+    "use_cache": bool,
+    "use_daemon": bool,
+    "profile": bool,
+    "prefetch": bool,
+    "prefetch_mode": str,
+    "test_shards": int,
+}
+# Параметры, которым можно передать null (значение по умолчанию)
+NULLABLE_OPTIONS = {"build_profile"}
+# Цель или фаза Maven; параметры командной строки (-s, -D...) в целях не принимаются
+GOAL_PATTERN = re.compile(r"^\w[\w.:-]*$")
+
+
+def default_address():
+    """Адрес сервера из MAJESTY_SERVER (host:port) или адрес по умолчанию"""
+    return os.environ.get("MAJESTY_SERVER") or f"{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+
+def split_address(address):
+    host, _, port = address.rpartition(":")
+    return host or DEFAULT_HOST, int(port or DEFAULT_PORT)
+
+
+def token_path():
+    return os.path.join(app_data_dir(), TOKEN_FILENAME)
+
+
+def read_token():
+    """Токен сервера из папки данных приложения; None, если файла нет или он недоступен"""
+    try:
+        with open(token_path(), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def ensure_token():
+    """Токен сервера из файла или новый случайный, записанный в файл с доступом только для владельца"""
+    token = read_token()
+    if token:
+        return token
+    path = token_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Файл одновременно создал другой сервер
+        return read_token() or token
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token)
+    logger.info(f"Создан токен сервера сборок: {path}")
+    return token
+
+
+def check_override(name, value):
+    """Проверяет параметр сборки, переданный клиентом; ValueError, если его нельзя принять"""
+    expected = OPTION_FIELDS.get(name)
+    if expected is None:
+        raise ValueError(f"Параметр сборки нельзя передать серверу: {name}")
+    if value is None and name in NULLABLE_OPTIONS:
+        return
+    # bool - подкласс int, поэтому true в числовом параметре тоже ошибка
+    if not isinstance(value, expected) or (expected is not bool and isinstance(value, bool)):
+        raise ValueError(f"Неверное значение параметра сборки {name}: {value!r}")
+    if name == "goals" and not all(isinstance(goal, str) and GOAL_PATTERN.match(goal) for goal in value):
+        raise ValueError("В целях Maven допускаются только цели и фазы, без параметров командной строки")
+    if name == "prefetch_mode" and value not in PREFETCH_MODES:
+        raise ValueError(f"Неизвестный режим загрузки зависимостей: {value}")
+
+
+def result_to_dict(result: BuildResult):
+    return asdict(result)
+
+
+def result_from_dict(data) -> BuildResult:
+    """BuildResult из ответа сервера"""
+    known = {f.name for f in fields(BuildResult)}
+    result = BuildResult(**{k: v for k, v in data.items() if k in known})
+    result.artifacts = [PublishedArtifact(**dict(p, artifact=Artifact(**p["artifact"]))) for p in data.get("artifacts", [])]
+    return result
+
+
+@dataclass
+class Job:
+    """Задание на сборку одного проекта"""
+    id: str
+    options: BuildOptions
+    priority: int = 0
+    submitter: str = ""
+    seq: int = 0
+    state: str = QUEUED
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Optional[BuildResult] = None
+    error: Optional[str] = None
+
+    def __post_init__(self):
+        self.cancellation = BuildCancellation()
+        self.log = deque(maxlen=LOG_BUFFER_LINES)
+        self.line_count = 0
+        # Строки из потока сборки, еще не перенесенные в log циклом событий
+        self._incoming = []
+        self._incoming_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._waiters: List[asyncio.Event] = []
+
+    @property
+    def done(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def log_start(self):
+        """Номер первой строки, оставшейся в буфере"""
+        return self.line_count - len(self.log)
+
+    def summary(self, position=None):
+        data = {
+            "id": self.id, "project_dir": self.options.project_dir, "priority": self.priority,
+            "submitter": self.submitter, "state": self.state, "submitted": self.submitted,
+            "started": self.started, "finished": self.finished, "log_lines": self.line_count,
+            "error": self.error,
+        }
+        if position is not None:
+            data["position"] = position
+        if self.result is not None:
+            data["result"] = result_to_dict(self.result)
+        return data
+
+    def notify(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter.set()
+
+    async def wait_change(self):
+        waiter = asyncio.Event()
+        self._waiters.append(waiter)
+        await waiter.wait()
+
+
+class JobServer:
+    """Очередь сборок с приоритетами и ограничением числа одновременных сборок"""
+
+    def __init__(self, engine, host=DEFAULT_HOST, port=DEFAULT_PORT, concurrency=DEFAULT_CONCURRENCY,
+                 token=None, settings=None, toolchains=None):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.concurrency = max(1, concurrency)
+        # Без токена любой процесс машины мог бы ставить и отменять сборки
+        self.token = token or ensure_token()
+        self.settings = settings
+        self.toolchains = toolchains
+        self.jobs = {}
+        self._pending: List[Job] = []
+        self._busy_projects = set()
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="majesty-job")
+        self._loop = None
+        self._changed = None
+        self._server = None
+        self._stopped = None
+        self._workers = []
+
+    # --- очередь ---
+
+    def make_options(self, project_dir, overrides):
+        """Параметры сборки: по умолчанию для проекта, запомненные настройки проекта и переданные клиентом"""
+        project_settings = self.settings.get(project_dir) if self.settings is not None else {}
+        maven_path = project_settings.get("maven")
+        if not maven_path:
+            maven_path = (self.toolchains.default_maven(find_maven_executable) if self.toolchains is not None
+                          else find_maven_executable())
+        options = BuildOptions.for_project(project_dir, maven_path)
+        options.java_home = project_settings.get("java_home")
+        options.build_profile = project_settings.get("build_profile")
+        options.artifact_include = project_settings.get("artifact_include", [])
+        options.artifact_exclude = project_settings.get("artifact_exclude", [])
+        options.prefetch = project_settings.get("prefetch", False)
+        options.test_shards = project_settings.get("test_shards", 0)
+        for name, value in overrides.items():
+            check_override(name, value)
+            setattr(options, name, value)
+        return options
+
+    def submit(self, project_dir, overrides=None, priority=0, submitter=""):
+        project_dir = os.path.abspath(project_dir)
+        if not is_valid_maven_project(project_dir):
+            raise ValueError(f"Не найден pom.xml: {project_dir}")
+        job = Job(uuid.uuid4().hex[:12], self.make_options(project_dir, overrides or {}), int(priority),
+                  submitter, next(self._seq))
+        self.jobs[job.id] = job
+        self._pending.append(job)
+        self._pending.sort(key=lambda j: (-j.priority, j.seq))
+        logger.info(f"Задание {job.id} ({submitter or 'без имени'}) поставлено в очередь: {project_dir}, "
+                    f"приоритет {job.priority}, перед ним {self._pending.index(job)}")
+        self._wake_workers()
+        return job
+
+    def queue_position(self, job):
+        return self._pending.index(job) if job in self._pending else None
+
+    def cancel(self, job):
+        if job.state == QUEUED:
+            self._pending.remove(job)
+            self._finish(job, CANCELLED)
+            logger.info(f"Задание {job.id} снято с очереди")
+        elif job.state == RUNNING:
+            logger.info(f"Отмена выполняющегося задания {job.id}")
+            # Завершение процесса Maven может занять до TERMINATE_TIMEOUT секунд
+            self._loop.run_in_executor(None, job.cancellation.cancel)
+
+    def _next_job(self):
+        """Задание с наибольшим приоритетом, проект которого сейчас не собирается"""
+        for job in self._pending:
+            if job.options.project_dir not in self._busy_projects:
+                self._pending.remove(job)
+                return job
+        return None
+
+    def _wake_workers(self):
+        async def notify():
+            async with self._changed:
+                self._changed.notify_all()
+        self._loop.create_task(notify())
+
+    def _finish(self, job, state):
+        self._flush_lines(job)
+        job.state = state
+        job.finished = time.time()
+        job.notify()
+        finished = [j for j in self.jobs.values() if j.done]
+        for old in sorted(finished, key=lambda j: j.finished)[:-FINISHED_JOBS_KEPT]:
+            del self.jobs[old.id]
+
+    async def _worker(self):
+        while True:
+            async with self._changed:
+                job = self._next_job()
+                while job is None:
+                    await self._changed.wait()
+                    job = self._next_job()
+                self._busy_projects.add(job.options.project_dir)
+            job.state = RUNNING
+            job.started = time.time()
+            job.notify()
+            logger.info(f"Задание {job.id} запущено: {job.options.project_dir}")
+            try:
+                job.result = await self._loop.run_in_executor(self._executor, self._run_build, job)
+                if job.result.cancelled:
+                    state = CANCELLED
+                else:
+                    state = SUCCEEDED if job.result.success and not job.result.error else FAILED
+            except Exception as e:
+                logger.exception(f"Ошибка выполнения задания {job.id}: {str(e)}")
+                job.error = str(e)
+                state = FAILED
+            finally:
+                async with self._changed:
+                    self._busy_projects.discard(job.options.project_dir)
+                    self._changed.notify_all()
+            self._finish(job, state)
+            logger.info(f"Задание {job.id} завершено: {state}")
+
+    def _run_build(self, job):
+        """Выполняется в пуле потоков: строки вывода передаются в цикл событий пачками"""
+
+        def on_line(line, matched):
+            with job._incoming_lock:
+                job._incoming.append(line)
+                schedule = not job._flush_scheduled
+                job._flush_scheduled = True
+            if schedule:
+                self._loop.call_soon_threadsafe(self._flush_lines, job)
+
+        return self.engine.build(job.options, [on_line], job.cancellation)
+
+    @staticmethod
+    def _flush_lines(job):
+        with job._incoming_lock:
+            lines, job._incoming = job._incoming, []
+            job._flush_scheduled = False
+        if lines:
+            job.log.extend(lines)
+            job.line_count += len(lines)
+            job.notify()
+
+    # --- HTTP ---
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Condition()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        try:
+            # Остановка службой (systemd, kill) - так же аккуратно, как по Ctrl+C
+            self._loop.add_signal_handler(signal.SIGTERM, self.stop)
+        except (NotImplementedError, RuntimeError):
+            pass
+        self._workers = [self._loop.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"Сервер сборок слушает {self.host}:{self.port}, одновременных сборок: {self.concurrency}")
+
+    def stop(self):
+        self._stopped.set()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            async with self._server:
+                await self._stopped.wait()
+        finally:
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Снимает очередь и прерывает выполняющиеся сборки"""
+        for job in list(self._pending):
+            self.cancel(job)
+        running = [j for j in self.jobs.values() if j.state == RUNNING]
+        # Завершение процессов Maven ждет до TERMINATE_TIMEOUT секунд - не в потоке цикла событий
+        await asyncio.gather(*(self._loop.run_in_executor(None, job.cancellation.cancel) for job in running))
+        for worker in self._workers:
+            worker.cancel()
+        await self._loop.run_in_executor(None, self._executor.shutdown, True)
+
+    async def _handle(self, reader, writer):
+        try:
+            method, target, headers, body = await self._read_request(reader)
+            if not hmac.compare_digest(headers.get(TOKEN_HEADER.lower(), "").encode('utf-8'),
+                                       self.token.encode('utf-8')):
+                await self._send_json(writer, 401, {"error": "Неверный токен сервера сборок"})
+                return
+            await self._route(method, target, body, writer)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            await self._send_json(writer, 400, {"error": str(e)})
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.exception(f"Ошибка обработки запроса к серверу сборок: {str(e)}")
+            await self._send_json(writer, 500, {"error": str(e)})
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _read_request(reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        if not request_line:
+            raise ConnectionResetError("пустой запрос")
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_REQUEST_BODY:
+            raise ValueError("Слишком большой запрос")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _route(self, method, target, body, writer):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+
+        if parts == ["status"] and method == "GET":
+            await self._send_json(writer, 200, {
+                "concurrency": self.concurrency,
+                "running": [j.id for j in self.jobs.values() if j.state == RUNNING],
+                "queued": [j.id for j in self._pending],
+            })
+        elif parts == ["jobs"] and method == "GET":
+            jobs = sorted(self.jobs.values(), key=lambda j: j.seq)
+            await self._send_json(writer, 200, {"jobs": [j.summary(self.queue_position(j)) for j in jobs]})
+        elif parts == ["jobs"] and method == "POST":
+            request = json.loads(body.decode('utf-8') or "{}")
+            if not request.get("project_dir"):
+                raise ValueError("Не указан project_dir")
+            job = self.submit(request["project_dir"], request.get("options"), request.get("priority", 0),
+                              request.get("submitter", ""))
+            await self._send_json(writer, 201, job.summary(self.queue_position(job)))
+        elif len(parts) >= 2 and parts[0] == "jobs":
+            job = self.jobs.get(parts[1])
+            if job is None:
+                await self._send_json(writer, 404, {"error": f"Задание не найдено: {parts[1]}"})
+            elif len(parts) == 2 and method == "GET":
+                await self._send_json(writer, 200, job.summary(self.queue_position(job)))
+            elif parts[2:] == ["cancel"] and method == "POST":
+                self.cancel(job)
+                await self._send_json(writer, 200, job.summary(self.queue_position(job)))
+            elif parts[2:] == ["log"] and method == "GET":
+                start = int(query.get("from", ["0"])[0])
+                await self._stream_log(writer, job, start, query.get("follow", ["1"])[0] != "0")
+            else:
+                await self._send_json(writer, 404, {"error": "Неизвестный запрос"})
+        else:
+            await self._send_json(writer, 404, {"error": "Неизвестный запрос"})
+
+    @staticmethod
+    async def _send_json(writer, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {http.client.responses.get(status, '')}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    @staticmethod
+    async def _stream_log(writer, job, position, follow):
+        """Пишет строки вывода по мере их появления, пока задание не завершится"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\nConnection: close\r\n\r\n")
+        while True:
+            if position < job.log_start:
+                writer.write(f"... пропущено строк: {job.log_start - position}\n".encode('utf-8'))
+                position = job.log_start
+            if position < job.line_count:
+                lines = itertools.islice(job.log, position - job.log_start, None)
+                writer.write("".join(lines).encode('utf-8'))
+                position = job.line_count
+                await writer.drain()
+            elif job.done or not follow:
+                break
+            else:
+                await job.wait_change()
+        await writer.drain()
+
+
+def run_server(engine, host=DEFAULT_HOST, port=DEFAULT_PORT, concurrency=DEFAULT_CONCURRENCY, token=None,
+               settings=None, toolchains=None):
+    """Запускает сервер сборок в текущем потоке до прерывания (Ctrl+C)"""
+    server = JobServer(engine, host, port, concurrency, token, settings, toolchains)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    logger.info("Сервер сборок остановлен")
+
+
+class JobServerError(Exception):
+    """Сервер сборок недоступен или отклонил запрос"""
+
+
+# Тайм-аут клиента по умолчанию; None в _open означает чтение без тайм-аута
+_DEFAULT_TIMEOUT = object()
+
+
+class JobClient:
+    """Клиент сервера сборок (используется окном приложения и консольной утилитой)"""
+
+    def __init__(self, address=None, token=None, timeout=10):
+        self.host, self.port = split_address(address or default_address())
+        self.token = token if token is not None else os.environ.get("MAJESTY_SERVER_TOKEN") or read_token()
+        self.timeout = timeout
+
+    def _unavailable(self, error):
+        return JobServerError(f"Сервер сборок {self.host}:{self.port} недоступен: {str(error)}")
+
+    def _open(self, method, path, data=None, timeout=_DEFAULT_TIMEOUT):
+        if timeout is _DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            return connection, connection.getresponse()
+        except OSError as e:
+            connection.close()
+            raise self._unavailable(e) from e
+
+    def _request(self, method, path, data=None):
+        connection, response = self._open(method, path, data)
+        try:
+            payload = json.loads(response.read().decode('utf-8') or "{}")
+        except OSError as e:
+            raise self._unavailable(e) from e
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise JobServerError(payload.get("error") or f"Ошибка сервера сборок: {response.status}")
+        return payload
+
+    def status(self):
+        return self._request("GET", "/status")
+
+    def jobs(self):
+        return self._request("GET", "/jobs")["jobs"]
+
+    def job(self, job_id):
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def submit(self, project_dir, options=None, priority=0, submitter=None):
+        """Ставит сборку в очередь; options - поля BuildOptions, которые нужно переопределить"""
+        return self._request("POST", "/jobs", {
+            "project_dir": os.path.abspath(project_dir),
+            "options": options or {},
+            "priority": priority,
+            "submitter": submitter if submitter is not None else default_submitter(),
+        })
+
+    def cancel(self, job_id):
+        return self._request("POST", f"/jobs/{job_id}/cancel")
+
+    def stream_log(self, job_id, start=0, follow=True):
+        """Строки вывода Maven задания; при follow - до завершения задания"""
+        # Строк может не быть долго (Maven скачивает зависимости), поэтому без тайм-аута чтения
+        connection, response = self._open("GET", f"/jobs/{job_id}/log?from={start}&follow={int(follow)}",
+                                          timeout=None)
+        try:
+            if response.status >= 400:
+                raise JobServerError(f"Ошибка сервера сборок: {response.status}")
+            while True:
+                try:
+                    line = response.readline()
+                except OSError as e:
+                    raise self._unavailable(e) from e
+                if not line:
+                    break
+                yield line.decode('utf-8', errors='replace')
+        finally:
+            connection.close()
+
+    def wait(self, job_id, on_line=None):
+        """Ждет завершения задания, передавая строки вывода в on_line; возвращает состояние задания"""
+        for line in self.stream_log(job_id):
+            if on_line is not None:
+                on_line(line)
+        return self.job(job_id)
+
+
+def default_submitter():
+    try:
+        return os.getlogin()
+    except OSError:
+        return os.environ.get("USER") or os.environ.get("USERNAME") or ""
@@ -0,0 +1,77 @@
+"""Настройки, которые приложение запоминает для каждого проекта.
+
+Хранятся в projects.json в папке данных приложения; ключ - нормализованный
+путь к папке проекта. Файл общий для окна, консоли и сервера сборок:
+чтение перечитывает его после изменения другим процессом, а обновление
+выполняется под межпроцессной блокировкой.
+"""
+import json
+import logging
+import os
+import threading
+
+from majesty_cache import app_data_dir
+from majesty_filelock import FileLock
+
+logger = logging.getLogger('MajestyCompiler')
+
+SETTINGS_FILENAME = "projects.json"
+
+
+class ProjectSettings:
+    """Словарь настроек для каждого проекта с атомарным сохранением на диск"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(app_data_dir(), SETTINGS_FILENAME)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._projects = self._load()
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self):
+        self._mtime = self._current_mtime()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Файл настроек проектов поврежден и будет пересоздан: {str(e)}")
+            return {}
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._projects, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        self._mtime = self._current_mtime()
+
+    @staticmethod
+    def _key(project_dir):
+        return os.path.normcase(os.path.abspath(project_dir))
+
+    def get(self, project_dir):
+        """Копия настроек проекта (пустой словарь, если их нет)"""
+        with self._lock:
+            # Настройки могли изменить другие процессы - перечитываем только измененный файл
+            if self._current_mtime() != self._mtime:
+                self._projects = self._load()
+            return dict(self._projects.get(self._key(project_dir), {}))
+
+    def update(self, project_dir, **values):
+        """Обновляет настройки проекта; значение None удаляет ключ"""
+        with self._lock, FileLock(f"{self.path}.lock"):
+            # Файл могли изменить другие процессы (консоль, сервер сборок) - не затираем их изменения
+            self._projects = self._load()
+            settings = self._projects.setdefault(self._key(project_dir), {})
+            for name, value in values.items():
+                if value is None:
+                    settings.pop(name, None)
+                else:
+                    settings[name] = value
+            self._save()
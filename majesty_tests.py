@@ -0,0 +1,436 @@
+"""Отчеты тестов Surefire: история времени тестов и разбиение тестов на части.
+
+После сборки разбираются отчеты TEST-*.xml из target/surefire-reports и
+target/failsafe-reports всех модулей реактора, созданные этой сборкой.
+Время и результат каждого теста и класса записываются в SQLite-базу
+tests.db в папке данных приложения; по ней показываются самые медленные
+тесты и классы и тесты, которые чаще всего падают.
+
+Разбиение (test_shards) делит классы тестов на N частей по среднему времени
+из истории: классы по убыванию времени раскладываются в наименее
+загруженную часть (LPT). Основная сборка идет с -DskipTests: она
+компилирует и тестовые классы, но не выполняет тесты. Затем части
+запускаются параллельно отдельными процессами Maven только с целью
+surefire:test и -Dtest=... - без фаз жизненного цикла, поэтому они ничего
+не пишут в общие target/classes и target/test-classes. Часть с наименьшим
+расчетным временем запускается с исключением классов остальных частей - в
+нее попадают и новые классы без истории.
+
+Делятся только сборки до package: при verify интеграционные тесты
+пропустились бы вместе с -DskipTests, а install и deploy опубликовали бы
+артефакт до выполнения тестов. Реактор, модули которого зависят друг от
+друга, тоже не делится: без фаз жизненного цикла Maven берет соседние
+модули из локального репозитория, а не из их папок target.
+"""
+import heapq
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from majesty_cache import app_data_dir
+from majesty_metrics import project_key
+
+logger = logging.getLogger('MajestyCompiler')
+
+TESTS_FILENAME = "tests.db"
+REPORT_DIRS = ("surefire-reports", "failsafe-reports")
+# Сколько последних запусков учитывать при расчете среднего времени
+DEFAULT_WINDOW = 10
+# Сколько запусков тестов хранить для каждого проекта
+KEEP_RUNS = 100
+MAX_MESSAGE_LENGTH = 500
+
+PASSED = "passed"
+FAILED = "failed"
+ERROR = "error"
+SKIPPED = "skipped"
+# Элементы testcase в отчете Surefire, означающие результат теста
+RESULT_ELEMENTS = {"failure": FAILED, "error": ERROR, "skipped": SKIPPED}
+
+# Фазы, при которых Maven запускает тесты; после install/deploy тесты разбивать нельзя -
+# артефакт был бы установлен до их выполнения
+TEST_PHASES = ("test", "package", "verify")
+PUBLISH_PHASES = ("install", "deploy")
+# Фазы после package: с ними тесты не выносятся из основной сборки
+AFTER_PACKAGE_PHASES = ("integration-test", "verify") + PUBLISH_PHASES
+LIFECYCLE_PHASES = ("clean", "validate", "compile", "test-compile", "test", "package", "verify", "install", "deploy")
+SKIP_TESTS_ARGS = ("-DskipTests", "-DskipTests=true", "-Dmaven.test.skip=true", "-Dmaven.test.skip")
+# Суффикс отчетов части (-Dsurefire.reportNameSuffix); Surefire добавляет его к именам в скобках
+SHARD_SUFFIX = "majesty-shard"
+_SHARD_SUFFIX_RE = re.compile(r"\(" + SHARD_SUFFIX + r"\d+\)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS test_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    started REAL NOT NULL,
+    build_id INTEGER,
+    tests INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    skipped INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    shards INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS test_runs_project_started ON test_runs (project, started);
+CREATE TABLE IF NOT EXISTS test_classes (
+    run_id INTEGER NOT NULL REFERENCES test_runs (id) ON DELETE CASCADE,
+    module TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    duration REAL NOT NULL,
+    tests INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    skipped INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS test_classes_run ON test_classes (run_id);
+CREATE TABLE IF NOT EXISTS test_cases (
+    run_id INTEGER NOT NULL REFERENCES test_runs (id) ON DELETE CASCADE,
+    module TEXT NOT NULL,
+    class_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    duration REAL NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS test_cases_run ON test_cases (run_id);
+"""
+
+
+@dataclass
+class TestCase:
+    module: str
+    class_name: str
+    name: str
+    duration: float
+    status: str = PASSED
+    message: str = ""
+
+    @property
+    def failed(self):
+        return self.status in (FAILED, ERROR)
+
+    @property
+    def full_name(self):
+        return f"{self.class_name}#{self.name}"
+
+
+@dataclass
+class TestClass:
+    module: str
+    class_name: str
+    duration: float
+    tests: int = 0
+    failures: int = 0
+    skipped: int = 0
+
+
+@dataclass
+class TestReport:
+    """Тесты одной сборки из всех отчетов Surefire/Failsafe"""
+    classes: List[TestClass] = field(default_factory=list)
+    cases: List[TestCase] = field(default_factory=list)
+
+    @property
+    def failures(self):
+        return sum(1 for case in self.cases if case.failed)
+
+    @property
+    def skipped(self):
+        return sum(1 for case in self.cases if case.status == SKIPPED)
+
+    @property
+    def duration(self):
+        """Суммарное время классов (при параллельных форках больше времени сборки)"""
+        return sum(test_class.duration for test_class in self.classes)
+
+    def failed_cases(self):
+        return [case for case in self.cases if case.failed]
+
+
+@dataclass
+class TestTiming:
+    """Среднее время теста (или класса, если name пустое) за последние запуски"""
+    module: str
+    class_name: str
+    name: str
+    average: float
+    longest: float
+    runs: int
+    failures: int
+
+    @property
+    def full_name(self):
+        return f"{self.class_name}#{self.name}" if self.name else self.class_name
+
+
+@dataclass
+class TestShard:
+    """Часть тестов для отдельного процесса Maven"""
+    index: int
+    classes: List[str] = field(default_factory=list)
+    estimate: float = 0.0
+    # Часть без явного списка: все классы, кроме попавших в другие части
+    rest: bool = False
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _seconds(value):
+    # Старые версии Surefire пишут время с разделителем тысяч: time="1,234.5"
+    try:
+        return float((value or "0").replace(",", ""))
+    except ValueError:
+        return 0.0
+
+
+def _strip_shard_suffix(name):
+    return _SHARD_SUFFIX_RE.sub("", name or "")
+
+
+def parse_report(path, module=".") -> TestReport:
+    """Разбирает TEST-*.xml потоково: вывод тестов (system-out) не держится в памяти целиком"""
+    report = TestReport()
+    suite = None
+    suite_cases = []
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        tag = _local_name(elem.tag)
+        if event == "start":
+            if tag == "testsuite":
+                suite = dict(elem.attrib)
+                suite_cases = []
+            continue
+        if tag == "testcase":
+            status, message = PASSED, ""
+            for child in elem:
+                child_tag = _local_name(child.tag)
+                if child_tag in RESULT_ELEMENTS:
+                    status = RESULT_ELEMENTS[child_tag]
+                    message = (child.get("message") or child.get("type") or "")[:MAX_MESSAGE_LENGTH]
+                    break
+            class_name = _strip_shard_suffix(elem.get("classname") or (suite or {}).get("name", ""))
+            case = TestCase(module, class_name, _strip_shard_suffix(elem.get("name")), _seconds(elem.get("time")),
+                            status, message)
+            suite_cases.append(case)
+            report.cases.append(case)
+            elem.clear()
+        elif tag == "testsuite" and suite is not None:
+            name = _strip_shard_suffix(suite.get("name")) or (suite_cases[0].class_name if suite_cases else "")
+            duration = _seconds(suite.get("time")) if suite.get("time") else sum(c.duration for c in suite_cases)
+            report.classes.append(TestClass(
+                module, name, duration, len(suite_cases), sum(1 for c in suite_cases if c.failed),
+                sum(1 for c in suite_cases if c.status == SKIPPED)
+            ))
+            suite = None
+            elem.clear()
+    return report
+
+
+def collect_reports(project_dir, reactor=None, since=None) -> TestReport:
+    """Отчеты тестов всех модулей; since - только файлы, измененные не раньше этого времени"""
+    modules = [(m.name, m.path) for m in reactor or []] or [(".", os.path.abspath(project_dir))]
+    report = TestReport()
+    for module, module_path in modules:
+        for dirname in REPORT_DIRS:
+            reports_dir = os.path.join(module_path, "target", dirname)
+            try:
+                with os.scandir(reports_dir) as entries:
+                    files = sorted(entry.path for entry in entries
+                                   if entry.name.startswith("TEST-") and entry.name.endswith(".xml")
+                                   and (since is None or entry.stat().st_mtime >= since))
+            except OSError:
+                continue
+            for path in files:
+                try:
+                    part = parse_report(path, module)
+                except (OSError, ET.ParseError) as e:
+                    logger.warning(f"Не удалось разобрать отчет тестов {path}: {str(e)}")
+                    continue
+                report.classes.extend(part.classes)
+                report.cases.extend(part.cases)
+    if report.cases:
+        logger.info(f"Отчеты тестов: классов {len(report.classes)}, тестов {len(report.cases)}, "
+                    f"упало {report.failures}, пропущено {report.skipped}")
+    return report
+
+
+def runs_tests(goals):
+    """Выполняются ли тесты при этих аргументах Maven"""
+    return any(goal in TEST_PHASES + PUBLISH_PHASES for goal in goals) and not any(
+        arg in SKIP_TESTS_ARGS for arg in goals)
+
+
+def can_shard(goals):
+    """Тесты можно вынести в отдельные процессы: сборка идет не дальше package, и тесты в ней выполняются"""
+    return runs_tests(goals) and not any(goal in AFTER_PACKAGE_PHASES for goal in goals)
+
+
+def has_reactor_dependencies(reactor):
+    """Модули реактора зависят друг от друга (surefire:test отдельно от сборки их не найдет)"""
+    coordinates = {module.coordinates for module in reactor}
+    return any(dependency in coordinates for module in reactor for dependency in module.dependencies)
+
+
+def plan_shards(timings: Dict[str, float], count) -> List[TestShard]:
+    """Раскладывает классы по частям: самый долгий из оставшихся - в наименее загруженную (LPT)"""
+    shards = [TestShard(index) for index in range(max(1, count))]
+    heap = [(0.0, index) for index in range(len(shards))]
+    for class_name, seconds in sorted(timings.items(), key=lambda item: (-item[1], item[0])):
+        load, index = heapq.heappop(heap)
+        shard = shards[index]
+        shard.classes.append(class_name)
+        shard.estimate = load + seconds
+        heapq.heappush(heap, (shard.estimate, index))
+    # Новые классы без истории - в наименее загруженную часть
+    min(shards, key=lambda s: (s.estimate, s.index)).rest = True
+    return [shard for shard in shards if shard.classes or shard.rest]
+
+
+def shard_test_filter(shard, shards):
+    """Значение -Dtest для части; None - без ограничений (единственная часть)"""
+    if not shard.rest:
+        return ",".join(shard.classes)
+    others = [name for other in shards if other is not shard for name in other.classes]
+    return ",".join("!" + name for name in others) if others else None
+
+
+def shard_base_arguments(goals):
+    """Аргументы основной сборки, которые нужны и частям тестов: без фаз, -T и пропуска тестов"""
+    args = []
+    skip_next = False
+    for arg in goals:
+        if skip_next:
+            skip_next = False
+            continue
+        if arg == "-T":
+            skip_next = True
+            continue
+        if arg in LIFECYCLE_PHASES or arg in SKIP_TESTS_ARGS or arg.startswith("-T"):
+            continue
+        args.append(arg)
+    return args
+
+
+def shard_arguments(shard, shards):
+    """Цель и параметры Surefire для части; классы и тесты уже скомпилированы основной сборкой"""
+    args = ["surefire:test", "-Dsurefire.failIfNoSpecifiedTests=false",
+            f"-Dsurefire.reportNameSuffix={SHARD_SUFFIX}{shard.index + 1}"]
+    test_filter = shard_test_filter(shard, shards)
+    if test_filter:
+        args.insert(1, f"-Dtest={test_filter}")
+    return args
+
+
+class TestStore:
+    """История тестов проектов; безопасно для использования из нескольких потоков"""
+
+    def __init__(self, path=None, window=DEFAULT_WINDOW):
+        self.path = path or os.path.join(app_data_dir(), TESTS_FILENAME)
+        self.window = window
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA foreign_keys=ON")
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def record(self, project_dir, report: TestReport, shards=0, started=None) -> int:
+        """Сохраняет тесты сборки и возвращает номер запуска; старые запуски проекта удаляются"""
+        project = project_key(project_dir)
+        with self._lock, self._db:
+            run_id = self._db.execute(
+                "INSERT INTO test_runs (project, started, tests, failures, skipped, duration, shards) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (project, started or time.time(), len(report.cases), report.failures, report.skipped,
+                 report.duration, shards)
+            ).lastrowid
+            self._db.executemany(
+                "INSERT INTO test_classes (run_id, module, class_name, duration, tests, failures, skipped) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, c.module, c.class_name, c.duration, c.tests, c.failures, c.skipped) for c in report.classes]
+            )
+            self._db.executemany(
+                "INSERT INTO test_cases (run_id, module, class_name, name, duration, status, message) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, c.module, c.class_name, c.name, c.duration, c.status, c.message or None)
+                 for c in report.cases]
+            )
+            self._db.execute(
+                "DELETE FROM test_runs WHERE project = ? AND id NOT IN "
+                "(SELECT id FROM test_runs WHERE project = ? ORDER BY started DESC, id DESC LIMIT ?)",
+                (project, project, KEEP_RUNS)
+            )
+        return run_id
+
+    def link_build(self, run_id, build_id):
+        """Связывает запуск тестов с записью в истории сборок (majesty_metrics)"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE test_runs SET build_id = ? WHERE id = ?", (build_id, run_id))
+
+    def _recent_runs(self, window):
+        return ("run_id IN (SELECT id FROM test_runs WHERE project = ? "
+                "ORDER BY started DESC, id DESC LIMIT ?)", window or self.window)
+
+    def runs(self, project_dir, limit=20):
+        """Последние запуски: (номер, время, тестов, упало, пропущено, время тестов, частей, номер сборки)"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, started, tests, failures, skipped, duration, shards, build_id FROM test_runs "
+                "WHERE project = ? ORDER BY started DESC, id DESC LIMIT ?",
+                (project_key(project_dir), limit)
+            ).fetchall()
+
+    def slowest_tests(self, project_dir, limit=20, window=None) -> List[TestTiming]:
+        """Тесты с наибольшим средним временем за последние window запусков"""
+        recent, window = self._recent_runs(window)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT module, class_name, name, AVG(duration), MAX(duration), COUNT(*), "
+                f"SUM(status IN ('{FAILED}', '{ERROR}')) FROM test_cases WHERE {recent} AND status != '{SKIPPED}' "
+                "GROUP BY module, class_name, name ORDER BY AVG(duration) DESC LIMIT ?",
+                (project_key(project_dir), window, limit)
+            ).fetchall()
+        return [TestTiming(*row) for row in rows]
+
+    def slowest_classes(self, project_dir, limit=20, window=None) -> List[TestTiming]:
+        """Классы тестов с наибольшим средним временем (вместе с @BeforeAll и подготовкой класса)"""
+        recent, window = self._recent_runs(window)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT module, class_name, '', AVG(duration), MAX(duration), COUNT(*), SUM(failures > 0) "
+                f"FROM test_classes WHERE {recent} GROUP BY module, class_name ORDER BY AVG(duration) DESC LIMIT ?",
+                (project_key(project_dir), window, limit)
+            ).fetchall()
+        return [TestTiming(*row) for row in rows]
+
+    def failing_tests(self, project_dir, limit=20, window=None) -> List[TestTiming]:
+        """Тесты, падавшие в последних запусках, - чаще всего падавшие первыми"""
+        recent, window = self._recent_runs(window)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT module, class_name, name, AVG(duration), MAX(duration), COUNT(*), "
+                f"SUM(status IN ('{FAILED}', '{ERROR}')) AS failed FROM test_cases WHERE {recent} "
+                "GROUP BY module, class_name, name HAVING failed > 0 ORDER BY failed DESC, AVG(duration) DESC LIMIT ?",
+                (project_key(project_dir), window, limit)
+            ).fetchall()
+        return [TestTiming(*row) for row in rows]
+
+    def class_timings(self, project_dir, window=None) -> Dict[str, float]:
+        """Среднее время каждого класса тестов - исходные данные для разбиения на части"""
+        recent, window = self._recent_runs(window)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT class_name, AVG(duration) FROM test_classes WHERE {recent} GROUP BY class_name",
+                (project_key(project_dir), window)
+            ).fetchall()
+        return {class_name: duration for class_name, duration in rows}
@@ -0,0 +1,277 @@
+"""Кэш найденных установок Maven и JDK.
+
+Поиск Maven по стандартным папкам и запуск mvn --version стоят секунды,
+поэтому результаты сохраняются в toolchains.json в папке данных
+приложения. Версии Maven и JDK по возможности определяются без запуска
+JVM: по имени lib/maven-core-<версия>.jar и по файлу release в JAVA_HOME.
+Запись перепроверяется только при изменении времени модификации файла,
+по которому она была определена.
+"""
+import glob
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import threading
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+from majesty_cache import app_data_dir
+
+logger = logging.getLogger('MajestyCompiler')
+
+TOOLCHAINS_FILENAME = "toolchains.json"
+MAVEN_CORE_PATTERN = re.compile(r"^maven-core-(\d[\w.\-]*)\.jar$")
+JAVA_VERSION_PATTERN = re.compile(r'^JAVA_VERSION="?([^"\s]+)"?', re.MULTILINE)
+
+
+@dataclass
+class MavenInstall:
+    path: str  # исполняемый файл mvn/mvnd
+    home: str
+    version: str
+    mtime: float
+
+
+@dataclass
+class JdkInstall:
+    java_home: str
+    version: str
+    mtime: float
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def resolve_executable(command):
+    """Полный путь к исполняемому файлу по пути или имени команды из PATH"""
+    if os.path.isfile(command):
+        return os.path.abspath(command)
+    return shutil.which(command)
+
+
+def maven_version_from_home(maven_home):
+    """Версия Maven по имени lib/maven-core-*.jar (в том числе mvn/lib у mvnd)"""
+    for lib_dir in (os.path.join(maven_home, "lib"), os.path.join(maven_home, "mvn", "lib")):
+        try:
+            for name in os.listdir(lib_dir):
+                match = MAVEN_CORE_PATTERN.match(name)
+                if match:
+                    return match.group(1)
+        except OSError:
+            continue
+    return None
+
+
+def jdk_version_from_home(java_home):
+    """Версия JDK из файла release в JAVA_HOME"""
+    try:
+        with open(os.path.join(java_home, "release"), 'r', encoding='utf-8', errors='replace') as f:
+            match = JAVA_VERSION_PATTERN.search(f.read())
+    except OSError:
+        return None
+    return match.group(1) if match else None
+
+
+def candidate_maven_executables():
+    """Все возможные пути к Maven: переменные окружения, PATH, Program Files, домашняя папка"""
+    maven_cmd = "mvn.cmd" if platform.system() == "Windows" else "mvn"
+    candidates = [os.path.join(os.environ[name], 'bin', maven_cmd)
+                  for name in ('MAVEN_HOME', 'M2_HOME') if os.environ.get(name)]
+    on_path = shutil.which(maven_cmd)
+    if on_path:
+        candidates.append(on_path)
+
+    patterns = []
+    if platform.system() == "Windows":
+        for pf in (os.environ.get('ProgramFiles', 'C:\\Program Files'),
+                   os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)')):
+            patterns += [
+                os.path.join(pf, '*maven*', 'bin', maven_cmd),
+                os.path.join(pf, 'Java', '*maven*', 'bin', maven_cmd),
+            ]
+        patterns.append(os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Programs', '*maven*', 'bin', maven_cmd))
+    else:
+        patterns += [os.path.join('/opt', '*maven*', 'bin', maven_cmd),
+                     os.path.join('/usr', 'share', 'maven', 'bin', maven_cmd)]
+    patterns.append(os.path.join(os.path.expanduser("~"), '*maven*', 'bin', maven_cmd))
+    for pattern in patterns:
+        candidates.extend(sorted(glob.glob(pattern)))
+
+    seen = set()
+    for path in candidates:
+        if not os.path.isfile(path):
+            continue
+        real = os.path.normcase(os.path.realpath(path))
+        if real not in seen:
+            seen.add(real)
+            yield path
+
+
+def candidate_java_homes():
+    """Возможные установки JDK: JAVA_HOME и стандартные папки установки"""
+    homes = []
+    if os.environ.get("JAVA_HOME"):
+        homes.append(os.environ["JAVA_HOME"])
+    if platform.system() == "Windows":
+        for pf in (os.environ.get('ProgramFiles', 'C:\\Program Files'),
+                   os.environ.get('ProgramFiles(x86)', 'C:\\Program Files (x86)')):
+            for vendor in ("Java", "Eclipse Adoptium", "Zulu", "Microsoft", "Amazon Corretto", "BellSoft"):
+                homes += sorted(glob.glob(os.path.join(pf, vendor, '*')))
+    elif platform.system() == "Darwin":
+        homes += sorted(glob.glob('/Library/Java/JavaVirtualMachines/*/Contents/Home'))
+    else:
+        homes += sorted(glob.glob('/usr/lib/jvm/*'))
+    homes += sorted(glob.glob(os.path.join(os.path.expanduser("~"), '.jdks', '*')))
+    homes += sorted(glob.glob(os.path.join(os.path.expanduser("~"), '.sdkman', 'candidates', 'java', '*')))
+
+    seen = set()
+    for home in homes:
+        real = os.path.normcase(os.path.realpath(home))
+        if real in seen or not os.path.isfile(os.path.join(home, "release")):
+            continue
+        seen.add(real)
+        yield home
+
+
+def probe_maven_version(executable, startupinfo=None):
+    """Запасной вариант: версия из вывода mvn --version (запускает JVM)"""
+    try:
+        probe = subprocess.run([executable, "--version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               startupinfo=startupinfo, timeout=120)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Не удалось выполнить {executable} --version: {str(e)}")
+        return None
+    if probe.returncode != 0:
+        return None
+    output = probe.stdout.decode('utf-8', errors='replace')
+    match = re.search(r"^Apache Maven (\S+)", output, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+class ToolchainCache:
+    """Постоянный кэш установок Maven и JDK"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(app_data_dir(), TOOLCHAINS_FILENAME)
+        self._lock = threading.RLock()
+        data = self._load()
+        self.default_maven_path = data.get("default_maven")
+        self._mavens = {m["path"]: MavenInstall(**m) for m in data.get("mavens", [])}
+        self._jdks = {j["java_home"]: JdkInstall(**j) for j in data.get("jdks", [])}
+        self.scanned = bool(data.get("scanned"))
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Кэш установок Maven/JDK поврежден и будет пересоздан: {str(e)}")
+            return {}
+
+    def save(self):
+        with self._lock:
+            data = {
+                "default_maven": self.default_maven_path,
+                "scanned": self.scanned,
+                "mavens": [asdict(m) for m in self._mavens.values()],
+                "jdks": [asdict(j) for j in self._jdks.values()],
+            }
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+    def maven_info(self, command, startupinfo=None) -> Optional[MavenInstall]:
+        """Сведения о Maven по пути или имени команды; перепроверяются только при смене mtime"""
+        executable = resolve_executable(command)
+        if not executable:
+            return None
+        mtime = _mtime(executable)
+        with self._lock:
+            cached = self._mavens.get(executable)
+            if cached and cached.mtime == mtime:
+                return cached
+
+        home = os.path.dirname(os.path.dirname(os.path.realpath(executable)))
+        version = maven_version_from_home(home) or probe_maven_version(executable, startupinfo)
+        if not version:
+            return None
+        info = MavenInstall(path=executable, home=home, version=version, mtime=mtime)
+        with self._lock:
+            self._mavens[executable] = info
+            self.save()
+        logger.info(f"Установка Maven {version} сохранена в кэш: {executable}")
+        return info
+
+    def jdk_info(self, java_home) -> Optional[JdkInstall]:
+        """Сведения о JDK по JAVA_HOME; перепроверяются только при изменении файла release"""
+        if not java_home:
+            return None
+        java_home = os.path.abspath(java_home)
+        mtime = _mtime(os.path.join(java_home, "release"))
+        if mtime is None:
+            return None
+        with self._lock:
+            cached = self._jdks.get(java_home)
+            if cached and cached.mtime == mtime:
+                return cached
+
+        version = jdk_version_from_home(java_home)
+        if not version:
+            return None
+        info = JdkInstall(java_home=java_home, version=version, mtime=mtime)
+        with self._lock:
+            self._jdks[java_home] = info
+            self.save()
+        return info
+
+    def default_maven(self, finder):
+        """Maven по умолчанию: из кэша, если файл на месте, иначе результат finder()"""
+        with self._lock:
+            path = self.default_maven_path
+        if path and (os.path.isfile(path) or shutil.which(path)):
+            logger.info(f"Maven по умолчанию взят из кэша: {path}")
+            return path
+        path = finder()
+        if os.path.isfile(path):
+            path = os.path.abspath(path)
+        with self._lock:
+            self.default_maven_path = path
+            self.save()
+        return path
+
+    def refresh(self):
+        """Полный поиск всех установок Maven и JDK"""
+        with self._lock:
+            self._mavens = {p: m for p, m in self._mavens.items() if os.path.isfile(p)}
+            self._jdks = {h: j for h, j in self._jdks.items() if os.path.isdir(h)}
+        for executable in candidate_maven_executables():
+            self.maven_info(executable)
+        for java_home in candidate_java_homes():
+            self.jdk_info(java_home)
+        with self._lock:
+            self.scanned = True
+            self.save()
+        logger.info(f"Найдено установок Maven: {len(self._mavens)}, JDK: {len(self._jdks)}")
+
+    def mavens(self) -> List[MavenInstall]:
+        if not self.scanned:
+            self.refresh()
+        with self._lock:
+            return sorted(self._mavens.values(), key=lambda m: m.path)
+
+    def jdks(self) -> List[JdkInstall]:
+        if not self.scanned:
+            self.refresh()
+        with self._lock:
+            return sorted(self._jdks.values(), key=lambda j: j.java_home)
@@ -0,0 +1,309 @@
+"""Режим наблюдения: автоматическая пересборка при изменении исходников.
+
+Отслеживаются pom.xml и файлы в папках src проекта и его модулей. На Linux
+используется inotify (через ctypes), в остальных случаях - сравнение
+снимков времени изменения файлов, собранных через os.scandir. Серия
+сохранений объединяется в одну сборку (debounce); если изменения пришли во
+время сборки, устаревший процесс Maven завершается вместе с дочерними и
+сборка начинается заново.
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+from majesty_cache import SKIP_DIRS
+from majesty_engine import BuildCancellation
+
+logger = logging.getLogger('MajestyCompiler')
+
+# Сколько секунд тишины ждать после последнего изменения перед сборкой
+DEFAULT_DEBOUNCE = 0.7
+# Дольше этого сборка не откладывается, даже если файлы продолжают меняться
+MAX_DEBOUNCE_DELAY = 5.0
+DEFAULT_POLL_INTERVAL = 1.0
+IDLE_TIMEOUT = 1.0
+
+# Временные файлы редакторов не запускают сборку
+IGNORED_SUFFIXES = ("~", ".swp", ".swx", ".tmp", ".bak")
+IGNORED_PREFIXES = (".#", "#")
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_relevant(rel_path):
+    """Влияет ли файл (путь относительно проекта) на сборку: pom.xml или файл внутри src"""
+    parts = rel_path.replace(os.sep, "/").split("/")
+    name = parts[-1]
+    if name.endswith(IGNORED_SUFFIXES) or name.startswith(IGNORED_PREFIXES):
+        return False
+    if any(part in SKIP_DIRS for part in parts[:-1]):
+        return False
+    return name == "pom.xml" or "src" in parts[:-1]
+
+
+def iter_watched_dirs(root):
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not d.startswith(".")]
+        yield dirpath
+
+
+class PollingBackend:
+    """Сравнение снимков {файл: (mtime, размер)}; работает везде"""
+
+    name = "scandir"
+
+    def __init__(self, root, interval=DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIP_DIRS and not entry.name.startswith("."):
+                                stack.append(entry.path)
+                        elif is_relevant(os.path.relpath(entry.path, self.root)):
+                            stat = entry.stat()
+                            snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(max(timeout, self.interval))
+        snapshot = self._scan()
+        previous, self._snapshot = self._snapshot, snapshot
+        changed = {path for path, state in snapshot.items() if previous.get(path) != state}
+        changed.update(path for path in previous if path not in snapshot)
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyBackend:
+    """Уведомления ядра Linux; наблюдение рекурсивное, новые папки подхватываются на лету"""
+
+    name = "inotify"
+
+    def __init__(self, root):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify недоступен")
+        self.root = root
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._dirs = {}
+        try:
+            for directory in iter_watched_dirs(root):
+                self._add_watch(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code == errno.ENOENT:
+                return
+            # ENOSPC - исчерпан лимит fs.inotify.max_user_watches
+            raise OSError(code, f"inotify_add_watch {directory}: {os.strerror(code)}")
+        self._dirs[wd] = directory
+
+    def _on_new_dir(self, directory, changed):
+        """Папка создана или перемещена: наблюдаем за ней и учитываем уже лежащие в ней файлы"""
+        for subdir in iter_watched_dirs(directory):
+            self._add_watch(subdir)
+            try:
+                with os.scandir(subdir) as entries:
+                    changed.update(entry.path for entry in entries if entry.is_file())
+            except OSError:
+                pass
+
+    def poll(self, timeout):
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # События потеряны - считаем, что изменился весь проект
+                changed.add(os.path.join(self.root, "pom.xml"))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._on_new_dir(path, changed)
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_backend(root):
+    """inotify, если он доступен, иначе сравнение снимков"""
+    try:
+        return InotifyBackend(root)
+    except (OSError, AttributeError) as e:
+        logger.info(f"Наблюдение через inotify недоступно, используется сравнение снимков: {str(e)}")
+        return PollingBackend(root)
+
+
+class ProjectWatcher:
+    """Поток, вызывающий on_change(список файлов) после серии изменений в проекте"""
+
+    def __init__(self, project_dir, on_change, debounce=DEFAULT_DEBOUNCE, backend=None):
+        self.project_dir = os.path.abspath(project_dir)
+        self.on_change = on_change
+        self.debounce = debounce
+        self.backend = backend or create_backend(self.project_dir)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="majesty-watch", daemon=True)
+
+    def start(self):
+        logger.info(f"Наблюдение за проектом {self.project_dir} ({self.backend.name})")
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive() and threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self):
+        pending = set()
+        first_change = last_change = None
+        try:
+            while not self._stop.is_set():
+                changes = self.backend.poll(self.debounce / 4 if pending else IDLE_TIMEOUT)
+                changes = {path for path in changes if is_relevant(os.path.relpath(path, self.project_dir))}
+                now = time.monotonic()
+                if changes:
+                    pending |= changes
+                    last_change = now
+                    first_change = first_change or now
+                if pending and (now - last_change >= self.debounce or now - first_change >= MAX_DEBOUNCE_DELAY):
+                    changed, pending = sorted(pending), set()
+                    first_change = None
+                    if not self._stop.is_set():
+                        self.on_change(changed)
+        except Exception as e:
+            logger.exception(f"Ошибка наблюдения за проектом: {str(e)}")
+        finally:
+            self.backend.close()
+
+
+class WatchBuilder:
+    """Пересобирает проект при изменениях; устаревшая сборка прерывается, а не ставится в очередь"""
+
+    def __init__(self, engine, options, listeners=(), on_start=None, on_result=None, debounce=DEFAULT_DEBOUNCE):
+        self.engine = engine
+        self.options = options
+        self.listeners = list(listeners)
+        # on_start(список измененных файлов) и on_result(BuildResult) вызываются в потоке сборки
+        self.on_start = on_start
+        self.on_result = on_result
+        self.watcher = ProjectWatcher(options.project_dir, self._on_change, debounce)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._changed = []
+        self._current = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="majesty-watch-build", daemon=True)
+
+    def start(self, build_now=True):
+        self._thread.start()
+        self.watcher.start()
+        if build_now:
+            self._on_change([])
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            current = self._current
+        self.watcher.stop()
+        if current is not None:
+            current.cancel()
+        self._wakeup.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _on_change(self, changed):
+        with self._lock:
+            self._changed.extend(changed)
+            current = self._current
+        if changed:
+            logger.info(f"Изменено файлов: {len(changed)}, например {changed[0]}")
+        if current is not None:
+            logger.info("Во время сборки изменились файлы: сборка прерывается и начнется заново")
+            current.cancel()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                changed, self._changed = self._changed, []
+                cancellation = self._current = BuildCancellation()
+            try:
+                if self.on_start:
+                    self.on_start(changed)
+                result = self.engine.build(self.options, self.listeners, cancellation)
+                if self.on_result:
+                    self.on_result(result)
+            except Exception as e:
+                logger.exception(f"Ошибка сборки в режиме наблюдения: {str(e)}")
+            finally:
+                with self._lock:
+                    self._current = None
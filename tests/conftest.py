@@ -0,0 +1,5 @@
+"""Модули приложения лежат в корне репозитория, рядом с папкой tests"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
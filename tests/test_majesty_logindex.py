@@ -0,0 +1,27 @@
+"""Индекс логов сборок (majesty_logindex)"""
+from majesty_logindex import INSERT_BATCH, KIND_COMPILE_ERROR, KIND_WARNING, LogIndex
+
+
+def test_indexer_writes_all_batches_before_close_returns(tmp_path):
+    index = LogIndex(str(tmp_path / "log_index.db"))
+    indexer = index.indexer(str(tmp_path))
+    indexer.on_line("[INFO] --- compiler:3.11.0:compile (default-compile) @ core ---")
+    for number in range(INSERT_BATCH * 3):
+        indexer.on_line(f"[WARNING] deprecated call {number}")
+    indexer.on_line(f"[ERROR] {tmp_path}/src/App.java:[12,5] cannot find symbol")
+    indexer.close()
+
+    assert len(index.search("deprecated", kind=KIND_WARNING, limit=10000)) == INSERT_BATCH * 3
+    error = index.search("symbol", kind=KIND_COMPILE_ERROR)[0]
+    assert (error.module, error.location()) == ("core", "src/App.java:12")
+    index.close()
+
+
+def test_indexer_without_entries_starts_no_writer(tmp_path):
+    index = LogIndex(str(tmp_path / "log_index.db"))
+    indexer = index.indexer(str(tmp_path))
+    indexer.on_line("[INFO] BUILD SUCCESS")
+    indexer.close()
+    assert indexer._writer is None
+    assert index.search("BUILD") == []
+    index.close()
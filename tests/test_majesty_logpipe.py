@@ -0,0 +1,72 @@
+"""Конвейер логов (majesty_logpipe)"""
+import threading
+import time
+
+import majesty_logpipe
+from majesty_logpipe import LogFilter, LogPipeline
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_timer_flushes_batch_while_maven_is_silent(tmp_path):
+    full, filtered = tmp_path / "full.txt", tmp_path / "filtered.txt"
+    pipeline = LogPipeline(str(full), str(filtered), batch_lines=1000, flush_interval=0.05)
+    pipeline.feed("[INFO] Downloading dependencies\n")
+    pipeline.feed("[ERROR] broken\n")
+    # Следующей строки нет: запись должна произойти по таймеру
+    assert wait_for(lambda: full.read_text(encoding='utf-8').count("\n") == 2)
+    assert filtered.read_text(encoding='utf-8') == "[ERROR] broken\n"
+    stats = pipeline.close()
+    assert (stats.lines, stats.matched, stats.errors) == (2, 1, 1)
+
+
+def test_full_batch_is_written_without_timer(tmp_path):
+    full = tmp_path / "full.txt"
+    pipeline = LogPipeline(str(full), str(tmp_path / "filtered.txt"), log_filter=LogFilter(["ERROR"]),
+                           batch_lines=3, flush_interval=None)
+    for number in range(4):
+        pipeline.feed(f"[INFO] line {number}\n")
+    assert full.read_text(encoding='utf-8').count("\n") == 3
+    pipeline.close()
+    assert full.read_text(encoding='utf-8').count("\n") == 4
+
+
+def test_background_writer_queue_is_bounded():
+    released = threading.Event()
+
+    class SlowFile:
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, chunk):
+            released.wait(2.0)
+            self.chunks.append(chunk)
+
+        def flush(self):
+            pass
+
+    writer = majesty_logpipe._BatchWriter(max_chunks=2)
+    log_file = SlowFile()
+    submitted = []
+
+    def submit_all():
+        for number in range(6):
+            writer.submit(log_file, f"chunk {number}\n")
+            submitted.append(number)
+
+    producer = threading.Thread(target=submit_all)
+    producer.start()
+    time.sleep(0.2)
+    # Одна пачка в записи и две в очереди: остальные ждут
+    assert len(submitted) == 3
+    released.set()
+    producer.join(2.0)
+    writer.close()
+    assert log_file.chunks == [f"chunk {number}\n" for number in range(6)]
@@ -0,0 +1,107 @@
+"""Реактор Maven и план инкрементальной сборки (majesty_reactor)"""
+import os
+
+from majesty_reactor import ModuleIndex, dependents_of, load_reactor, plan_incremental_build
+
+ROOT_POM = """<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <groupId>com.x</groupId>
+  <artifactId>root</artifactId>
+  <version>1.0</version>
+  <packaging>pom</packaging>
+  <modules>
+    <module>core</module>
+    <module>app</module>
+    <module>tools</module>
+  </modules>
+</project>
+"""
+
+MODULE_POM = """<project xmlns="http://maven.apache.org/POM/4.0.0">
+  <parent>
+    <groupId>com.x</groupId>
+    <artifactId>root</artifactId>
+    <version>1.0</version>
+  </parent>
+  <artifactId>{name}</artifactId>
+  <dependencies>{dependencies}</dependencies>
+</project>
+"""
+
+DEPENDENCY = "<dependency><groupId>${{project.groupId}}</groupId><artifactId>{name}</artifactId></dependency>"
+
+
+def make_project(root):
+    (root / "pom.xml").write_text(ROOT_POM, encoding='utf-8')
+    for name, dependencies in (("core", []), ("app", ["core"]), ("tools", [])):
+        source_dir = root / name / "src" / "main" / "java"
+        source_dir.mkdir(parents=True)
+        (source_dir / f"{name.title()}.java").write_text(f"class {name.title()} {{}}\n", encoding='utf-8')
+        (root / name / "pom.xml").write_text(MODULE_POM.format(
+            name=name, dependencies="".join(DEPENDENCY.format(name=d) for d in dependencies)), encoding='utf-8')
+    return str(root)
+
+
+def plan_and_save(project_dir):
+    index = ModuleIndex(project_dir)
+    plan = plan_incremental_build(project_dir, index)
+    index.save(plan.snapshot)
+    return plan
+
+
+def test_load_reactor_reads_modules_and_dependencies(tmp_path):
+    reactor = load_reactor(make_project(tmp_path))
+    assert [m.name for m in reactor] == [".", "core", "app", "tools"]
+    app = reactor[2]
+    assert app.coordinates == ("com.x", "app")
+    assert app.dependencies == [("com.x", "core")]
+    assert app.parent == ("com.x", "root")
+
+
+def test_dependents_of_follows_dependencies_and_parent(tmp_path):
+    reactor = load_reactor(make_project(tmp_path))
+    assert dependents_of(reactor, ["core"]) == {"core", "app"}
+    assert dependents_of(reactor, ["tools"]) == {"tools"}
+    # От корневого pom.xml наследуются все модули
+    assert dependents_of(reactor, ["."]) == {".", "core", "app", "tools"}
+
+
+def test_first_build_is_full(tmp_path):
+    plan = plan_incremental_build(make_project(tmp_path), ModuleIndex(str(tmp_path)))
+    assert plan.full
+    assert plan.maven_arguments() == []
+
+
+def test_unchanged_project_is_up_to_date(tmp_path):
+    project_dir = make_project(tmp_path)
+    plan_and_save(project_dir)
+    plan = plan_incremental_build(project_dir, ModuleIndex(project_dir))
+    assert plan.up_to_date
+    assert plan.changed == []
+
+
+def test_changed_module_is_built_with_dependents(tmp_path):
+    project_dir = make_project(tmp_path)
+    plan_and_save(project_dir)
+    (tmp_path / "core" / "src" / "main" / "java" / "Core.java").write_text("class Core { int x; }\n",
+                                                                            encoding='utf-8')
+    plan = plan_incremental_build(project_dir, ModuleIndex(project_dir))
+    assert not plan.full
+    assert plan.changed == ["core"]
+    assert plan.maven_arguments() == ["-pl", "core", "-amd"]
+
+
+def test_target_folder_is_ignored(tmp_path):
+    project_dir = make_project(tmp_path)
+    plan_and_save(project_dir)
+    os.makedirs(tmp_path / "app" / "target")
+    (tmp_path / "app" / "target" / "app.jar").write_bytes(b"jar")
+    assert plan_incremental_build(project_dir, ModuleIndex(project_dir)).up_to_date
+
+
+def test_changed_root_pom_rebuilds_whole_reactor(tmp_path):
+    project_dir = make_project(tmp_path)
+    plan_and_save(project_dir)
+    (tmp_path / "pom.xml").write_text(ROOT_POM.replace("1.0", "1.1"), encoding='utf-8')
+    plan = plan_incremental_build(project_dir, ModuleIndex(project_dir))
+    assert plan.full
+    assert "." in plan.changed
@@ -0,0 +1,101 @@
+"""Реестр версий артефактов (majesty_registry)"""
+import json
+import os
+
+import majesty_registry
+from majesty_registry import MANIFEST_FILENAME, VersionEntry, VersionRegistry
+
+
+def publish(registry, tmp_path, content, base_name="app.jar"):
+    src = tmp_path / "src.jar"
+    src.write_bytes(content)
+    return registry.publish(base_name, str(src), dedup="off")
+
+
+def test_reserve_numbers_versions_like_before(tmp_path):
+    registry = VersionRegistry(str(tmp_path / "out"))
+    assert registry.peek_next("app.jar") == "app.jar"
+    assert registry.reserve("app.jar") == (0, "app.jar")
+    assert registry.peek_next("app.jar") == "app-v1.jar"
+    assert registry.reserve("app.jar") == (1, "app-v1.jar")
+    # Зарезервированное имя занято пустым файлом до публикации
+    assert os.path.getsize(tmp_path / "out" / "app-v1.jar") == 0
+
+
+def test_reserve_skips_names_taken_outside_registry(tmp_path):
+    out = tmp_path / "out"
+    registry = VersionRegistry(str(out))
+    registry.reserve("app.jar")
+    (out / "app-v1.jar").write_bytes(b"manual")
+    assert registry.reserve("app.jar") == (2, "app-v2.jar")
+    assert registry.peek_next("app.jar") == "app-v3.jar"
+
+
+def test_cold_start_rebuilds_manifest_from_files(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    for name in ("app.jar", "app-v1.jar", "app-v4.jar", "other.jar", "app-v2.txt"):
+        (out / name).write_bytes(b"x" * 3)
+    registry = VersionRegistry(str(out))
+    versions = registry.list_versions("app.jar")
+    assert [(v.version, v.filename, v.size) for v in versions] == [
+        (0, "app.jar", 3), (1, "app-v1.jar", 3), (4, "app-v4.jar", 3)]
+    assert registry.peek_next("app.jar") == "app-v5.jar"
+
+
+def test_manifest_is_shared_between_registries(tmp_path):
+    out = str(tmp_path / "out")
+    publish(VersionRegistry(out), tmp_path, b"first")
+    other = VersionRegistry(out)
+    assert other.peek_next("app.jar") == "app-v1.jar"
+    assert other.latest("app.jar").filename == "app.jar"
+
+
+def test_prune_keeps_last_versions(tmp_path):
+    out = tmp_path / "out"
+    registry = VersionRegistry(str(out))
+    for index in range(4):
+        publish(registry, tmp_path, f"build {index}".encode())
+    removed = registry.prune("app.jar", keep_last=2)
+    assert [v.filename for v in removed] == ["app.jar", "app-v1.jar"]
+    assert [v.filename for v in registry.list_versions("app.jar")] == ["app-v2.jar", "app-v3.jar"]
+    assert sorted(name for name in os.listdir(out) if name.startswith("app")) == [
+        "app-v2.jar", "app-v2.jar.sha256", "app-v3.jar", "app-v3.jar.sha256"]
+
+
+def test_prune_never_removes_latest_version(tmp_path):
+    registry = VersionRegistry(str(tmp_path / "out"))
+    publish(registry, tmp_path, b"x" * 100)
+    publish(registry, tmp_path, b"y" * 100)
+    removed = registry.prune("app.jar", max_total_bytes=10)
+    assert [v.filename for v in removed] == ["app.jar"]
+    assert registry.latest("app.jar").filename == "app-v1.jar"
+
+
+def test_prune_keeps_entry_when_file_cannot_be_removed(tmp_path, monkeypatch):
+    out = tmp_path / "out"
+    registry = VersionRegistry(str(out))
+    for index in range(3):
+        publish(registry, tmp_path, f"build {index}".encode())
+    locked_path = str(out / "app.jar")
+    remove = os.remove
+
+    def fake_remove(path):
+        if path == locked_path:
+            raise PermissionError("файл занят")
+        remove(path)
+
+    monkeypatch.setattr(majesty_registry.os, "remove", fake_remove)
+    removed = registry.prune("app.jar", keep_last=1)
+    assert [v.filename for v in removed] == ["app-v1.jar"]
+    assert [v.filename for v in registry.list_versions("app.jar")] == ["app.jar", "app-v2.jar"]
+    with open(out / MANIFEST_FILENAME, encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert [v["filename"] for v in manifest["artifacts"]["app.jar"]["versions"]] == ["app.jar", "app-v2.jar"]
+
+
+def test_record_keeps_versions_sorted(tmp_path):
+    registry = VersionRegistry(str(tmp_path / "out"))
+    registry.record("app.jar", VersionEntry(2, "app-v2.jar", 2.0))
+    registry.record("app.jar", VersionEntry(1, "app-v1.jar", 1.0))
+    assert [v.version for v in registry.list_versions("app.jar")] == [1, 2]
@@ -0,0 +1,82 @@
+"""Разбиение тестов на части (majesty_tests)"""
+from majesty_reactor import MavenModule
+import majesty_tests
+from majesty_tests import (SHARD_SUFFIX, can_shard, has_reactor_dependencies, plan_shards, shard_arguments,
+                           shard_base_arguments)
+
+# Под именем TestShard pytest принял бы класс за набор тестов
+Shard = majesty_tests.TestShard
+
+TIMINGS = {"SlowTest": 1.6, "MidTest": 0.8, "MidTwoTest": 0.7, "OtherTest": 0.4, "FastTest": 0.2, "TinyTest": 0.1}
+
+
+def test_plan_shards_longest_class_goes_to_least_loaded_shard():
+    shards = plan_shards(TIMINGS, 3)
+    assert [shard.classes for shard in shards] == [
+        ["SlowTest"],
+        ["MidTest", "FastTest", "TinyTest"],
+        ["MidTwoTest", "OtherTest"],
+    ]
+    assert [round(shard.estimate, 3) for shard in shards] == [1.6, 1.1, 1.1]
+
+
+def test_plan_shards_covers_every_class_once():
+    shards = plan_shards(TIMINGS, 4)
+    classes = [name for shard in shards for name in shard.classes]
+    assert sorted(classes) == sorted(TIMINGS)
+
+
+def test_plan_shards_rest_goes_to_shortest_shard():
+    shards = plan_shards(TIMINGS, 3)
+    rest = [shard for shard in shards if shard.rest]
+    assert len(rest) == 1
+    assert rest[0].estimate == min(shard.estimate for shard in shards)
+
+
+def test_plan_shards_keeps_empty_rest_shard_when_classes_are_few():
+    shards = plan_shards({"OnlyTest": 1.0}, 3)
+    assert [(shard.classes, shard.rest) for shard in shards] == [(["OnlyTest"], False), ([], True)]
+
+
+def test_shard_arguments_lists_classes_of_regular_shard():
+    shards = [Shard(0, ["SlowTest"], 1.6), Shard(1, ["MidTest", "FastTest"], 1.0, rest=True)]
+    assert shard_arguments(shards[0], shards) == [
+        "surefire:test", "-Dtest=SlowTest", "-Dsurefire.failIfNoSpecifiedTests=false",
+        f"-Dsurefire.reportNameSuffix={SHARD_SUFFIX}1",
+    ]
+
+
+def test_shard_arguments_excludes_other_shards_in_rest_shard():
+    shards = [Shard(0, ["SlowTest"], 1.6), Shard(1, ["MidTest"], 0.8),
+              Shard(2, ["FastTest"], 0.2, rest=True)]
+    args = shard_arguments(shards[2], shards)
+    assert args[0] == "surefire:test"
+    assert "-Dtest=!SlowTest,!MidTest" in args
+    assert f"-Dsurefire.reportNameSuffix={SHARD_SUFFIX}3" in args
+
+
+def test_shard_arguments_single_rest_shard_runs_everything():
+    shards = [Shard(0, [], 0.0, rest=True)]
+    assert not any(arg.startswith("-Dtest=") for arg in shard_arguments(shards[0], shards))
+
+
+def test_shard_base_arguments_drop_phases_threads_and_skips():
+    goals = ["-B", "clean", "package", "-T", "4", "-T1C", "-DskipTests", "-Pci", "-pl", "core", "-amd", "-o"]
+    assert shard_base_arguments(goals) == ["-B", "-Pci", "-pl", "core", "-amd", "-o"]
+
+
+def test_can_shard_only_up_to_package():
+    assert can_shard(["clean", "package"])
+    assert can_shard(["test"])
+    assert not can_shard(["clean", "verify"])
+    assert not can_shard(["clean", "install"])
+    assert not can_shard(["clean", "package", "-DskipTests"])
+
+
+def _module(artifact_id, dependencies=()):
+    return MavenModule(artifact_id, f"/p/{artifact_id}", "com.x", artifact_id, dependencies=list(dependencies))
+
+
+def test_has_reactor_dependencies():
+    assert not has_reactor_dependencies([_module("core"), _module("api", [("org.lib", "lib")])])
+    assert has_reactor_dependencies([_module("core"), _module("api", [("com.x", "core")])])